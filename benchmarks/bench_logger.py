@@ -0,0 +1,102 @@
+"""
+标准日志拦截的基准测试
+对比旧的 InterceptHandler 实现和现在的普通模式、快速模式每条日志的耗时
+
+运行: python benchmarks/bench_logger.py
+"""
+
+import inspect
+import logging
+import timeit
+from logging import LogRecord, StreamHandler
+
+from loguru import logger
+from sanic import Sanic
+
+from sanic_api.logger.config import InterceptHandler
+
+LOG_FORMAT = "{time} | {extra[type]: <10} | {level: <8} | {name}:{function}:{line} - {message}{extra[etxra_info]}"
+
+
+class LegacyInterceptHandler(StreamHandler):
+    """
+    旧的实现，用于对比
+    """
+
+    def emit(self, record: logging.LogRecord):
+        level: str | int
+        try:
+            level = logger.level(record.levelname).name
+        except ValueError:
+            level = record.levelno
+
+        frame, depth = inspect.currentframe(), 0
+        while frame and (depth == 0 or frame.f_code.co_filename == logging.__file__):
+            frame = frame.f_back
+            depth += 1
+
+        default_record = LogRecord("", 0, "", 0, "", None, None, "")
+        etxra_info = {key: value for key, value in record.__dict__.items() if key not in default_record.__dict__}
+
+        req_id = self._get_req_id()
+        if req_id:
+            etxra_info.update({"req_id": req_id})
+
+        etxra_info = etxra_info if etxra_info else ""
+        src_msg = record.getMessage()
+        msg = f"{src_msg} " if etxra_info and src_msg else src_msg
+        etxra_data = {"type": record.name, "etxra_info": etxra_info}
+        logger.bind(**etxra_data).opt(depth=depth, exception=record.exc_info).log(level, msg)
+
+    @staticmethod
+    def _get_req():
+        try:
+            app = Sanic.get_app()
+            req = app.request_class.get_current()
+        except Exception:
+            req = None
+        return req
+
+    def _get_req_id(self) -> str:
+        req = self._get_req()
+        return str(req.id) if req else ""
+
+
+def bench(name: str, handler: logging.Handler, number: int = 20000) -> float:
+    std_logger = logging.getLogger("bench")
+    std_logger.handlers = [handler]
+    std_logger.propagate = False
+    std_logger.setLevel(logging.INFO)
+
+    def log():
+        std_logger.info("hello %s", "world", extra={"user": 1})
+
+    seconds = min(timeit.repeat(log, number=number, repeat=5)) / number
+    print(f"{name:<20} {seconds * 1_000_000:>8.2f} us/条")
+    return seconds
+
+
+def main():
+    logger.remove()
+    logger.add(lambda _: None, format=LOG_FORMAT)
+
+    # 确认两种模式输出的调用位置一致
+    lines = []
+    logger.remove()
+    logger.add(lines.append, format="{name}:{function}:{line}")
+    for handler in (LegacyInterceptHandler(), InterceptHandler(), InterceptHandler(fast=True)):
+        logging.getLogger("check").handlers = [handler]
+        logging.getLogger("check").propagate = False
+        logging.getLogger("check").warning("check")
+    print("调用位置:", *{line.strip() for line in lines})
+
+    logger.remove()
+    logger.add(lambda _: None, format=LOG_FORMAT)
+    legacy = bench("旧实现", LegacyInterceptHandler())
+    normal = bench("普通模式", InterceptHandler())
+    fast = bench("快速模式", InterceptHandler(fast=True))
+    print(f"普通模式加速比 {legacy / normal:.2f} x，快速模式加速比 {legacy / fast:.2f} x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,571 @@
+"""
+请求/响应全流程的基准测试
+在本机启动 example/app.py 风格的服务（包括 MiniApp），测量各个场景的吞吐量和p50、p99延迟：
+裸的/ping、大小json_data模型的校验、form_data和query_data的列表解包、不同大小的BaseRespTml响应、访问日志开和关。
+另外在进程内测量 Request._load_data 和 InterceptHandler.emit 的耗时。
+结果输出为json，可以用 --compare 和另一次的结果对比，用来发现升级后吞吐量的退化
+
+运行: python benchmarks/bench_pipeline.py [--duration 5] [--connections 32] [--output result.json] [--compare old.json]
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import multiprocessing
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import time
+import timeit
+import urllib.request
+from pathlib import Path
+from urllib.parse import urlencode
+
+from pydantic import BaseModel, Field
+from sanic import Blueprint, Sanic, text
+from sanic.compat import Header
+
+from sanic_api.api import BaseRespTml, Request
+from sanic_api.api.binding import BindingPlan
+from sanic_api.app import BaseApp
+from sanic_api.config import DefaultSettings, RunModeEnum, ServerSettings
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+bench_blueprint = Blueprint("bench", "/bench")
+
+
+class SmallModel(BaseModel):
+    user_id: int = Field(title="用户ID")
+    user_name: str = Field(title="用户名")
+    score: float = Field(title="分数")
+
+
+class LargeItemModel(BaseModel):
+    item_id: int = Field(title="物品ID")
+    name: str = Field(title="名称")
+    tags: list[str] = Field(title="标签")
+    price: float = Field(title="价格")
+
+
+class LargeModel(BaseModel):
+    items: list[LargeItemModel] = Field(title="物品")
+    remark: str = Field(title="备注")
+
+
+class ListParamsModel(BaseModel):
+    ids: list[int] = Field(title="ID列表")
+    name: str = Field(title="名称")
+    page: int = Field(default=1, title="页码")
+
+
+class ItemModel(BaseModel):
+    item_id: int = Field(title="物品ID")
+    name: str = Field(title="名称")
+    price: float = Field(title="价格")
+
+
+class ItemListResponse(BaseRespTml):
+    items: list[ItemModel] = Field(title="物品")
+
+
+RESP_ITEMS = [ItemModel(item_id=i, name=f"物品{i}", price=i / 3) for i in range(1000)]
+
+
+@bench_blueprint.post("json/small")
+async def json_small(request: Request, json_data: SmallModel):
+    return text("ok")
+
+
+@bench_blueprint.post("json/large")
+async def json_large(request: Request, json_data: LargeModel):
+    return text("ok")
+
+
+@bench_blueprint.post("form")
+async def form_list(request: Request, form_data: ListParamsModel):
+    return text("ok")
+
+
+@bench_blueprint.get("query")
+async def query_list(request: Request, query_data: ListParamsModel):
+    return text("ok")
+
+
+@bench_blueprint.get("resp/<count:int>")
+async def resp_tml(request: Request, count: int):
+    resp = ItemListResponse(items=RESP_ITEMS[:count])
+    resp.temp_data.code = "0000"
+    return resp.resp()
+
+
+class BenchApp(BaseApp):
+    """
+    基准测试的服务
+    """
+
+    async def setup_route(self, app: Sanic):
+        app.blueprint(bench_blueprint)
+
+
+def _json_body(model: BaseModel) -> bytes:
+    return model.model_dump_json().encode()
+
+
+SMALL_BODY = _json_body(SmallModel(user_id=1, user_name="张三", score=99.5))
+LARGE_BODY = _json_body(
+    LargeModel(
+        items=[LargeItemModel(item_id=i, name=f"物品{i}", tags=["a", "b", "c"], price=i / 3) for i in range(200)],
+        remark="备注",
+    )
+)
+LIST_PARAMS = urlencode([*(("ids", i) for i in range(20)), ("name", "张三"), ("page", 2)])
+
+# 场景: (名称, 服务, 请求方法, 路径, 请求体, 内容类型)
+SCENARIOS = [
+    ("ping", "mini", "GET", "/ping", b"", None),
+    ("json_small", "bench", "POST", "/bench/json/small", SMALL_BODY, "application/json"),
+    ("json_large", "bench", "POST", "/bench/json/large", LARGE_BODY, "application/json"),
+    ("form_list", "bench", "POST", "/bench/form", LIST_PARAMS.encode(), "application/x-www-form-urlencoded"),
+    ("query_list", "bench", "GET", f"/bench/query?{LIST_PARAMS}", b"", None),
+    ("resp_tml_1", "bench", "GET", "/bench/resp/1", b"", None),
+    ("resp_tml_100", "bench", "GET", "/bench/resp/100", b"", None),
+    ("resp_tml_1000", "bench", "GET", "/bench/resp/1000", b"", None),
+    ("ping_access_log", "bench_access_log", "GET", "/ping", b"", None),
+    ("json_small_access_log", "bench_access_log", "POST", "/bench/json/small", SMALL_BODY, "application/json"),
+]
+
+# 服务: (app类所在的模块和类名, 是否开启访问日志)
+SERVERS = {
+    "mini": ("example.mini_app:MiniApp", False),
+    "bench": ("__main__:BenchApp", False),
+    "bench_access_log": ("__main__:BenchApp", True),
+}
+
+
+def serve(server: str, port: int, workers: int):
+    """
+    启动服务，在子进程中运行
+    Args:
+        server: 服务名称
+        port: 端口
+        workers: 工作进程数
+
+    Returns:
+
+    """
+    target, access_log = SERVERS[server]
+    module_name, class_name = target.split(":")
+    if module_name == "__main__":
+        app_cls = globals()[class_name]
+    else:
+        sys.path.insert(0, str(ROOT_DIR))
+        app_cls = getattr(importlib.import_module(module_name), class_name)
+
+    settings = DefaultSettings(
+        host="127.0.0.1",
+        port=port,
+        mode=RunModeEnum.PRODUCTION,
+        access_log=access_log,
+        server=ServerSettings(workers=workers),
+    )
+    app_cls.run(settings)
+
+
+def build_request(method: str, path: str, body: bytes, content_type: str | None) -> bytes:
+    """
+    生成原始的HTTP请求
+    Args:
+        method: 请求方法
+        path: 路径，可以带查询参数
+        body: 请求体
+        content_type: 内容类型
+
+    Returns:
+
+    """
+    lines = [f"{method} {path} HTTP/1.1", "Host: 127.0.0.1", "Connection: keep-alive"]
+    if content_type:
+        lines.append(f"Content-Type: {content_type}")
+    if body or method == "POST":
+        lines.append(f"Content-Length: {len(body)}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode() + body
+
+
+async def _read_response(reader: asyncio.StreamReader) -> int:
+    """
+    读取一个完整的响应
+    Args:
+        reader: 连接
+
+    Returns:
+        状态码
+    """
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head[9:12])
+    lower_head = head.lower()
+    index = lower_head.find(b"content-length:")
+    if index >= 0:
+        end = lower_head.index(b"\r\n", index)
+        await reader.readexactly(int(lower_head[index + 15 : end]))
+    elif b"transfer-encoding: chunked" in lower_head:
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    return status
+
+
+async def _load_connection(port: int, request: bytes, deadline: float, latencies: list[float], errors: list[int]):
+    """
+    在一个长连接上不断发送请求直到截止时间
+    Args:
+        port: 端口
+        request: 原始请求
+        deadline: 截止时间
+        latencies: 记录每个请求的耗时
+        errors: 记录失败的请求数
+
+    Returns:
+
+    """
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        if writer is None:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        start_time = time.perf_counter()
+        try:
+            writer.write(request)
+            status = await _read_response(reader)
+        except (OSError, asyncio.IncompleteReadError):
+            errors[0] += 1
+            writer.close()
+            reader = writer = None
+            continue
+        latencies.append(time.perf_counter() - start_time)
+        if status >= 400:
+            errors[0] += 1
+    if writer is not None:
+        writer.close()
+
+
+def _load_process(port: int, request: bytes, connections: int, duration: float) -> tuple[list[float], int]:
+    """
+    压测的子进程，使用asyncio在多个连接上并发发送请求
+    Args:
+        port: 端口
+        request: 原始请求
+        connections: 连接数
+        duration: 持续时间，单位秒
+
+    Returns:
+        (每个请求的耗时, 失败的请求数)
+    """
+    latencies, errors = [], [0]
+
+    async def run():
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(
+            *(_load_connection(port, request, deadline, latencies, errors) for _ in range(connections))
+        )
+
+    asyncio.run(run())
+    return latencies, errors[0]
+
+
+def run_load(port: int, request: bytes, *, connections: int, duration: float, processes: int) -> dict:
+    """
+    使用多个进程压测，汇总吞吐量和延迟
+    Args:
+        port: 端口
+        request: 原始请求
+        connections: 总连接数
+        duration: 持续时间，单位秒
+        processes: 压测的进程数
+
+    Returns:
+
+    """
+    per_process = max(1, connections // processes)
+    with multiprocessing.get_context("spawn").Pool(processes) as pool:
+        results = pool.starmap(_load_process, [(port, request, per_process, duration)] * processes)
+
+    latencies = sorted(latency for process_latencies, _ in results for latency in process_latencies)
+    errors = sum(process_errors for _, process_errors in results)
+    count = len(latencies)
+    if not count:
+        return {"requests": 0, "errors": errors, "rps": 0, "p50_ms": None, "p99_ms": None}
+
+    def percentile(q: float) -> float:
+        return round(latencies[min(count - 1, int(q * count))] * 1000, 3)
+
+    return {
+        "requests": count,
+        "errors": errors,
+        "rps": round(count / duration, 1),
+        "p50_ms": percentile(0.5),
+        "p99_ms": percentile(0.99),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(server: str, workers: int) -> tuple[subprocess.Popen, int]:
+    """
+    在子进程中启动服务并等待可以访问
+    Args:
+        server: 服务名称
+        workers: 工作进程数
+
+    Returns:
+        (服务进程, 端口)
+    """
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, __file__, "--serve", server, "--port", str(port), "--workers", str(workers)],
+        cwd=Path(__file__).resolve().parent,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"服务 {server} 启动失败")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/ping", timeout=1):
+                return process, port
+        except OSError:
+            time.sleep(0.2)
+    stop_server(process)
+    raise RuntimeError(f"服务 {server} 启动超时")
+
+
+def stop_server(process: subprocess.Popen):
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def bench_load(args: argparse.Namespace) -> list[dict]:
+    """
+    压测所有场景，每个服务只启动一次
+    Args:
+        args: 命令行参数
+
+    Returns:
+
+    """
+    results = []
+    for server in SERVERS:
+        scenarios = [scenario for scenario in SCENARIOS if scenario[1] == server and _selected(scenario[0], args)]
+        if not scenarios:
+            continue
+        process, port = start_server(server, args.workers)
+        try:
+            for name, _, method, path, body, content_type in scenarios:
+                request = build_request(method, path, body, content_type)
+                load_args = {"connections": args.connections, "processes": args.processes}
+                run_load(port, request, duration=args.warmup, **load_args)
+                result = {
+                    "name": name,
+                    "server": server,
+                    **run_load(port, request, duration=args.duration, **load_args),
+                }
+                print(
+                    f"{name:<24} {result['rps']:>10.1f} req/s  p50 {result['p50_ms']:>8} ms  "
+                    f"p99 {result['p99_ms']:>8} ms  失败 {result['errors']}"
+                )
+                results.append(result)
+        finally:
+            stop_server(process)
+    return results
+
+
+def _make_request(app: Sanic, method: str, path: str, body: bytes, content_type: str | None) -> Request:
+    """
+    不经过服务直接创建一个已经匹配好路由的请求
+    Args:
+        app: Sanic App
+        method: 请求方法
+        path: 路径，可以带查询参数
+        body: 请求体
+        content_type: 内容类型
+
+    Returns:
+
+    """
+    headers = Header({"host": "127.0.0.1", "content-length": str(len(body))})
+    if content_type:
+        headers["content-type"] = content_type
+    request = Request(path.encode(), headers, "1.1", method, None, app)
+    request.body = body
+    request.route, _, _ = app.router.get(request.path, method, None)
+    request._binding_plan = BindingPlan.get(request.route)
+    request._get_data_type()
+    return request
+
+
+def bench_micro(args: argparse.Namespace) -> list[dict]:
+    """
+    进程内的微基准测试
+    Args:
+        args: 命令行参数
+
+    Returns:
+
+    """
+    from loguru import logger
+
+    from sanic_api.logger.config import InterceptHandler
+
+    app = Sanic("bench_micro", request_class=Request, configure_logging=False)
+    app.blueprint(bench_blueprint)
+    app.router.finalize()
+
+    results = []
+
+    def record(name: str, func, number: int, baseline: float = 0.0) -> float:
+        seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+        results.append({"name": name, "us": round((seconds - baseline) * 1_000_000, 3)})
+        print(f"{name:<36} {(seconds - baseline) * 1_000_000:>10.3f} us")
+        return seconds
+
+    # 请求对象只能加载一次参数，每次都新建请求，再减去新建请求的耗时
+    for name, _, method, path, body, content_type in SCENARIOS[1:5]:
+        if not _selected(name, args):
+            continue
+
+        def make(m=method, p=path, b=body, c=content_type):
+            return _make_request(app, m, p, b, c)
+
+        number = 200 if name == "json_large" else 5000
+        baseline = min(timeit.repeat(make, number=number, repeat=5)) / number
+        record(f"Request._load_data[{name}]", lambda make=make: make()._load_data(), number, baseline)
+
+    # 访问日志带上请求体，和服务中的访问日志一致
+    logger.remove()
+    logger.add(lambda _: None, format="{time} | {extra[type]} | {level} | {name}:{function}:{line} - {message}")
+    request = _make_request(app, "POST", "/bench/json/small", SMALL_BODY, "application/json")
+    request._load_data()
+    token = Request._current.set(request)
+    try:
+        for name, fast in (("InterceptHandler.emit", False), ("InterceptHandler.emit[fast]", True)):
+            handler = InterceptHandler(fast=fast)
+            log_record = logging.LogRecord(
+                "sanic.access", logging.INFO, __file__, 1, "", None, None, func="bench_micro"
+            )
+            log_record.__dict__.update({"host": "127.0.0.1", "request": "POST /bench/json/small", "status": 200})
+            record(name, lambda h=handler, r=log_record: h.emit(r), 20000)
+    finally:
+        Request._current.reset(token)
+    return results
+
+
+def _selected(name: str, args: argparse.Namespace) -> bool:
+    return not args.only or any(part in name for part in args.only)
+
+
+def compare(current: dict, baseline_path: str):
+    """
+    和另一次的结果对比，输出变化的比例
+    Args:
+        current: 本次的结果
+        baseline_path: 另一次结果的json文件
+
+    Returns:
+
+    """
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    print(f"--- 对比 {baseline_path} ({baseline['meta'].get('commit')}) ---")
+    old_load = {result["name"]: result for result in baseline.get("load", [])}
+    for result in current.get("load", []):
+        old = old_load.get(result["name"])
+        if old and old["rps"] and old["p99_ms"] and result["p99_ms"]:
+            print(
+                f"{result['name']:<24} 吞吐量 {result['rps'] / old['rps'] - 1:>+8.1%}  "
+                f"p99 {result['p99_ms'] / old['p99_ms'] - 1:>+8.1%}"
+            )
+    old_micro = {result["name"]: result for result in baseline.get("micro", [])}
+    for result in current.get("micro", []):
+        old = old_micro.get(result["name"])
+        if old and old["us"] > 0:
+            print(f"{result['name']:<36} 耗时 {result['us'] / old['us'] - 1:>+8.1%}")
+
+
+def _get_meta(args: argparse.Namespace) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    import sanic
+
+    import sanic_api
+
+    return {
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sanic": sanic.__version__,
+        "sanic_api": sanic_api.__version__,
+        "workers": args.workers,
+        "connections": args.connections,
+        "processes": args.processes,
+        "duration": args.duration,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="请求/响应全流程的基准测试")
+    parser.add_argument("--duration", type=float, default=5, help="每个场景的压测时间，单位秒")
+    parser.add_argument("--warmup", type=float, default=1, help="每个场景压测前的预热时间，单位秒")
+    parser.add_argument("--connections", type=int, default=32, help="并发的连接数")
+    parser.add_argument("--processes", type=int, default=2, help="压测的进程数")
+    parser.add_argument("--workers", type=int, default=1, help="服务的工作进程数")
+    parser.add_argument("--only", nargs="*", help="只运行名称中包含这些字符串的场景")
+    parser.add_argument("--skip-load", action="store_true", help="跳过压测")
+    parser.add_argument("--skip-micro", action="store_true", help="跳过进程内的微基准测试")
+    parser.add_argument("--output", help="把结果写入json文件，不指定时输出到标准输出")
+    parser.add_argument("--compare", help="和另一次结果的json文件对比")
+    parser.add_argument("--serve", choices=list(SERVERS), help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.workers)
+        return
+
+    result = {"meta": _get_meta(args)}
+    if not args.skip_load:
+        print("--- 压测 ---")
+        result["load"] = bench_load(args)
+    if not args.skip_micro:
+        print("--- 微基准测试 ---")
+        result["micro"] = bench_micro(args)
+
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    else:
+        print(output)
+    if args.compare:
+        compare(result, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+响应序列化的基准测试
+对比旧的 model_dump + JSONResponse 方案和现在直接序列化成字节的方案
+
+运行: python benchmarks/bench_response.py
+"""
+
+import timeit
+
+from pydantic import BaseModel, Field
+from sanic.response import JSONResponse
+
+from sanic_api.api import BaseResp, BaseRespTml
+
+
+class AddressModel(BaseModel):
+    city: str = Field(title="城市")
+    street: str = Field(title="街道")
+    tags: list[str] = Field(title="标签")
+
+
+class UserModel(BaseModel):
+    user_id: int = Field(title="用户ID")
+    user_name: str = Field(title="用户名")
+    score: float = Field(title="分数")
+    address: AddressModel = Field(title="地址")
+
+
+class UserListResp(BaseResp):
+    users: list[UserModel]
+
+
+class UserListRespTml(BaseRespTml):
+    users: list[UserModel]
+
+
+def legacy_resp(model: BaseResp) -> JSONResponse:
+    data = model.model_dump(mode="json")
+    return JSONResponse(data)
+
+
+def legacy_resp_tml(model: BaseRespTml) -> JSONResponse:
+    tmp_data_field_name = model.temp_data.get_data_field_name()
+    self_data = model.model_dump(mode="json", exclude={"temp_data"})
+    setattr(model.temp_data, tmp_data_field_name, self_data)
+    tml_data = model.temp_data.model_dump(mode="json")
+    return JSONResponse(tml_data)
+
+
+def make_users(count: int) -> list[UserModel]:
+    address = AddressModel(city="北京", street="长安街", tags=["a", "b", "c"])
+    return [UserModel(user_id=i, user_name=f"用户{i}", score=i / 3, address=address) for i in range(count)]
+
+
+def bench(name: str, func, number: int):
+    seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print(f"{name:<40} {seconds * 1000:>10.3f} ms")
+    return seconds
+
+
+def main():
+    for count in (1, 100, 10_000):
+        number = max(1, 10_000 // count)
+        users = make_users(count)
+        resp_model = UserListResp(users=users)
+        tml_model = UserListRespTml(users=users)
+
+        print(f"--- {count} 条嵌套数据 ---")
+        legacy = bench("BaseResp 旧方案", lambda m=resp_model: legacy_resp(m), number)
+        current = bench("BaseResp 新方案", resp_model.resp, number)
+        print(f"{'加速比':<40} {legacy / current:>10.2f} x")
+        legacy = bench("BaseRespTml 旧方案", lambda m=tml_model: legacy_resp_tml(m), number)
+        current = bench("BaseRespTml 新方案", tml_model.resp, number)
+        print(f"{'加速比':<40} {legacy / current:>10.2f} x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+启动耗时的基准测试
+使用 python -X importtime 统计导入耗时，并测量一个新的解释器从启动到创建好app的耗时，相当于一个工作进程的启动耗时。
+预算不是固定的毫秒数，而是相对于同一台机器上测得的基准：
+导入耗时只统计sanic_api自身（依赖的第三方库预先导入），预算是依赖的导入耗时的比例；
+工作进程启动耗时的预算是导入依赖后创建一个空的Sanic app的耗时的倍数。
+每项都在新的子进程中运行多次取中位数，超出预算时使用 --check 会以非0状态码退出
+
+运行: python benchmarks/bench_startup.py [--check] [--top 10]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+# sanic_api依赖的第三方库，它们的导入耗时作为基准
+DEPENDENCIES = ("sanic", "sanic_ext", "pydantic", "hs_config", "loguru", "orjson")
+
+# sanic_api自身导入耗时的预算，相对于依赖的导入耗时的比例
+IMPORT_BUDGET_RATIO = {
+    "sanic_api": 0.02,
+    "sanic_api.app": 0.3,
+}
+
+# 工作进程启动耗时的预算，相对于导入依赖后创建一个空的Sanic app的耗时的倍数，都包含解释器启动
+BOOT_BUDGET_RATIO = 1.3
+
+PRELOAD_CODE = f"import {', '.join(DEPENDENCIES)}"
+
+BASELINE_BOOT_CODE = f"""
+import logging
+{PRELOAD_CODE}
+from sanic import Sanic
+
+app = Sanic("baseline")
+logging.disable()
+"""
+
+BOOT_CODE = """
+import logging
+from sanic_api.app import BaseApp
+from sanic_api.config import DefaultSettings
+
+app = BaseApp(DefaultSettings())._create_app()
+logging.disable()
+"""
+
+
+def import_times(code: str) -> list[tuple[str, int, int, int]]:
+    """
+    获取执行一段导入代码时所有模块的耗时
+    Args:
+        code: 导入代码
+
+    Returns:
+        所有模块 (模块名, 缩进层级, 自身耗时, 累计耗时) 的列表，单位微秒
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        rows.append((name.strip(), len(name) - len(name.lstrip()), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def module_rows(rows: list[tuple[str, int, int, int]], module: str) -> list[tuple[str, int, int, int]]:
+    """
+    获取一个模块及其导入的所有模块
+    Args:
+        rows: import_times的结果
+        module: 模块名
+
+    Returns:
+
+    """
+    # 子模块在父模块之前输出，往前找到缩进比它深的连续部分就是它导入的所有模块
+    index = max(i for i, row in enumerate(rows) if row[0] == module)
+    start = index
+    while start > 0 and rows[start - 1][1] > rows[index][1]:
+        start -= 1
+    return rows[start : index + 1]
+
+
+def bench_baseline(repeat: int) -> float:
+    """
+    依赖的导入耗时，只统计代码中直接导入的顶层模块，排除解释器启动时导入的模块
+    """
+    totals = []
+    for _ in range(repeat):
+        rows = import_times(PRELOAD_CODE)
+        top = min(row[1] for row in rows)
+        totals.append(sum(row[3] for row in rows if row[1] == top and row[0] in DEPENDENCIES) / 1000)
+    median = statistics.median(totals)
+    print(f"{'基准: 导入依赖':<37} {median:>8.1f} ms")
+    return median
+
+
+def bench_import(module: str, baseline: float, repeat: int, top: int) -> bool:
+    totals = []
+    rows = []
+    for _ in range(repeat):
+        rows = module_rows(import_times(f"{PRELOAD_CODE}\nimport {module}"), module)
+        totals.append(rows[-1][3] / 1000)
+    median = statistics.median(totals)
+    budget = baseline * IMPORT_BUDGET_RATIO[module]
+    print(f"import {module:<30} {median:>8.1f} ms (预算 {budget:.1f} ms，基准的 {IMPORT_BUDGET_RATIO[module]:.0%})")
+
+    # 自身耗时最多的模块
+    for name, _, self_us, cumulative_us in sorted(rows, key=lambda row: row[2], reverse=True)[:top]:
+        print(f"    {name:<50} 自身 {self_us / 1000:>7.1f} ms  累计 {cumulative_us / 1000:>7.1f} ms")
+    return median <= budget
+
+
+def run_code(code: str, repeat: int) -> float:
+    """
+    在新的解释器中运行代码，返回耗时的中位数，单位毫秒
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], capture_output=True, check=True)
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+
+def bench_boot(repeat: int) -> bool:
+    baseline = run_code(BASELINE_BOOT_CODE, repeat)
+    print(f"{'基准: 创建空的Sanic app':<37} {baseline:>8.1f} ms")
+    median = run_code(BOOT_CODE, repeat)
+    budget = baseline * BOOT_BUDGET_RATIO
+    print(f"{'工作进程启动':<36} {median:>8.1f} ms (预算 {budget:.1f} ms，基准的 {BOOT_BUDGET_RATIO} 倍)")
+    return median <= budget
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时的基准测试")
+    parser.add_argument("--check", action="store_true", help="超出预算时以非0状态码退出")
+    parser.add_argument("--repeat", type=int, default=5, help="每项的运行次数")
+    parser.add_argument("--top", type=int, default=10, help="列出自身耗时最多的模块数量")
+    args = parser.parse_args()
+
+    over_budget = []
+    baseline = bench_baseline(args.repeat)
+    for module in IMPORT_BUDGET_RATIO:
+        if not bench_import(module, baseline, args.repeat, args.top):
+            over_budget.append(f"import {module}")
+    if not bench_boot(args.repeat):
+        over_budget.append("工作进程启动")
+
+    if over_budget:
+        print("超出预算:", ", ".join(over_budget))
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
+from typing import Annotated
+
 from pydantic import BaseModel, Field
-from sanic import Blueprint, Sanic, json
+from sanic import Blueprint, HTTPResponse, Sanic, json
 from sanic.log import logger
 
-from sanic_api.api import BaseRespTml, Request
+from sanic_api.api import BaseRespTml, Request, StreamData, UploadFile
 from sanic_api.app import BaseApp
 
 user_blueprint = Blueprint("user", "/user")
@@ -16,12 +18,17 @@ class UserInfoResponse(BaseRespTml):
     user_name: str = Field(title="用户名")
 
 
+class UserAvatarModel(BaseModel):
+    user_id: int = Field(title="用户ID")
+    avatar: UploadFile = Field(title="头像")
+
+
 class UseLoginRequest(Request):
     form_data: UserInfoModel
 
 
 @user_blueprint.post("info")
-async def user_info(request: Request, json_data: UserInfoModel):
+async def user_info(request: Request, json_data: UserInfoModel) -> Annotated[HTTPResponse, UserInfoResponse]:
     """
     获取用户信息
     """
@@ -41,6 +48,28 @@ async def user_login(request: UseLoginRequest):
     return json(request.form_data.model_dump())
 
 
+@user_blueprint.post("import")
+async def user_import(request: Request, stream_data: StreamData[UserInfoModel]):
+    """
+    批量导入用户，请求体为NDJSON或json数组，边接收边校验
+    """
+    count = 0
+    async for user in stream_data:
+        logger.debug(f"导入用户: {user.user_id}")
+        count += 1
+    return json({"count": count})
+
+
+@user_blueprint.post("avatar")
+async def user_avatar(request: Request, files_data: UserAvatarModel):
+    """
+    上传用户头像，请求体边接收边解析，较大的文件写入临时文件
+    """
+    avatar = files_data.avatar
+    logger.debug(f"用户 {files_data.user_id} 上传头像: {avatar.filename} {avatar.size}字节")
+    return json({"filename": avatar.filename, "size": avatar.size})
+
+
 class App(BaseApp):
     """
     服务示例
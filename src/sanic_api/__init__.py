@@ -1,3 +1,15 @@
-from sanic_api.logger.extension import LoggerExtend
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from sanic_api.logger.extension import LoggerExtend
 
 __version__ = "0.3.0a4"
+
+
+def __getattr__(name: str):
+    # 延迟导入，只导入sanic_api时不需要加载sanic、loguru等依赖
+    if name == "LoggerExtend":
+        from sanic_api.logger.extension import LoggerExtend
+
+        return LoggerExtend
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,5 +1,8 @@
+from sanic_api.api.context import RequestContext, bind_context, get_request_context, run_in_executor
 from sanic_api.api.request import Request
-from sanic_api.api.response import BaseResp, BaseRespTml, TempModel
+from sanic_api.api.response import BaseResp, BaseRespTml, StreamResp, StreamRespTml, TempModel
+from sanic_api.api.stream import StreamData
+from sanic_api.api.upload import UploadFile
 
 """
 class BaseResponseModel(BaseModel):
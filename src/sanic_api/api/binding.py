@@ -0,0 +1,251 @@
+import inspect
+from collections.abc import Collection
+from dataclasses import dataclass, field
+from types import NoneType, UnionType
+from typing import Annotated, Any, Union, get_args, get_origin
+
+from pydantic import AliasChoices, AliasPath, BaseModel
+from sanic import Request as SanicRequest
+from sanic_routing import Route
+
+from sanic_api.api.stream import StreamData
+
+# 可以从请求中绑定的参数名
+PARAM_NAMES = ("json_data", "form_data", "query_data", "files_data")
+
+# 模型对应的字段索引
+_field_indexes: dict[type[BaseModel], "FieldIndex"] = {}
+
+
+@dataclass(frozen=True)
+class FieldIndex:
+    """
+    模型字段的索引
+    form和query参数的值都是列表，按字段是否是列表类型预先分好类，每个模型只生成一次，
+    请求时只需要一次字典推导就能把非列表字段的值解包
+    """
+
+    # 非列表类型字段的参数名（包括别名），只有一个值时需要解包
+    scalar_fields: frozenset[str]
+
+    # 列表类型字段的参数名（包括别名）
+    collection_fields: frozenset[str]
+
+    # 模型中所有字段的参数名，为空时表示需要保留模型中不存在的参数（模型允许或禁止额外的字段）
+    known_fields: frozenset[str] | None
+
+    @classmethod
+    def get(cls, data_type: type[BaseModel]) -> "FieldIndex":
+        """
+        获取模型的字段索引，没有则先生成
+        Args:
+            data_type: 参数模型
+
+        Returns:
+            字段索引
+        """
+        index = _field_indexes.get(data_type)
+        if index is None:
+            index = _field_indexes[data_type] = cls.build(data_type)
+        return index
+
+    @classmethod
+    def build(cls, data_type: type[BaseModel]) -> "FieldIndex":
+        """
+        生成模型的字段索引
+        Args:
+            data_type: 参数模型
+
+        Returns:
+            字段索引
+        """
+        populate_by_name = data_type.model_config.get("populate_by_name", False)
+        scalar_fields, collection_fields = set(), set()
+        for name, model_field in data_type.model_fields.items():
+            keys, path_keys = cls._get_keys(model_field.validation_alias or name)
+            if populate_by_name:
+                keys.add(name)
+            if cls._is_collection(model_field.annotation):
+                collection_fields |= keys
+            else:
+                scalar_fields |= keys
+            # AliasPath需要按下标从列表中取值，不能解包
+            collection_fields |= path_keys
+
+        scalar_fields -= collection_fields
+        known_fields = None
+        if data_type.model_config.get("extra") not in ("allow", "forbid"):
+            known_fields = frozenset(scalar_fields | collection_fields)
+        return cls(frozenset(scalar_fields), frozenset(collection_fields), known_fields)
+
+    def unwrap(self, params: dict[str, list]) -> dict[str, Any]:
+        """
+        解包form或query参数中非列表字段的值，并跳过模型中不存在的参数
+        Args:
+            params: form或query参数
+
+        Returns:
+            可以直接传给模型的数据
+        """
+        scalar_fields, known_fields = self.scalar_fields, self.known_fields
+        if known_fields is None:
+            return {k: v[0] if k in scalar_fields and len(v) == 1 else v for k, v in params.items()}
+        return {k: v[0] if k in scalar_fields and len(v) == 1 else v for k, v in params.items() if k in known_fields}
+
+    @staticmethod
+    def _get_keys(alias: str | AliasChoices | AliasPath) -> tuple[set[str], set[str]]:
+        """
+        获取字段在参数中的名称
+        Args:
+            alias: 字段名或校验别名
+
+        Returns:
+            (直接取值的名称, AliasPath取值的名称)
+        """
+        choices = alias.choices if isinstance(alias, AliasChoices) else [alias]
+        keys, path_keys = set(), set()
+        for choice in choices:
+            if isinstance(choice, AliasPath):
+                if isinstance(choice.path[0], str):
+                    path_keys.add(choice.path[0])
+            else:
+                keys.add(choice)
+        return keys, path_keys
+
+    @classmethod
+    def _is_collection(cls, annotation: Any) -> bool:
+        """
+        字段类型是否是列表类型，会展开Annotated以及Optional、Union，其中任意一个是列表类型即可
+        Args:
+            annotation: 字段类型
+
+        Returns:
+
+        """
+        origin = get_origin(annotation)
+        if origin is Annotated:
+            return cls._is_collection(get_args(annotation)[0])
+        if origin is Union or origin is UnionType:
+            return any(cls._is_collection(arg) for arg in get_args(annotation) if arg is not NoneType)
+        arg_type = origin or annotation
+        return inspect.isclass(arg_type) and issubclass(arg_type, Collection) and not issubclass(arg_type, str | bytes)
+
+
+@dataclass(frozen=True)
+class BindingPlan:
+    """
+    路由的参数绑定计划
+    在服务启动时根据路由处理函数的签名编译一次，缓存在路由的ctx上，请求时直接使用
+    """
+
+    # 自定义的请求类
+    request_type: type[SanicRequest] | None = None
+
+    # 各个参数的模型类型
+    json_data_type: type[BaseModel] | None = None
+    form_data_type: type[BaseModel] | None = None
+    query_data_type: type[BaseModel] | None = None
+
+    # multipart上传的参数模型，存在时multipart请求体不会被缓冲，文件字段使用UploadFile类型
+    files_data_type: type[BaseModel] | None = None
+
+    # 流式请求数据中每个元素的模型类型，存在时请求体不会被缓冲
+    stream_data_type: type[BaseModel] | None = None
+
+    # 需要注入到处理函数参数里的参数名
+    inject_args: frozenset[str] = field(default_factory=frozenset)
+
+    # form、query和files参数模型的字段索引，用于解包只有一个值的非列表字段
+    field_indexes: dict[str, FieldIndex] = field(default_factory=dict)
+
+    @classmethod
+    def compile(cls, route: Route) -> "BindingPlan":
+        """
+        编译路由的绑定计划并缓存到路由上
+        Args:
+            route: 路由
+
+        Returns:
+            绑定计划
+        """
+        # 避免循环导入
+        from sanic_api.api.request import Request
+
+        # 处理函数被装饰器包装过时（例如缓存），使用原始函数的签名
+        arg_spec = inspect.getfullargspec(inspect.unwrap(route.handler))
+
+        def _get_type(name: str, base_type: type):
+            arg_type = arg_spec.annotations.get(name)
+            is_name = name in arg_spec.args
+            is_type = inspect.isclass(arg_type) and issubclass(arg_type, base_type)
+            if is_name and is_type and arg_type not in (Request, SanicRequest):
+                return arg_type
+            return None
+
+        # 从函数参数注解上面获取类型
+        param_types = {name: _get_type(name, BaseModel) for name in PARAM_NAMES}
+        inject_args = frozenset(name for name, param_type in param_types.items() if param_type)
+
+        # 没有对应参数 但是有自定义的request类就从request类上面获取对应的类型
+        request_type = _get_type("request", Request)
+        if request_type:
+            for name, param_type in param_types.items():
+                if not param_type:
+                    param_types[name] = request_type.__annotations__.get(name)
+
+        # 流式请求数据的元素类型
+        stream_data_type = None
+        if "stream_data" in arg_spec.args:
+            stream_data_type = cls._get_stream_item_type(arg_spec.annotations.get("stream_data"))
+        if stream_data_type:
+            inject_args |= {"stream_data"}
+        elif request_type:
+            stream_data_type = cls._get_stream_item_type(request_type.__annotations__.get("stream_data"))
+
+        field_indexes = {
+            name: FieldIndex.get(param_type)
+            for name, param_type in param_types.items()
+            if name != "json_data" and param_type
+        }
+
+        plan = cls(
+            request_type=request_type,
+            json_data_type=param_types["json_data"],
+            form_data_type=param_types["form_data"],
+            query_data_type=param_types["query_data"],
+            files_data_type=param_types["files_data"],
+            stream_data_type=stream_data_type,
+            inject_args=inject_args,
+            field_indexes=field_indexes,
+        )
+        route.ctx.binding_plan = plan
+        return plan
+
+    @classmethod
+    def get(cls, route: Route) -> "BindingPlan":
+        """
+        获取路由的绑定计划，没有编译过则先编译
+        Args:
+            route: 路由
+
+        Returns:
+            绑定计划
+        """
+        plan = getattr(route.ctx, "binding_plan", None)
+        return plan or cls.compile(route)
+
+    @staticmethod
+    def _get_stream_item_type(annotation) -> type[BaseModel] | None:
+        """
+        从 StreamData[ItemModel] 注解中获取元素的模型类型
+        Args:
+            annotation: 参数注解
+
+        Returns:
+            元素的模型类型
+        """
+        origin = get_origin(annotation)
+        if not (inspect.isclass(origin) and issubclass(origin, StreamData)):
+            return None
+        item_type = get_args(annotation)[0]
+        return item_type if inspect.isclass(item_type) and issubclass(item_type, BaseModel) else None
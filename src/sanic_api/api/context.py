@@ -0,0 +1,209 @@
+import asyncio
+import os
+import re
+import uuid
+from collections.abc import Callable
+from concurrent.futures import Executor
+from contextvars import ContextVar, Token, copy_context
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, TypeVar
+
+from sanic import HTTPResponse, Request, Sanic
+from sanic.models.server_types import ConnInfo
+from sanic_routing import Route
+
+T = TypeVar("T")
+
+# 传入传出的链路追踪头
+TRACEPARENT_HEADER = "traceparent"
+
+# 传入的请求ID只接受可见的ASCII字符，避免日志注入和超长的ID
+_REQUEST_ID_RE = re.compile(r"[!-~]{1,128}")
+
+# W3C traceparent: 版本-追踪ID-父span ID-标志
+_TRACEPARENT_RE = re.compile(r"([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})")
+
+_request_context: ContextVar["RequestContext | None"] = ContextVar("sanic_api_request_context", default=None)
+
+
+@dataclass(slots=True)
+class RequestContext:
+    """
+    请求上下文
+    请求开始时创建一次，保存在contextvars中，日志、指标和用户代码可以直接读取，不需要查找app和请求对象。
+    asyncio的任务会自动继承；线程池中执行时使用run_in_executor复制上下文，进程池中执行时传递的是它的副本
+    """
+
+    # 请求ID，优先使用请求头中传入的
+    request_id: str
+
+    # 链路追踪ID，优先使用traceparent请求头中传入的
+    trace_id: str
+
+    # 当前服务的span ID，向下游传递时作为父span ID
+    span_id: str
+
+    # 上游服务的span ID，没有传入traceparent时为空
+    parent_span_id: str | None = None
+
+    # traceparent的标志位，01表示上游已经采样
+    trace_flags: str = "01"
+
+    # 路由名称，路由匹配后设置
+    route_name: str | None = None
+
+    # 用户自定义的字段，会加入到请求中的所有日志
+    extra: dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_headers(cls, headers, request_id_header: str = "X-Request-ID") -> "RequestContext":
+        """
+        根据请求头创建请求上下文
+        Args:
+            headers: 请求头
+            request_id_header: 请求ID的请求头名称
+
+        Returns:
+
+        """
+        new_id = uuid.uuid4()
+        request_id = headers.get(request_id_header)
+        if not request_id or not _REQUEST_ID_RE.fullmatch(request_id):
+            request_id = str(new_id)
+
+        match = _TRACEPARENT_RE.fullmatch(headers.get(TRACEPARENT_HEADER, "").strip())
+        if match and match[1] != "ff" and match[2] != "0" * 32 and match[3] != "0" * 16:
+            trace_id, parent_span_id, trace_flags = match[2], match[3], match[4]
+        else:
+            trace_id, parent_span_id, trace_flags = new_id.hex, None, "01"
+        return cls(request_id, trace_id, os.urandom(8).hex(), parent_span_id, trace_flags)
+
+    @property
+    def traceparent(self) -> str:
+        """
+        向下游传递的traceparent
+        """
+        return f"00-{self.trace_id}-{self.span_id}-{self.trace_flags}"
+
+    def outbound_headers(self, request_id_header: str = "X-Request-ID") -> dict[str, str]:
+        """
+        调用下游服务时需要带上的请求头
+        Args:
+            request_id_header: 请求ID的请求头名称
+
+        Returns:
+
+        """
+        return {request_id_header: self.request_id, TRACEPARENT_HEADER: self.traceparent}
+
+    def log_fields(self) -> dict[str, Any]:
+        """
+        加入到日志中的字段
+        Returns:
+
+        """
+        return {"req_id": self.request_id, "trace_id": self.trace_id, **self.extra}
+
+
+def get_request_context() -> RequestContext | None:
+    """
+    获取当前的请求上下文，不在请求中时返回None
+    Returns:
+
+    """
+    return _request_context.get()
+
+
+def set_request_context(context: RequestContext | None):
+    """
+    设置当前的请求上下文
+    Args:
+        context: 请求上下文
+
+    Returns:
+        用于恢复的token
+    """
+    return _request_context.set(context)
+
+
+def reset_request_context(token: Token):
+    """
+    把请求上下文恢复到设置之前的值
+    Args:
+        token: 设置时返回的token
+
+    Returns:
+
+    """
+    _request_context.reset(token)
+
+
+def bind_context(**fields: Any):
+    """
+    给当前的请求上下文加入自定义的字段，之后这个请求中的日志都会带上这些字段，不在请求中时忽略
+    Args:
+        **fields: 字段
+
+    Returns:
+
+    """
+    context = _request_context.get()
+    if context is not None:
+        context.extra.update(fields)
+
+
+async def run_in_executor(executor: Executor | None, func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    在线程池中执行函数，并复制当前的上下文，函数中的日志同样带有请求ID
+    loop.run_in_executor不会复制contextvars，需要在线程池中执行时使用这个函数代替
+    Args:
+        executor: 线程池，为空时使用事件循环默认的线程池
+        func: 执行的函数
+        *args: 位置参数
+        **kwargs: 关键字参数
+
+    Returns:
+        函数的返回值
+    """
+    context = copy_context()
+    return await asyncio.get_running_loop().run_in_executor(executor, partial(context.run, func, *args, **kwargs))
+
+
+def setup_request_context(app: Sanic):
+    """
+    注册请求上下文的信号：路由匹配后记录路由名称，响应中带上请求ID，连接结束时恢复上下文
+    请求上下文本身在请求对象创建时就已经设置好了，同一个连接中的请求依次覆盖
+    Args:
+        app: Sanic App
+
+    Returns:
+
+    """
+
+    async def _on_routing_after(request: Request, route: Route, **_):
+        context = getattr(request, "request_context", None)
+        if context is not None:
+            context.route_name = route.name
+
+    async def _on_response(request: Request, response: HTTPResponse):
+        context = getattr(request, "request_context", None)
+        if context is not None:
+            header = request.app.config.REQUEST_ID_HEADER
+            if header not in response.headers:
+                response.headers[header] = context.request_id
+
+    async def _on_begin(conn_info: ConnInfo):
+        # 连接中的请求都在连接的任务中创建，记录连接开始时的状态，连接结束时恢复，之后的日志不会带上最后一个请求的ID
+        conn_info.ctx.request_context_token = set_request_context(None)
+
+    async def _on_complete(conn_info: ConnInfo):
+        token = getattr(conn_info.ctx, "request_context_token", None)
+        if token is not None:
+            reset_request_context(token)
+            conn_info.ctx.request_context_token = None
+
+    app.signal("http.lifecycle.begin")(_on_begin)
+    app.signal("http.routing.after")(_on_routing_after)
+    app.signal("http.lifecycle.response")(_on_response)
+    app.signal("http.lifecycle.complete")(_on_complete)
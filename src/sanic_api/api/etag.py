@@ -0,0 +1,71 @@
+import hashlib
+
+from sanic import HTTPResponse, Request
+from sanic.compat import Header
+
+# 只有这些请求方法才会根据If-None-Match返回304
+_CONDITIONAL_METHODS = frozenset(("GET", "HEAD"))
+
+
+def make_etag(body: bytes) -> str:
+    """
+    根据响应体生成ETag
+    Args:
+        body: 序列化后的响应体
+
+    Returns:
+
+    """
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def format_etag(version: str | int) -> str:
+    """
+    把用户提供的版本号格式化成ETag
+    Args:
+        version: 数据的版本号，例如更新时间戳、数据的哈希等
+
+    Returns:
+
+    """
+    version = str(version)
+    if version.startswith(('"', 'W/"')):
+        return version
+    return f'"{version}"'
+
+
+def etag_matches(request: Request | None, etag: str) -> bool:
+    """
+    请求的If-None-Match是否匹配ETag，使用弱比较
+    Args:
+        request: 请求
+        etag: ETag
+
+    Returns:
+
+    """
+    if request is None or request.method not in _CONDITIONAL_METHODS:
+        return False
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    etag = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def not_modified(etag: str, headers: Header | dict[str, str] | None = None) -> HTTPResponse:
+    """
+    生成304响应
+    Args:
+        etag: ETag
+        headers: 响应头
+
+    Returns:
+
+    """
+    headers = Header(headers or {})
+    headers["etag"] = etag
+    return HTTPResponse(status=304, headers=headers)
@@ -1,9 +1,18 @@
-import inspect
-from collections.abc import Collection
-from typing import get_origin
+from time import perf_counter
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+from sanic import BadRequest, HTTPResponse
 from sanic import Request as SanicRequest
+from sanic.headers import parse_content_header
+from sanic.models.server_types import ConnInfo
+from sanic.response import BaseHTTPResponse
+from sanic_routing import Route
+
+from sanic_api.api.binding import BindingPlan
+from sanic_api.api.context import RequestContext, set_request_context
+from sanic_api.api.etag import etag_matches, format_etag, not_modified
+from sanic_api.api.stream import StreamData
+from sanic_api.api.upload import DEFAULT_SPOOL_SIZE, MultipartParser, UploadFile, close_files
 
 
 class Request(SanicRequest):
@@ -15,14 +24,55 @@ class Request(SanicRequest):
     json_data: BaseModel
     form_data: BaseModel
     query_data: BaseModel
+    files_data: BaseModel
+    stream_data: StreamData
+
+    # 请求上下文，创建请求时设置到contextvars中
+    request_context: RequestContext
+
+    # 请求各阶段的耗时，单位秒，用于指标统计
+    phase_times: dict[str, float]
+    # 参数是否校验失败
+    validation_failed: bool
 
     _request_type: type["Request"] | None
     _json_data_type: type[BaseModel] | None
     _form_data_type: type[BaseModel] | None
     _query_data_type: type[BaseModel] | None
+    _files_data_type: type[BaseModel] | None
+    _binding_plan: BindingPlan
+    # 增量解析出来的multipart参数
+    _files_params: dict[str, list[str | UploadFile]] | None
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.phase_times = {}
+        self.validation_failed = False
+        self._files_params = None
+        self.request_context = RequestContext.from_headers(self.headers, self.app.config.REQUEST_ID_HEADER)
+        set_request_context(self.request_context)
+
+    def generate_id(self) -> str:
+        """
+        没有传入请求ID时使用请求上下文中生成的，保证request.id和日志中的请求ID一致
+        Returns:
+
+        """
+        return self.request_context.request_id
+
+    def check_not_modified(self, version: str | int) -> HTTPResponse | None:
+        """
+        根据数据的版本号检查客户端缓存的数据是否仍然有效
+        在处理函数开始时调用，有效时直接返回304响应，跳过后续的查询和序列化。
+        生成响应时把同样的版本号传给resp方法，客户端下次请求就会带上它
+        Args:
+            version: 数据的版本号，例如更新时间戳、数据的哈希等
+
+        Returns:
+            客户端缓存有效时返回304响应，否则返回None
+        """
+        etag = format_etag(version)
+        return not_modified(etag) if etag_matches(self, etag) else None
 
     async def receive_body(self):
         """
@@ -31,55 +81,137 @@ class Request(SanicRequest):
         Returns:
 
         """
-        await super().receive_body()
-        self._get_data_type()
-        self._load_data()
+        self._binding_plan = BindingPlan.get(self.route)
+        if self._binding_plan.stream_data_type:
+            # 流式模式下不缓冲请求体，请求体的大小也不再限制
+            self.stream.request_max_size = float("inf")
+        elif self._binding_plan.files_data_type and self.content_type.startswith("multipart/form-data"):
+            start_time = perf_counter()
+            await self._receive_files()
+            self.phase_times["receive"] = perf_counter() - start_time
+        else:
+            start_time = perf_counter()
+            await super().receive_body()
+            self.phase_times["receive"] = perf_counter() - start_time
+
+        self._bind_data()
 
-    def _get_type(self, name: str, base_type: type):
+    @staticmethod
+    async def bind_without_body(request: "Request", route: Route, **_):
         """
-        获取指定属性的类型
+        路由匹配后的信号处理函数
+        请求没有请求体时（例如GET请求）sanic不会调用receive_body，在这里绑定query_data等参数
         Args:
-            name: 属性名字
-            base_type: 所属的基本类型
+            request: 请求
+            route: 路由
 
         Returns:
-            对于参数返回BaseModel或None
-            对于情求类型返回Request或None
+
         """
+        stream = request.stream
+        if stream is not None and stream.request_body and not route.extra.ignore_body:
+            return
+        request._binding_plan = BindingPlan.get(route)
+        request._bind_data()
 
-        route_handler_arg_spec = inspect.getfullargspec(self.route.handler)
-        arg_type = route_handler_arg_spec.annotations.get(name)
-        is_name = name in route_handler_arg_spec.args
-        is_type = arg_type and issubclass(arg_type, base_type) and arg_type not in (Request, SanicRequest)
-        if is_name and is_type:
-            return arg_type
-        return None
+    @staticmethod
+    async def close_files_on_response(request: "Request", response: BaseHTTPResponse):
+        """
+        响应时的信号处理函数，关闭上传的文件，释放写入的临时文件
+        Args:
+            request: 请求
+            response: 响应
+
+        Returns:
 
-    def _get_data_type(self):
         """
-        获取json_data、form_data、query_data、request的类型
-        如果定义了request就从request上面获取上述类型
+        files_params = getattr(request, "_files_params", None)
+        if not files_params:
+            return
+        close_files(files_params)
+        if request.conn_info is not None:
+            request.conn_info.ctx.files_params = None
+
+    @staticmethod
+    async def close_files_on_complete(conn_info: ConnInfo):
+        """
+        连接结束时的信号处理函数，客户端提前断开或者流式响应时没有响应的信号，在这里关闭上传的文件
+        Args:
+            conn_info: 连接信息
+
         Returns:
 
         """
+        files_params = getattr(conn_info.ctx, "files_params", None)
+        if files_params:
+            close_files(files_params)
+            conn_info.ctx.files_params = None
 
-        # 从函数参数注解上面获取类型
-        self._json_data_type = self._get_type("json_data", BaseModel)
-        self._form_data_type = self._get_type("form_data", BaseModel)
-        self._query_data_type = self._get_type("query_data", BaseModel)
-        self._request_type = self._get_type("request", Request)
+    async def _receive_files(self):
+        """
+        增量解析multipart请求体，不缓冲整个请求体，文件超出阈值后写入临时文件
+        Returns:
 
-        # 没有json_data参数 但是有自定义的request类就从request类上面获取json_data类型
-        if self._request_type and not self._json_data_type:
-            self._json_data_type = self._request_type.__annotations__.get("json_data")
+        """
+        _, options = parse_content_header(self.content_type)
+        boundary = options.get("boundary")
+        if not boundary:
+            raise BadRequest("multipart请求缺少boundary")
 
-        # 没有form_data参数 但是有自定义的request类就从request类上面获取form_data类型
-        if self._request_type and not self._form_data_type:
-            self._form_data_type = self._request_type.__annotations__.get("form_data")
+        config = self.app.config
+        upload_max_size = config.get("UPLOAD_MAX_SIZE")
+        if upload_max_size:
+            self.stream.request_max_size = upload_max_size
 
-        # 没有query_data参数 但是有自定义的request类就从request类上面获取query_data类型
-        if self._request_type and not self._query_data_type:
-            self._query_data_type = self._request_type.__annotations__.get("query_data")
+        parser = MultipartParser(boundary.encode(), spool_size=config.get("UPLOAD_SPOOL_SIZE", DEFAULT_SPOOL_SIZE))
+        try:
+            async for chunk in self.stream:
+                parser.feed(chunk)
+        except BaseException:
+            parser.discard()
+            raise
+        self._files_params = parser.close()
+        # HTTP/1.1的一个连接同时只会处理一个请求，记录在连接上，连接结束时确保关闭
+        if self.conn_info is not None:
+            self.conn_info.ctx.files_params = self._files_params
+
+    def _bind_data(self):
+        """
+        校验并注入参数，记录校验的耗时
+        Returns:
+
+        """
+        self._get_data_type()
+        start_time = perf_counter()
+        try:
+            self._load_data()
+        except ValidationError:
+            self.validation_failed = True
+            raise
+        finally:
+            self.phase_times["validate"] = perf_counter() - start_time
+
+    def _mark_validation_failed(self):
+        """
+        标记参数校验失败，流式请求体在迭代中校验失败时调用
+        Returns:
+
+        """
+        self.validation_failed = True
+
+    def _get_data_type(self):
+        """
+        获取json_data、form_data、query_data、request的类型
+        类型在路由的绑定计划中已经预先编译好了，这里直接取用
+        Returns:
+
+        """
+        plan = self._binding_plan
+        self._request_type = plan.request_type
+        self._json_data_type = plan.json_data_type
+        self._form_data_type = plan.form_data_type
+        self._query_data_type = plan.query_data_type
+        self._files_data_type = plan.files_data_type
 
     # noinspection PyBroadException
     def _load_data(self):
@@ -89,50 +221,79 @@ class Request(SanicRequest):
         Returns:
 
         """
-        route_handler_arg_spec = inspect.getfullargspec(self.route.handler)
+        plan = self._binding_plan
 
         def _set_arg(name, value):
-            arg_type = route_handler_arg_spec.annotations.get(name)
-            if name in route_handler_arg_spec.args and issubclass(arg_type, BaseModel):
+            if name in plan.inject_args:
                 self.match_info.update({name: value})
 
-        def _proc_param_data(data: dict, data_type: BaseModel | None):
-            for k, v in data.items():
-                if isinstance(v, list) and len(v) == 1:
-                    field = data_type.model_fields.get(k)
-                    if not field:
-                        continue
-                    arg_type = field.annotation
-                    arg_type = get_origin(arg_type) or arg_type
-                    is_list = issubclass(arg_type, Collection) and arg_type is not str
-                    if not is_list:
-                        data[k] = v[0]
-            return data
-
-        try:
-            json_data = self.json
-        except Exception:
-            json_data = None
-        if json_data and self._json_data_type:
-            self.json_data = self._json_data_type(**json_data)
-            _set_arg("json_data", self.json_data)
+        # json参数直接从原始的请求体字节进行校验，解析和校验在pydantic-core中一次完成
+        # 不去访问self.json，只有用户代码用到时才会再去解析
+        if self.body and self._json_data_type:
+            json_data = self._load_json_data(self._json_data_type)
+            if json_data is not None:
+                self.json_data = json_data
+                _set_arg("json_data", self.json_data)
 
         # 由于form和query的参数的key是可以重复的，所以默认类型是类似dict[str, list]的
-        # 这里做了个处理，如果key的数量是1个则直接转为dict[str, dict]
-        try:
-            form_data = self.form
-        except Exception:
-            form_data = None
-        if form_data and self._form_data_type:
-            form_data = _proc_param_data(form_data, self._form_data_type)
-            self.form_data = self._form_data_type(**form_data)
-            _set_arg("form_data", self.form_data)
+        # 这里按模型的字段索引把非列表字段只有一个的值解包，模型中不存在的参数直接跳过
+        # 没有对应的参数模型时不去解析form和query参数
+        if self._form_data_type:
+            try:
+                form_data = self.form
+            except Exception:
+                form_data = None
+            if form_data:
+                form_data = plan.field_indexes["form_data"].unwrap(form_data)
+                self.form_data = self._form_data_type(**form_data)
+                _set_arg("form_data", self.form_data)
+
+        if self._query_data_type:
+            try:
+                query_data = self.args
+            except Exception:
+                query_data = None
+            if query_data:
+                query_data = plan.field_indexes["query_data"].unwrap(query_data)
+                self.query_data = self._query_data_type(**query_data)
+                _set_arg("query_data", self.query_data)
 
+        # 上传的参数优先使用增量解析出来的，不是multipart请求时使用普通的form参数
+        if self._files_data_type:
+            files_params = self._files_params
+            if files_params is None:
+                try:
+                    files_params = self.form
+                except Exception:
+                    files_params = None
+            if files_params:
+                files_data = plan.field_indexes["files_data"].unwrap(files_params)
+                try:
+                    self.files_data = self._files_data_type(**files_data)
+                except ValidationError:
+                    close_files(self._files_params or {})
+                    raise
+                _set_arg("files_data", self.files_data)
+
+        if self._binding_plan.stream_data_type:
+            self.stream_data = StreamData(
+                self.stream, self._binding_plan.stream_data_type, on_invalid=self._mark_validation_failed
+            )
+            _set_arg("stream_data", self.stream_data)
+
+    def _load_json_data(self, data_type: type[BaseModel]) -> BaseModel | None:
+        """
+        从请求体字节中加载并校验json参数
+        Args:
+            data_type: json参数的模型类型
+
+        Returns:
+            校验后的模型，如果请求体不是json则返回None
+        """
         try:
-            query_data = self.args
-        except Exception:
-            query_data = None
-        if query_data and self._query_data_type:
-            query_data = _proc_param_data(query_data, self._query_data_type)
-            self.query_data = self._query_data_type(**query_data)
-            _set_arg("query_data", self.query_data)
+            return data_type.model_validate_json(self.body)
+        except ValidationError as e:
+            # 请求体不是json的情况和之前一样忽略掉，其他的校验错误正常抛出
+            if all(err["type"] == "json_invalid" for err in e.errors()):
+                return None
+            raise
@@ -1,8 +1,61 @@
-from typing import Any, ClassVar
+import inspect
+from collections.abc import AsyncIterable, AsyncIterator, Callable, Iterable
+from time import perf_counter
+from typing import Any, ClassVar, Generic, TypeVar, get_args
 
-from pydantic import BaseModel, Field, PrivateAttr
+from pydantic import BaseModel, Field, PrivateAttr, ValidationError, create_model
+from pydantic_core import to_json
 from sanic.compat import Header
-from sanic.response import JSONResponse
+from sanic.response import HTTPResponse, ResponseStream
+
+from sanic_api.api.etag import etag_matches, format_etag, make_etag, not_modified
+from sanic_api.api.request import Request
+
+JSON_CONTENT_TYPE = "application/json"
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+def _json_resp(
+    serialize: Callable[[], bytes],
+    status: int,
+    headers: Header | dict[str, str] | None,
+    etag: bool,
+    version: str | int | None,
+) -> HTTPResponse:
+    """
+    生成json响应，按需加上ETag
+    提供了版本号时在序列化之前就检查If-None-Match，匹配则直接返回304，不再序列化
+    Args:
+        serialize: 序列化响应体的方法
+        status: 状态码
+        headers: 响应头
+        etag: 是否根据响应体生成ETag
+        version: 数据的版本号，存在时使用它作为ETag
+
+    Returns:
+
+    """
+    request = Request._current.get(None)
+    tag = format_etag(version) if version is not None else None
+    if tag and status == 200 and etag_matches(request, tag):
+        return not_modified(tag, headers)
+
+    start_time = perf_counter()
+    body = serialize()
+    if isinstance(request, Request):
+        phase_times = request.phase_times
+        phase_times["serialize"] = phase_times.get("serialize", 0) + perf_counter() - start_time
+
+    if tag is None and etag:
+        tag = make_etag(body)
+        if status == 200 and etag_matches(request, tag):
+            return not_modified(tag, headers)
+    if tag:
+        headers = Header(headers or {})
+        headers["etag"] = tag
+    return HTTPResponse(body, status=status, headers=headers, content_type=JSON_CONTENT_TYPE)
 
 
 class TempModel(BaseModel):
@@ -18,17 +71,228 @@ class TempModel(BaseModel):
 class BaseResp(BaseModel):
     temp_data: ClassVar = Ellipsis
 
-    def resp(self, status: int = 200, headers: Header | dict[str, str] | None = None) -> JSONResponse:
-        data = self.model_dump(mode="json")
-        return JSONResponse(data, status=status, headers=headers)
+    def resp(
+        self,
+        status: int = 200,
+        headers: Header | dict[str, str] | None = None,
+        *,
+        etag: bool = False,
+        version: str | int | None = None,
+    ) -> HTTPResponse:
+        """
+        生成响应
+        Args:
+            status: 状态码
+            headers: 响应头
+            etag: 是否根据响应体生成ETag，客户端的If-None-Match匹配时返回304
+            version: 数据的版本号，存在时使用它作为ETag，匹配时不再序列化
+
+        Returns:
+
+        """
+        return _json_resp(self._to_json, status, headers, etag, version)
+
+    def _to_json(self) -> bytes:
+        # 直接由pydantic-core序列化成json字节，不经过中间的dict
+        return self.__pydantic_serializer__.to_json(self)
 
 
 class BaseRespTml(BaseModel):
     temp_data: TempModel | None = Field(default_factory=TempModel)
 
-    def resp(self, status: int = 200, headers: Header | dict[str, str] | None = None) -> JSONResponse:
+    # 按响应类预先编译好的模板模型，它的数据字段就是响应类本身，整个响应体可以一次序列化
+    _tml_model: ClassVar[type[TempModel] | None] = None
+    _tml_temp_type: ClassVar[type[TempModel] | None] = None
+    _tml_data_field: ClassVar[str | None] = None
+    _tml_exclude: ClassVar[dict[str, set[str]] | None] = None
+
+    @classmethod
+    def __pydantic_init_subclass__(cls, **kwargs: Any):
+        super().__pydantic_init_subclass__(**kwargs)
+        cls._compile_tml()
+
+    @classmethod
+    def _compile_tml(cls):
+        """
+        编译模板模型
+        模板类型取自temp_data字段的注解，所以在项目的响应基类上重新声明temp_data即可全局替换模板
+        Returns:
+
+        """
+        cls._tml_model = cls._tml_temp_type = cls._tml_data_field = cls._tml_exclude = None
+        if not cls.__pydantic_complete__:
+            return
+
+        temp_types = [t for t in get_args(cls.model_fields["temp_data"].annotation) if t is not type(None)]
+        temp_type = temp_types[0] if temp_types else cls.model_fields["temp_data"].annotation
+        if not (inspect.isclass(temp_type) and issubclass(temp_type, TempModel)):
+            return
+
+        try:
+            tmp_data_field_name = temp_type().get_data_field_name()
+        except ValidationError:
+            return
+        data_field = temp_type.model_fields.get(tmp_data_field_name)
+        if not data_field:
+            return
+
+        cls._tml_model = create_model(
+            f"{cls.__name__}Tml",
+            __base__=temp_type,
+            __module__=cls.__module__,
+            **{
+                tmp_data_field_name: (
+                    cls | None,
+                    Field(default=None, title=data_field.title, description=data_field.description),
+                )
+            },
+        )
+        cls._tml_temp_type = temp_type
+        cls._tml_data_field = tmp_data_field_name
+        cls._tml_exclude = {tmp_data_field_name: {"temp_data"}}
+
+    def resp(
+        self,
+        status: int = 200,
+        headers: Header | dict[str, str] | None = None,
+        *,
+        etag: bool = False,
+        version: str | int | None = None,
+    ) -> HTTPResponse:
+        """
+        生成带模板的响应，ETag根据包含模板在内的整个响应体生成
+        Args:
+            status: 状态码
+            headers: 响应头
+            etag: 是否根据响应体生成ETag，客户端的If-None-Match匹配时返回304
+            version: 数据的版本号，存在时使用它作为ETag，匹配时不再序列化
+
+        Returns:
+
+        """
+        return _json_resp(self._to_json, status, headers, etag, version)
+
+    def _to_json(self) -> bytes:
+        tml_model = self._tml_model
+        if tml_model and type(self.temp_data) is self._tml_temp_type:
+            # 不经过校验直接构造编译好的模板模型，数据字段的类型是确定的，不需要运行时推断
+            temp_data = self.temp_data
+            tml_data = {**temp_data.__dict__, **(temp_data.__pydantic_extra__ or {}), self._tml_data_field: self}
+            tml = tml_model.model_construct(temp_data.__pydantic_fields_set__, **tml_data)
+            exclude = self._tml_exclude
+        else:
+            # 把自身放入模板的数据字段中，整个响应体一次序列化完成
+            tmp_data_field_name = self.temp_data.get_data_field_name()
+            tml = self.temp_data.model_copy(update={tmp_data_field_name: self})
+            exclude = {tmp_data_field_name: {"temp_data"}}
+        return tml.__pydantic_serializer__.to_json(tml, exclude=exclude)
+
+
+class StreamResp(Generic[ModelT]):
+    """
+    流式的列表响应
+    逐个序列化迭代器中的模型并分块写出，内存占用和数据条数无关
+    """
+
+    def __init__(
+        self,
+        items: Iterable[ModelT] | AsyncIterable[ModelT],
+        *,
+        ndjson: bool = False,
+        chunk_size: int = 64 * 1024,
+    ):
+        """
+        Args:
+            items: 模型的同步或异步迭代器
+            ndjson: 是否以NDJSON格式输出，默认输出json数组
+            chunk_size: 缓冲多少字节后写出一个数据块
+        """
+        self.items = items
+        self.ndjson = ndjson
+        self.chunk_size = chunk_size
+
+    def resp(self, status: int = 200, headers: Header | dict[str, str] | None = None) -> ResponseStream:
+        content_type = NDJSON_CONTENT_TYPE if self.ndjson else JSON_CONTENT_TYPE
+        return ResponseStream(self._write, status=status, headers=headers, content_type=content_type)
+
+    async def _write(self, response: ResponseStream):
+        """
+        把数据块写入响应
+        Args:
+            response: 流式响应
+
+        Returns:
+
+        """
+        async for chunk in self._iter_chunks():
+            await response.write(chunk)
+
+    async def _iter_chunks(self) -> AsyncIterator[bytes]:
+        """
+        生成响应体的数据块
+        Returns:
+
+        """
+        sep = b"\n" if self.ndjson else b","
+        buf = bytearray(self._head())
+        first = True
+        async for item in self._iter_items():
+            if not first and not self.ndjson:
+                buf += sep
+            buf += item.__pydantic_serializer__.to_json(item)
+            if self.ndjson:
+                buf += sep
+            first = False
+            if len(buf) >= self.chunk_size:
+                yield bytes(buf)
+                buf.clear()
+        buf += self._tail()
+        if buf:
+            yield bytes(buf)
+
+    async def _iter_items(self) -> AsyncIterator[ModelT]:
+        if isinstance(self.items, AsyncIterable):
+            async for item in self.items:
+                yield item
+        else:
+            for item in self.items:
+                yield item
+
+    def _head(self) -> bytes:
+        return b"" if self.ndjson else b"["
+
+    def _tail(self) -> bytes:
+        return b"" if self.ndjson else b"]"
+
+
+class StreamRespTml(StreamResp[ModelT]):
+    """
+    带有模板的流式列表响应
+    列表作为模板的数据字段输出，只支持json数组格式
+    """
+
+    def __init__(
+        self,
+        items: Iterable[ModelT] | AsyncIterable[ModelT],
+        *,
+        temp_data: TempModel | None = None,
+        chunk_size: int = 64 * 1024,
+    ):
+        """
+        Args:
+            items: 模型的同步或异步迭代器
+            temp_data: 响应模板，为空就使用默认模板
+            chunk_size: 缓冲多少字节后写出一个数据块
+        """
+        super().__init__(items, chunk_size=chunk_size)
+        self.temp_data = temp_data or TempModel()
+
+    def _head(self) -> bytes:
+        tmp_data_field_name = self.temp_data.get_data_field_name()
+        return b"{" + to_json(tmp_data_field_name) + b":["
+
+    def _tail(self) -> bytes:
+        # 模板中除数据字段外的其他字段接在列表后面
         tmp_data_field_name = self.temp_data.get_data_field_name()
-        self_data = self.model_dump(mode="json", exclude={"temp_data"})
-        setattr(self.temp_data, tmp_data_field_name, self_data)
-        tml_data = self.temp_data.model_dump(mode="json")
-        return JSONResponse(tml_data, status=status, headers=headers)
+        others = self.temp_data.__pydantic_serializer__.to_json(self.temp_data, exclude={tmp_data_field_name})
+        return b"]" + (b"," + others[1:] if others != b"{}" else b"}")
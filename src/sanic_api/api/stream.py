@@ -0,0 +1,192 @@
+import re
+from collections.abc import AsyncIterable, AsyncIterator, Callable
+from typing import Generic, TypeVar
+
+from pydantic import BaseModel, ValidationError
+from sanic import BadRequest
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+class StreamData(Generic[ModelT]):
+    """
+    流式的请求数据
+    处理函数声明 stream_data: StreamData[ItemModel] 参数即可开启流式模式，请求体不会整体缓冲到内存中，
+    而是在数据块到达时增量解析NDJSON或json数组，并逐个元素使用ItemModel校验。
+    请求体以 [ 开头时按照json数组解析，否则按照NDJSON解析。
+    元素校验失败时和非流式的请求体一样抛出ValidationError。
+    """
+
+    def __init__(
+        self,
+        stream: AsyncIterable[bytes],
+        item_type: type[ModelT],
+        on_invalid: Callable[[], None] | None = None,
+    ):
+        """
+        Args:
+            stream: 请求体数据块的异步迭代器
+            item_type: 每个元素的模型类型
+            on_invalid: 元素校验失败时的回调，用于和非流式的请求体一样记录校验失败
+        """
+        self._stream = stream
+        self._item_type = item_type
+        self._on_invalid = on_invalid
+        self._consumed = False
+
+    def __aiter__(self) -> AsyncIterator[ModelT]:
+        if self._consumed:
+            raise RuntimeError("流式请求数据只能迭代一次")
+        self._consumed = True
+        return self._iter_items()
+
+    async def _iter_items(self) -> AsyncIterator[ModelT]:
+        """
+        增量解析并校验请求体中的元素
+        Returns:
+
+        """
+        splitter: _NDJsonSplitter | _JsonArraySplitter | None = None
+        async for chunk in self._stream:
+            if splitter is None:
+                head = chunk.lstrip()
+                if not head:
+                    continue
+                splitter = _JsonArraySplitter() if head[:1] == b"[" else _NDJsonSplitter()
+            for item in splitter.feed(chunk):
+                yield self._validate(item)
+
+        if splitter is not None:
+            for item in splitter.close():
+                yield self._validate(item)
+
+    def _validate(self, item: bytes) -> ModelT:
+        """
+        校验一个元素
+        Args:
+            item: 元素的json字节
+
+        Returns:
+            校验后的模型
+        """
+        try:
+            return self._item_type.model_validate_json(item)
+        except ValidationError:
+            if self._on_invalid is not None:
+                self._on_invalid()
+            raise
+
+
+class _NDJsonSplitter:
+    """
+    NDJSON的分割器，按行切分出每个元素
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        # 下一次查找换行符的位置，之前的数据中已经确定没有换行符
+        self._pos = 0
+
+    def feed(self, chunk: bytes) -> list[bytes]:
+        buf = self._buf
+        buf += chunk
+        lines = []
+        start = 0
+        while (end := buf.find(b"\n", self._pos)) != -1:
+            line = bytes(buf[start:end]).strip()
+            if line:
+                lines.append(line)
+            start = self._pos = end + 1
+
+        # 丢弃已经切分出去的行，缓冲区只保留当前未完成的一行
+        del buf[:start]
+        self._pos = len(buf)
+        return lines
+
+    def close(self) -> list[bytes]:
+        line = bytes(self._buf).strip()
+        self._buf.clear()
+        self._pos = 0
+        return [line] if line else []
+
+
+class _JsonArraySplitter:
+    """
+    json数组的分割器，切分出数组中的每个元素
+    只跟踪字符串和括号的层级，元素本身的解析交给pydantic
+    """
+
+    _STRUCT_PATTERN = re.compile(rb'[\[\]{},"]')
+    _STRING_PATTERN = re.compile(rb'["\\]')
+
+    def __init__(self):
+        self._buf = bytearray()
+        # 下一次扫描的位置
+        self._pos = 0
+        # 当前元素的开始位置
+        self._start = 0
+        # 括号的层级，1表示在最外层数组中
+        self._depth = 0
+        self._in_str = False
+        self._escape = False
+        self._finished = False
+
+    def feed(self, chunk: bytes) -> list[bytes]:
+        if self._finished:
+            return []
+
+        buf = self._buf
+        buf += chunk
+        items = []
+        pos = self._pos
+        while pos < len(buf):
+            if self._escape:
+                self._escape = False
+                pos += 1
+                continue
+
+            pattern = self._STRING_PATTERN if self._in_str else self._STRUCT_PATTERN
+            match = pattern.search(buf, pos)
+            if not match:
+                pos = len(buf)
+                break
+
+            char, pos = buf[match.start()], match.end()
+            if self._in_str:
+                if char == ord("\\"):
+                    self._escape = True
+                else:
+                    self._in_str = False
+            elif char == ord('"'):
+                self._in_str = True
+            elif char in b"[{":
+                self._depth += 1
+                if self._depth == 1:
+                    self._start = pos
+            elif char in b"]}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._append_item(items, buf[self._start : match.start()])
+                    self._finished = True
+                    break
+            elif char == ord(",") and self._depth == 1:
+                self._append_item(items, buf[self._start : match.start()])
+                self._start = pos
+
+        # 丢弃已经切分出去的数据，保证缓冲区只保留当前未完成的元素
+        drop = self._start if self._depth else pos
+        del buf[:drop]
+        self._pos = pos - drop
+        self._start -= min(drop, self._start)
+        return items
+
+    def close(self) -> list[bytes]:
+        if not self._finished:
+            raise BadRequest("请求体不是完整的json数组")
+        return []
+
+    @staticmethod
+    def _append_item(items: list[bytes], item: bytearray):
+        item = bytes(item).strip()
+        if item:
+            items.append(item)
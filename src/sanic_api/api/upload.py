@@ -0,0 +1,313 @@
+import mmap
+import shutil
+from pathlib import Path
+from tempfile import SpooledTemporaryFile
+from typing import Any, BinaryIO
+from urllib.parse import unquote
+
+from pydantic import GetCoreSchemaHandler, GetJsonSchemaHandler
+from pydantic.json_schema import JsonSchemaValue
+from pydantic_core import CoreSchema, core_schema
+from sanic import BadRequest
+from sanic.exceptions import PayloadTooLarge
+from sanic.headers import parse_content_header
+
+# 上传请求中所有文件在内存中的默认字节数，超出后写入临时文件
+DEFAULT_SPOOL_SIZE = 1024 * 1024
+
+# 每个分段的头部最多多少字节
+MAX_HEADER_SIZE = 16 * 1024
+
+
+def close_files(params: dict[str, list[Any]]):
+    """
+    关闭参数中所有上传的文件
+    Args:
+        params: 字段名对应的值列表
+
+    Returns:
+
+    """
+    for values in params.values():
+        for value in values:
+            if isinstance(value, UploadFile):
+                value.close()
+
+
+class UploadFile:
+    """
+    上传的文件
+    在参数模型中使用 UploadFile 或 list[UploadFile] 类型的字段接收文件，文件内容保存在SpooledTemporaryFile中，
+    较小的文件留在内存里，超出阈值的写入临时文件。请求结束后会自动关闭并删除临时文件，需要保留的文件在处理函数中调用save保存
+    """
+
+    __slots__ = ("name", "filename", "content_type", "headers", "size", "file")
+
+    def __init__(self, name: str, filename: str, content_type: str, headers: dict[str, str], spool_size: int):
+        """
+        Args:
+            name: 表单字段名
+            filename: 客户端传入的文件名
+            content_type: 文件的内容类型
+            headers: 分段的头部，键为小写
+            spool_size: 内存中最多保留多少字节，超出后写入临时文件
+        """
+        self.name = name
+        self.filename = filename
+        self.content_type = content_type
+        self.headers = headers
+        self.size = 0
+        self.file: BinaryIO = SpooledTemporaryFile(max_size=spool_size)  # noqa: SIM115
+
+    @property
+    def in_memory(self) -> bool:
+        """
+        文件内容是否还在内存中
+        """
+        return not self.file._rolled
+
+    def read(self, size: int = -1) -> bytes:
+        return self.file.read(size)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self.file.seek(offset, whence)
+
+    def getbuffer(self) -> memoryview:
+        """
+        不复制地获取文件的全部内容
+        在内存中时直接返回缓冲区的视图，写入临时文件后返回内存映射的视图
+        Returns:
+
+        """
+        if self.in_memory:
+            return self.file._file.getbuffer()
+        if not self.size:
+            return memoryview(b"")
+        self.file.flush()
+        return memoryview(mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def save(self, path: str | Path):
+        """
+        把文件保存到指定路径，分块复制，不会把整个文件读入内存
+        Args:
+            path: 保存的路径
+
+        Returns:
+
+        """
+        self.file.seek(0)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(self.file, f)
+
+    def close(self):
+        self.file.close()
+
+    def rollover(self):
+        """
+        把内存中的内容写入临时文件
+        Returns:
+
+        """
+        self.file.rollover()
+
+    def __repr__(self) -> str:
+        return f"<UploadFile: {self.name}={self.filename!r} {self.size}字节>"
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source: type[Any], handler: GetCoreSchemaHandler) -> CoreSchema:
+        return core_schema.is_instance_schema(cls)
+
+    @classmethod
+    def __get_pydantic_json_schema__(cls, schema: CoreSchema, handler: GetJsonSchemaHandler) -> JsonSchemaValue:
+        return {"type": "string", "format": "binary"}
+
+
+class MultipartParser:
+    """
+    multipart/form-data的增量解析器
+    数据块到达时逐块解析，文件分段的内容直接写入UploadFile，普通字段的值解码成字符串。
+    所有文件在内存中的字节数超出阈值后，当前的文件会写入临时文件，所以内存占用只和阈值有关，和文件大小无关
+    """
+
+    def __init__(self, boundary: bytes, *, spool_size: int = DEFAULT_SPOOL_SIZE):
+        """
+        Args:
+            boundary: 分隔符
+            spool_size: 所有文件在内存中最多保留多少字节，同时也是普通字段值的最大字节数
+        """
+        self.spool_size = spool_size
+        self.params: dict[str, list[str | UploadFile]] = {}
+        self._delimiter = b"\r\n--" + boundary
+        # 第一个分隔符前面没有换行，补上后和其他分隔符一样处理
+        self._buf = bytearray(b"\r\n")
+        self._state = self._parse_preamble
+        self._name: str | None = None
+        self._part: UploadFile | bytearray | None = None
+        # 所有文件在内存中的字节数
+        self._memory = 0
+
+    def feed(self, chunk: bytes):
+        """
+        解析一个数据块
+        Args:
+            chunk: 数据块
+
+        Returns:
+
+        """
+        self._buf += chunk
+        while self._state():
+            pass
+
+    def close(self) -> dict[str, list[str | UploadFile]]:
+        """
+        结束解析
+        Returns:
+            字段名对应的值列表，文件字段的值是UploadFile
+        """
+        if self._state != self._parse_end:
+            self.discard()
+            raise BadRequest("multipart请求体不完整")
+        return self.params
+
+    def discard(self):
+        """
+        关闭已经解析出来的文件
+        Returns:
+
+        """
+        close_files(self.params)
+        if isinstance(self._part, UploadFile):
+            self._part.close()
+
+    def _parse_preamble(self) -> bool:
+        index = self._buf.find(self._delimiter)
+        if index < 0:
+            del self._buf[: max(0, len(self._buf) - len(self._delimiter) + 1)]
+            return False
+        del self._buf[: index + len(self._delimiter)]
+        self._state = self._parse_delimiter
+        return True
+
+    def _parse_delimiter(self) -> bool:
+        """
+        分隔符后面是 -- 时结束，否则是下一个分段的头部
+        """
+        if len(self._buf) < 2:
+            return False
+        if self._buf[:2] == b"--":
+            self._buf.clear()
+            self._state = self._parse_end
+            return False
+
+        index = self._buf.find(b"\r\n")
+        if index < 0:
+            return False
+        del self._buf[: index + 2]
+        self._state = self._parse_headers
+        return True
+
+    def _parse_headers(self) -> bool:
+        index = self._buf.find(b"\r\n\r\n")
+        if index < 0:
+            if len(self._buf) > MAX_HEADER_SIZE:
+                raise BadRequest("multipart分段的头部过大")
+            return False
+
+        headers = {}
+        for line in self._buf[:index].decode("utf-8", errors="replace").split("\r\n"):
+            key, _, value = line.partition(":")
+            headers[key.strip().lower()] = value.strip()
+        del self._buf[: index + 4]
+        self._start_part(headers)
+        self._state = self._parse_body
+        return True
+
+    def _parse_body(self) -> bool:
+        index = self._buf.find(self._delimiter)
+        if index < 0:
+            # 末尾可能是分隔符的一部分，保留下来等待下一个数据块
+            self._write(len(self._buf) - len(self._delimiter) + 1)
+            return False
+
+        self._write(index)
+        del self._buf[: len(self._delimiter)]
+        self._finish_part()
+        self._state = self._parse_delimiter
+        return True
+
+    def _parse_end(self) -> bool:
+        # 结束之后的数据直接丢弃
+        self._buf.clear()
+        return False
+
+    def _start_part(self, headers: dict[str, str]):
+        """
+        根据分段的头部开始一个新的字段或文件
+        Args:
+            headers: 分段的头部
+
+        Returns:
+
+        """
+        _, options = parse_content_header(headers.get("content-disposition", ""))
+        self._name = options.get("name")
+        filename = options.get("filename")
+        if "filename*" in options:
+            # RFC 5987格式的文件名，例如 UTF-8''%E4%B8%AD.txt
+            filename = unquote(options["filename*"].partition("''")[2])
+
+        if self._name is None:
+            self._part = None
+        elif filename is None:
+            self._part = bytearray()
+        else:
+            content_type = headers.get("content-type", "application/octet-stream")
+            self._part = UploadFile(self._name, filename, content_type, headers, self.spool_size)
+
+    def _write(self, size: int):
+        """
+        把缓冲区开头的数据写入当前的分段并从缓冲区中删除
+        Args:
+            size: 字节数
+
+        Returns:
+
+        """
+        if size <= 0:
+            return
+
+        part = self._part
+        if isinstance(part, UploadFile):
+            in_memory = part.in_memory
+            with memoryview(self._buf) as view:
+                part.file.write(view[:size])
+            part.size += size
+            if in_memory:
+                # 单个文件超出阈值时SpooledTemporaryFile会自己写入临时文件，多个文件加起来超出时手动写入
+                self._memory += size
+                if part.in_memory and self._memory > self.spool_size:
+                    part.rollover()
+                if not part.in_memory:
+                    self._memory -= part.size
+        elif part is not None:
+            if len(part) + size > self.spool_size:
+                raise PayloadTooLarge(f"字段 {self._name} 的值过大")
+            with memoryview(self._buf) as view:
+                part += view[:size]
+        del self._buf[:size]
+
+    def _finish_part(self):
+        part = self._part
+        if isinstance(part, UploadFile):
+            part.file.seek(0)
+            value = part
+        elif part is not None:
+            try:
+                value = part.decode("utf-8")
+            except UnicodeDecodeError as e:
+                raise BadRequest(f"字段 {self._name} 不是utf-8编码") from e
+        else:
+            return
+        self.params.setdefault(self._name, []).append(value)
+        self._name = self._part = None
@@ -1,21 +1,74 @@
-import sentry_sdk
+import asyncio
+from functools import partial
+from typing import TYPE_CHECKING
+
 from sanic import Sanic, text
 from sanic.log import logger
 from sanic.worker.loader import AppLoader
 from sanic_ext import Extend
-from sentry_sdk.integrations.asyncio import AsyncioIntegration
+from sanic_ext.extensions.http.cors import _setup_cors_settings
 
 from sanic_api import LoggerExtend
 from sanic_api.api import Request
-from sanic_api.config import DefaultSettings, RunModeEnum
+from sanic_api.api.binding import BindingPlan
+from sanic_api.api.context import setup_request_context
+from sanic_api.cache import MemoryBackend, RedisBackend
+from sanic_api.config import CacheBackendEnum, DefaultSettings, RunModeEnum
+from sanic_api.logger.capture import ReqBodyCapture
+from sanic_api.utils.cpu import get_cpu_count
+
+# 指标、压缩、并发限制、openapi文档、配置热加载等可选的功能在配置开启时才导入对应的模块，减少启动耗时
+if TYPE_CHECKING:
+    from sanic_api.config.reload import SettingsSubscriber, SettingsWatcher
+    from sanic_api.limiter import ConcurrencyLimiter
+    from sanic_api.metrics.collector import RouteMetrics
+    from sanic_api.offload import ProcessPoolService
+    from sanic_api.openapi import OpenAPIDocs
+    from sanic_api.sentry.sampler import TracesSampler
 
 
 class BaseApp:
     name: str = "sanic-server"
     settings: DefaultSettings
+    log_ext: LoggerExtend
+    route_metrics: "RouteMetrics | None"
+    openapi_docs: "OpenAPIDocs | None"
+    traces_sampler: "TracesSampler | None"
+    limiter: "ConcurrencyLimiter | None"
+    settings_watcher: "SettingsWatcher | None"
+    settings_subscriber: "SettingsSubscriber | None"
+    process_pool_service: "ProcessPoolService | None"
 
     def __init__(self, settings: DefaultSettings):
         self.settings = settings
+        self.route_metrics = None
+        self.openapi_docs = None
+        self.traces_sampler = None
+        self.limiter = None
+        self.settings_watcher = None
+        self.settings_subscriber = None
+        self.process_pool_service = None
+
+    def __getstate__(self):
+        """
+        工作进程是通过pickle获取app的工厂方法的，这里只传递配置
+        持有app的对象在每个进程创建app时重新创建
+        Returns:
+
+        """
+        state = self.__dict__.copy()
+        state.pop("log_ext", None)
+        for name in (
+            "route_metrics",
+            "openapi_docs",
+            "traces_sampler",
+            "limiter",
+            "settings_watcher",
+            "settings_subscriber",
+            "process_pool_service",
+        ):
+            state[name] = None
+        return state
 
     @classmethod
     def run(cls, settings: DefaultSettings = None):
@@ -36,15 +89,19 @@ class BaseApp:
         app = loader.load()
 
         # 服务配置
-        # 开发模式下workers指定为1，自动重载根据配置决定，默认关闭，跨域设置为允许所有跨域
-        # 生产模式下使用fast模型，自动指定最多的workers，自定重载强制关闭，跨域使用配置中的跨域列表
+        # 开发模式下workers默认为1，自动重载根据配置决定，默认关闭，跨域设置为允许所有跨域
+        # 生产模式下workers默认为容器实际可用的CPU数量，自定重载强制关闭，跨域使用配置中的跨域列表
+        # 生产模式不使用fast模式，fast模式按宿主机的CPU数量创建进程，这里的默认值在此基础上考虑了cgroup配额和CPU亲和性
         # 默认启用sanic_ext里面的后台日志记录器
+        server_config = settings.server
         motd_display = {"envornment": settings.envornment}
-        config = {"access_log": settings.access_log, "motd_display": motd_display}
+        config = {"access_log": settings.access_log, "motd_display": motd_display, "backlog": server_config.backlog}
         if settings.mode == RunModeEnum.DEBNUG:
-            config.update({"auto_reload": settings.auto_reload, "workers": 1, "debug": True})
+            workers = server_config.workers or 1
+            config.update({"auto_reload": settings.auto_reload, "workers": workers, "debug": True})
         else:
-            config.update({"fast": True, "auto_reload": False})
+            workers = server_config.workers or get_cpu_count()
+            config.update({"auto_reload": False, "workers": workers})
 
         app.prepare(settings.host, settings.port, **config)
         Sanic.serve(primary=app, app_loader=loader)
@@ -59,6 +116,19 @@ class BaseApp:
 
         self._setup_logger(app)
         self._setup_config(app)
+        self._setup_sentry(app)
+        self._setup_metrics(app)
+        self._setup_cache(app)
+        self._setup_compress(app)
+        self._setup_limiter(app)
+        self._setup_openapi(app)
+
+        # 没有请求体的请求不会调用receive_body，在路由匹配后绑定参数
+        app.signal("http.routing.after")(Request.bind_without_body)
+        # 请求结束后关闭上传的文件
+        app.signal("http.lifecycle.response")(Request.close_files_on_response)
+        app.signal("http.lifecycle.complete")(Request.close_files_on_complete)
+        setup_request_context(app)
 
         app.main_process_stop(self._main_process_stop)
         app.main_process_start(self._main_process_start)
@@ -79,6 +149,14 @@ class BaseApp:
         """
         logger.info("主进程启动")
         await self.main_process_start(app)
+        self._start_process_pool()
+
+        hot_reload_config = self.settings.hot_reload
+        if hot_reload_config.enable:
+            from sanic_api.config.reload import SettingsWatcher
+
+            self.settings_watcher = SettingsWatcher(self.settings, interval=hot_reload_config.interval)
+            self.settings_watcher.start()
 
     async def _main_process_stop(self, app: Sanic):
         """
@@ -90,7 +168,12 @@ class BaseApp:
 
         """
         logger.info("主进程停止")
+        if self.settings_watcher:
+            self.settings_watcher.stop()
+        if self.process_pool_service:
+            self.process_pool_service.stop()
         await self.main_process_stop(app)
+        await self._flush_logger()
 
     async def _before_server_start(self, app: Sanic):
         """
@@ -105,7 +188,9 @@ class BaseApp:
         logger.info(f"工作进程 {app.m.pid} 即将启动")
 
         await self._setup_route(app)
+        self._setup_offload(app)
         await self.before_server_start(app)
+        self._setup_binding(app)
 
     async def _before_server_stop(self, app: Sanic):
         """
@@ -117,7 +202,12 @@ class BaseApp:
 
         """
         logger.info(f"工作进程 {app.m.pid} 即将停止")
+        if self.settings_subscriber:
+            self.settings_subscriber.stop()
         await self.before_server_stop(app)
+        await app.ctx.cache_backend.close()
+        await asyncio.get_running_loop().run_in_executor(None, app.ctx.offload_pool.shutdown)
+        await self._flush_logger()
 
     async def _after_server_start(self, app: Sanic):
         """
@@ -129,6 +219,16 @@ class BaseApp:
 
         """
         logger.info(f"工作进程 {app.m.pid} 启动完毕")
+        hot_reload_config = self.settings.hot_reload
+        if hot_reload_config.enable:
+            from sanic_api.config.reload import SettingsSubscriber
+
+            self.settings_subscriber = SettingsSubscriber(
+                self.settings,
+                partial(self._apply_settings, app),
+                interval=hot_reload_config.interval,
+            )
+            self.settings_subscriber.start()
         await self.after_server_start(app)
 
     async def _after_server_stop(self, app: Sanic):
@@ -152,7 +252,22 @@ class BaseApp:
         Returns:
 
         """
-        app.config.LOGGING = True
+        server_config = self.settings.server
+        app.config.update(
+            {
+                "LOGGING": True,
+                "LOGGING_QUEUE_MAX_SIZE": server_config.log_queue_size,
+                "KEEP_ALIVE": server_config.keep_alive,
+                "KEEP_ALIVE_TIMEOUT": server_config.keep_alive_timeout,
+                "REQUEST_MAX_SIZE": server_config.request_max_size,
+                "REQUEST_BUFFER_SIZE": server_config.request_buffer_size,
+                "REQUEST_TIMEOUT": server_config.request_timeout,
+                "RESPONSE_TIMEOUT": server_config.response_timeout,
+                "GRACEFUL_SHUTDOWN_TIMEOUT": server_config.graceful_shutdown_timeout,
+                "UPLOAD_SPOOL_SIZE": self.settings.upload.spool_size,
+                "UPLOAD_MAX_SIZE": self.settings.upload.max_size,
+            }
+        )
         self._setup_cors(app)
 
     def _setup_cors(self, app: Sanic):
@@ -172,7 +287,7 @@ class BaseApp:
 
     async def _setup_route(self, app: Sanic):
         """
-        设置路由和蓝图的内部方法，自动设置一个ping的路由
+        设置路由和蓝图的内部方法，自动设置一个ping的路由，启用指标时设置指标的路由
         Args:
             app: Sanic App
 
@@ -180,8 +295,22 @@ class BaseApp:
 
         """
         app.add_route(self._ping, "ping", methods=["GET", "POST"])
+        if self.route_metrics:
+            self.route_metrics.setup_route()
         await self.setup_route(app)
 
+    def _setup_binding(self, app: Sanic):
+        """
+        预编译所有路由的参数绑定计划，避免每次请求都去解析处理函数的签名
+        Args:
+            app: Sanic App
+
+        Returns:
+
+        """
+        for route in app.router.routes:
+            BindingPlan.compile(route)
+
     def _setup_logger(self, app: Sanic):
         """
         设置日志
@@ -192,7 +321,7 @@ class BaseApp:
 
         """
         log_config = self.settings.logger
-        log_ext = LoggerExtend(
+        self.log_ext = LoggerExtend(
             app,
             log_file=log_config.file,
             rotation=log_config.rotation,
@@ -200,33 +329,293 @@ class BaseApp:
             compression=log_config.compression,
             loki_url=log_config.loki_url,
             loki_labels={"Application": self.name, "Envornment": self.settings.envornment},
+            loki_batch_size=log_config.loki_batch_size,
+            loki_flush_interval=log_config.loki_flush_interval,
+            loki_queue_size=log_config.loki_queue_size,
+            loki_timeout=log_config.loki_timeout,
+            loki_max_retries=log_config.loki_max_retries,
+            fast_intercept=log_config.fast_intercept,
+            level=log_config.level.value if log_config.level else None,
+            req_body_capture=ReqBodyCapture(
+                log_config.req_body.mode,
+                sample_rate=log_config.req_body.sample_rate,
+                max_bytes=log_config.req_body.max_bytes,
+                include_routes=log_config.req_body.include_routes,
+                exclude_routes=log_config.req_body.exclude_routes,
+                redact_fields=log_config.req_body.redact_fields,
+            ),
         )
-        Extend.register(log_ext)
+        Extend.register(self.log_ext)
 
-    def _setup_sentry(self, _app: Sanic):
+    async def _flush_logger(self):
+        """
+        在线程池中等待后台推送的日志推送完成，避免阻塞事件循环
+        Returns:
+
+        """
+        await asyncio.get_running_loop().run_in_executor(None, self.log_ext.flush)
+
+    def _setup_sentry(self, app: Sanic):
         """
         如果存在sentryURL配置，则自动设置sentry哨兵
+        在创建app时设置，因为sentry的sanic集成需要在app启动前注册信号。每个进程只会初始化一次。
+        sentry_sdk导入较慢，只在配置了dsn时才导入
         Args:
-            _app: Sanic App
+            app: Sanic App
 
         Returns:
 
         """
-        if self.settings.sentry_dsn is None:
+        sentry_config = self.settings.sentry
+        dsn = sentry_config.dsn or self.settings.sentry_dsn
+        if dsn is None:
+            return
+
+        import sentry_sdk
+        from sentry_sdk.integrations.asyncio import AsyncioIntegration
+
+        from sanic_api.sentry.sampler import TracesSampler
+
+        if sentry_sdk.get_client().is_active():
             return
 
+        traces_sampler = TracesSampler(
+            app,
+            sample_rate=sentry_config.traces_sample_rate,
+            ignore_routes=sentry_config.ignore_routes,
+            route_sample_rates=sentry_config.route_sample_rates,
+            slow_threshold=sentry_config.slow_threshold,
+            boost_sample_rate=sentry_config.boost_sample_rate,
+            boost_seconds=sentry_config.boost_seconds,
+        )
+        traces_sampler.setup()
+        self.traces_sampler = traces_sampler
         sentry_sdk.init(
-            dsn=self.settings.sentry_dsn,
-            # Set traces_sample_rate to 1.0 to capture 100%
-            # of transactions for tracing.
-            traces_sample_rate=1.0,
-            # Set profiles_sample_rate to 1.0 to profile 100%
-            # of sampled transactions.
-            # We recommend adjusting this value in production.
-            profiles_sample_rate=1.0,
+            dsn=str(dsn),
+            environment=self.settings.envornment,
+            traces_sampler=traces_sampler,
+            profiles_sample_rate=sentry_config.profiles_sample_rate,
             integrations=[AsyncioIntegration()],
         )
 
+    def _setup_metrics(self, app: Sanic):
+        """
+        设置按路由的指标统计
+        Args:
+            app: Sanic App
+
+        Returns:
+
+        """
+        metrics_config = self.settings.metrics
+        if not metrics_config.enable:
+            return
+
+        from sanic_api.metrics.collector import RouteMetrics
+
+        self.route_metrics = RouteMetrics(
+            app,
+            path=metrics_config.path,
+            buckets=metrics_config.buckets,
+            ignore_routes=metrics_config.ignore_routes,
+            flush_interval=metrics_config.flush_interval,
+            token=metrics_config.token,
+        )
+        self.route_metrics.setup()
+
+    def _setup_cache(self, app: Sanic):
+        """
+        设置响应缓存的后端
+        Args:
+            app: Sanic App
+
+        Returns:
+
+        """
+        cache_config = self.settings.cache
+        if cache_config.backend == CacheBackendEnum.REDIS:
+            if not cache_config.redis_url:
+                raise ValueError("使用redis缓存时请设置redis_url！")
+            app.ctx.cache_backend = RedisBackend(str(cache_config.redis_url), prefix=cache_config.redis_prefix)
+        else:
+            app.ctx.cache_backend = MemoryBackend(max_bytes=cache_config.max_bytes)
+
+    def _setup_compress(self, app: Sanic):
+        """
+        设置响应压缩
+        Args:
+            app: Sanic App
+
+        Returns:
+
+        """
+        compress_config = self.settings.compress
+        if not compress_config.enable:
+            return
+
+        from sanic_api.compress.compressor import ResponseCompressor
+
+        compressor = ResponseCompressor(
+            app,
+            min_size=compress_config.min_size,
+            content_types=compress_config.content_types,
+            gzip_level=compress_config.gzip_level,
+            brotli_level=compress_config.brotli_level,
+            route_levels=compress_config.route_levels,
+            offload_size=compress_config.offload_size,
+            offload_workers=compress_config.offload_workers,
+            cache_max_bytes=compress_config.cache_max_bytes,
+            cache_ttl=compress_config.cache_ttl,
+        )
+        compressor.setup()
+
+    def _setup_limiter(self, app: Sanic):
+        """
+        设置请求的并发限制，没有配置任何限制时不启用
+        Args:
+            app: Sanic App
+
+        Returns:
+
+        """
+        limiter_config = self.settings.limiter
+        if not limiter_config.max_concurrency and not limiter_config.route_limits:
+            return
+
+        from sanic_api.limiter import ConcurrencyLimiter
+
+        limiter = ConcurrencyLimiter(
+            app,
+            max_concurrency=limiter_config.max_concurrency,
+            route_limits=limiter_config.route_limits,
+            queue_size=limiter_config.queue_size,
+            queue_timeout=limiter_config.queue_timeout,
+            retry_after=limiter_config.retry_after,
+            exempt_routes=limiter_config.exempt_routes,
+            reject_code=limiter_config.reject_code,
+            reject_msg=limiter_config.reject_msg,
+            adaptive=limiter_config.adaptive,
+            adaptive_latency=limiter_config.adaptive_latency,
+            adaptive_min_limit=limiter_config.adaptive_min_limit,
+            adaptive_backoff=limiter_config.adaptive_backoff,
+            registry=self.route_metrics.registry if self.route_metrics else None,
+        )
+        limiter.setup()
+        self.limiter = limiter
+
+    def _setup_openapi(self, app: Sanic):
+        """
+        设置openapi文档，替代sanic_ext自带的文档
+        Args:
+            app: Sanic App
+
+        Returns:
+
+        """
+        openapi_config = self.settings.openapi
+        if not openapi_config.enable:
+            app.config.OAS = False
+            return
+
+        from sanic_api.openapi import OpenAPIDocs
+
+        self.openapi_docs = OpenAPIDocs(
+            app,
+            title=openapi_config.title or self.name,
+            version=openapi_config.version,
+            description=openapi_config.description,
+            url_prefix=openapi_config.url_prefix,
+            ignore_routes=openapi_config.ignore_routes,
+            # 开启自动重载时路由会随代码变化，每个工作进程自己生成文档
+            share=not (self.settings.mode == RunModeEnum.DEBNUG and self.settings.auto_reload),
+        )
+        self.openapi_docs.setup()
+
+    def _start_process_pool(self):
+        """
+        在主进程中启动进程池服务，工作进程是守护进程不能创建子进程，由服务进程持有所有工作进程共享的进程池
+        Returns:
+
+        """
+        process_workers = self.settings.offload.process_workers
+        if not process_workers:
+            return
+
+        from sanic_api.offload import ProcessPoolService
+
+        self.process_pool_service = ProcessPoolService(process_workers)
+        self.process_pool_service.start()
+
+    def _setup_offload(self, app: Sanic):
+        """
+        设置卸载处理函数的线程池，以及提交到主进程中进程池服务的入口，线程在第一次使用时创建
+        Args:
+            app: Sanic App
+
+        Returns:
+
+        """
+        from sanic_api.offload import OffloadPool
+
+        offload_config = self.settings.offload
+        app.ctx.offload_pool = OffloadPool(
+            process_workers=offload_config.process_workers,
+            thread_workers=offload_config.thread_workers,
+            registry=self.route_metrics.registry if self.route_metrics else None,
+        )
+
+    def _apply_settings(self, app: Sanic, changed: set[str]):
+        """
+        把热加载的配置应用到各个组件上
+        Args:
+            app: Sanic App
+            changed: 发生了变化的配置路径
+
+        Returns:
+
+        """
+        settings = self.settings
+        if "access_log" in changed:
+            # 新建立的连接才会使用新的配置
+            app.config.ACCESS_LOG = settings.access_log
+        if "cors_origins" in changed:
+            self._setup_cors(app)
+            if hasattr(app.ctx, "cors"):
+                _setup_cors_settings(app)
+        if self.traces_sampler and any(path.startswith("sentry.") for path in changed):
+            sentry_config = settings.sentry
+            self.traces_sampler.reload(
+                sample_rate=sentry_config.traces_sample_rate,
+                ignore_routes=sentry_config.ignore_routes,
+                route_sample_rates=sentry_config.route_sample_rates,
+                slow_threshold=sentry_config.slow_threshold,
+                boost_sample_rate=sentry_config.boost_sample_rate,
+                boost_seconds=sentry_config.boost_seconds,
+            )
+        if "logger.level" in changed:
+            log_level = settings.logger.level
+            self.log_ext.set_level(log_level.value if log_level else None)
+        if "logger.req_body" in changed:
+            req_body_config = settings.logger.req_body
+            self.log_ext.req_body_capture.reload(
+                req_body_config.mode,
+                sample_rate=req_body_config.sample_rate,
+                max_bytes=req_body_config.max_bytes,
+                include_routes=req_body_config.include_routes,
+                exclude_routes=req_body_config.exclude_routes,
+                redact_fields=req_body_config.redact_fields,
+                routes=app.router.routes,
+            )
+        if self.limiter and any(path.startswith("limiter.") for path in changed):
+            limiter_config = settings.limiter
+            self.limiter.reload(
+                max_concurrency=limiter_config.max_concurrency,
+                queue_size=limiter_config.queue_size,
+                queue_timeout=limiter_config.queue_timeout,
+                retry_after=limiter_config.retry_after,
+            )
+        logger.info(f"工作进程 {app.m.pid} 已热加载配置: {', '.join(sorted(changed))}")
+
     async def _ping(self, _request):
         return text("ok")
 
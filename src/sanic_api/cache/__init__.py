@@ -0,0 +1,2 @@
+from sanic_api.cache.backend import CacheBackend, MemoryBackend, RedisBackend
+from sanic_api.cache.decorator import cached
@@ -0,0 +1,147 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+
+class CacheBackend(ABC):
+    """
+    缓存后端的基类
+    """
+
+    # 是否在多个工作进程之间共享。共享的后端需要跨进程的锁来防止缓存击穿
+    shared: bool = False
+
+    @abstractmethod
+    async def get(self, key: str) -> bytes | None:
+        """
+        获取缓存
+        Args:
+            key: 缓存的键
+
+        Returns:
+            缓存的值，不存在或者已过期时返回None
+        """
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float):
+        """
+        设置缓存
+        Args:
+            key: 缓存的键
+            value: 缓存的值
+            ttl: 过期时间，单位秒
+
+        Returns:
+
+        """
+
+    async def lock(self, key: str, ttl: float) -> bool:
+        """
+        获取跨进程的锁，只有共享的后端需要实现
+        Args:
+            key: 缓存的键
+            ttl: 锁的过期时间，单位秒
+
+        Returns:
+            是否获取成功
+        """
+        return True
+
+    async def unlock(self, key: str):  # noqa: B027
+        """
+        释放跨进程的锁
+        Args:
+            key: 缓存的键
+
+        Returns:
+
+        """
+
+    async def close(self):  # noqa: B027
+        """
+        关闭后端
+        Returns:
+
+        """
+
+
+class MemoryBackend(CacheBackend):
+    """
+    进程内的LRU缓存
+    按缓存值的字节数限制内存占用，超出时淘汰最久未使用的缓存
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Args:
+            max_bytes: 所有缓存值的最大字节数
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+
+    async def get(self, key: str) -> bytes | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            self._pop(key)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        if len(value) > self.max_bytes:
+            return
+
+        self._pop(key)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            self._pop(next(iter(self._data)))
+
+    def _pop(self, key: str):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.size -= len(item[1])
+
+
+class RedisBackend(CacheBackend):
+    """
+    redis缓存，所有工作进程共享
+    兼容redis协议的服务都可以使用，例如valkey、dragonfly、本地的redis等。需要安装redis库
+    """
+
+    shared = True
+
+    def __init__(self, url: str, prefix: str = "sanic_api:cache:"):
+        """
+        Args:
+            url: redis的连接地址，例如 redis://127.0.0.1:6379/0
+            prefix: 缓存键的前缀
+        """
+        try:
+            from redis import asyncio as aioredis
+        except ImportError as e:
+            raise ImportError("使用redis缓存需要安装redis库: pip install redis") from e
+
+        self.url = url
+        self.prefix = prefix
+        self.client = aioredis.from_url(url)
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.client.set(self.prefix + key, value, px=max(int(ttl * 1000), 1))
+
+    async def lock(self, key: str, ttl: float) -> bool:
+        return bool(await self.client.set(f"{self.prefix}lock:{key}", 1, nx=True, px=max(int(ttl * 1000), 1)))
+
+    async def unlock(self, key: str):
+        await self.client.delete(f"{self.prefix}lock:{key}")
+
+    async def close(self):
+        await self.client.aclose()
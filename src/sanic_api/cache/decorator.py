@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import time
+from collections.abc import Callable
+from functools import wraps
+
+import orjson
+from pydantic import BaseModel
+from sanic import HTTPResponse, Request
+
+from sanic_api.api.etag import etag_matches, not_modified
+from sanic_api.cache.backend import CacheBackend, MemoryBackend
+
+# 没有使用BaseApp时的默认缓存后端
+_default_backend: CacheBackend | None = None
+
+# 等待其他工作进程计算缓存时的轮询间隔，单位秒
+_LOCK_POLL_INTERVAL = 0.05
+
+# 作为缓存键的参数模型，上传的文件不作为缓存键，上传文件的请求不缓存
+_KEY_PARAM_NAMES = ("json_data", "form_data", "query_data")
+
+
+def cached(
+    ttl: float = 60,
+    key: Callable[[Request], str] | None = None,
+    *,
+    backend: CacheBackend | None = None,
+    lock_timeout: float = 10,
+):
+    """
+    缓存处理函数的响应
+    缓存的是序列化之后的响应体字节，只缓存200状态且没有设置cookie的非流式响应。
+    默认以请求方法、路由名称、路径参数和校验后的json_data、form_data、query_data参数模型作为缓存的键，
+    没有对应参数模型时使用原始的查询字符串和请求体。同一个键同时未命中时只会计算一次。
+    带有上传文件（files_data）的请求不读取也不写入缓存，直接调用处理函数
+    Args:
+        ttl: 缓存的过期时间，单位秒
+        key: 自定义生成缓存键的函数，接收请求返回字符串，请求方法和路由名称会自动加在前面
+        backend: 缓存后端，为空时使用app上设置的后端
+        lock_timeout: 共享的后端中等待其他工作进程计算的最长时间，单位秒
+
+    Returns:
+
+    """
+
+    def decorator(handler):
+        # 同一个键正在进行中的计算
+        inflight: dict[str, asyncio.Future] = {}
+
+        @wraps(handler)
+        async def wrapper(request: Request, *args, **kwargs):
+            if getattr(request, "files_data", None) is not None:
+                return await handler(request, *args, **kwargs)
+
+            cache_backend = backend or _get_backend(request)
+            cache_key = _make_key(request, key)
+            value = await cache_backend.get(cache_key)
+            if value is not None:
+                return _load_response(request, value)
+
+            # 进程内已经有同一个键在计算了，等待它的结果
+            future = inflight.get(cache_key)
+            if future is not None:
+                value = await asyncio.shield(future)
+                if value is not None:
+                    return _load_response(request, value)
+                return await handler(request, *args, **kwargs)
+
+            future = inflight[cache_key] = asyncio.get_running_loop().create_future()
+            value = None
+            try:
+                if cache_backend.shared and not await cache_backend.lock(cache_key, lock_timeout):
+                    # 其他工作进程正在计算，等待它写入缓存
+                    value = await _wait_value(cache_backend, cache_key, lock_timeout)
+                    if value is not None:
+                        return _load_response(request, value)
+                    response = await handler(request, *args, **kwargs)
+                else:
+                    try:
+                        response = await handler(request, *args, **kwargs)
+                        value = _dump_response(response)
+                        if value is not None:
+                            await cache_backend.set(cache_key, value, ttl)
+                    finally:
+                        if cache_backend.shared:
+                            await cache_backend.unlock(cache_key)
+                return response
+            finally:
+                inflight.pop(cache_key, None)
+                future.set_result(value)
+
+        return wrapper
+
+    return decorator
+
+
+def _get_backend(request: Request) -> CacheBackend:
+    """
+    获取app上设置的缓存后端，没有设置时使用进程内的默认后端
+    Args:
+        request: 请求
+
+    Returns:
+
+    """
+    global _default_backend
+
+    cache_backend = getattr(request.app.ctx, "cache_backend", None)
+    if cache_backend is None:
+        if _default_backend is None:
+            _default_backend = MemoryBackend()
+        cache_backend = _default_backend
+    return cache_backend
+
+
+def _make_key(request: Request, key: Callable[[Request], str] | None) -> str:
+    """
+    生成缓存的键
+    Args:
+        request: 请求
+        key: 自定义生成缓存键的函数
+
+    Returns:
+
+    """
+    # 同一个处理函数可以注册多个请求方法，不同方法的响应需要分开缓存
+    route_name = request.route.name if request.route else request.path
+    prefix = f"{request.method}:{route_name}"
+    if key is not None:
+        return f"{prefix}:{key(request)}"
+
+    digest = hashlib.sha256()
+    path_params = {k: v for k, v in request.match_info.items() if not isinstance(v, BaseModel)}
+    digest.update(orjson.dumps(path_params, option=orjson.OPT_SORT_KEYS, default=str))
+    models = {name: getattr(request, name, None) for name in _KEY_PARAM_NAMES}
+    for name, model in models.items():
+        digest.update(b"\0")
+        if model is not None:
+            digest.update(model.__pydantic_serializer__.to_json(model))
+        elif name == "query_data":
+            digest.update(request.query_string.encode())
+    if models["json_data"] is None and models["form_data"] is None:
+        digest.update(b"\0")
+        digest.update(request.body or b"")
+    return f"{prefix}:{digest.hexdigest()}"
+
+
+async def _wait_value(cache_backend: CacheBackend, cache_key: str, timeout: float) -> bytes | None:
+    """
+    等待其他工作进程写入缓存
+    Args:
+        cache_backend: 缓存后端
+        cache_key: 缓存的键
+        timeout: 最长等待时间，单位秒
+
+    Returns:
+        缓存的值，超时返回None
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        await asyncio.sleep(_LOCK_POLL_INTERVAL)
+        value = await cache_backend.get(cache_key)
+        if value is not None:
+            return value
+    return None
+
+
+def _dump_response(response) -> bytes | None:
+    """
+    把响应编码成缓存的值：第一行是状态码、内容类型和响应头的json，后面是响应体
+    Args:
+        response: 处理函数返回的响应
+
+    Returns:
+        缓存的值，不能缓存的响应返回None
+    """
+    if not isinstance(response, HTTPResponse) or response.status != 200 or response.body is None:
+        return None
+    if "set-cookie" in response.headers:
+        return None
+
+    headers = [(k, v) for k, v in response.headers.items() if k.lower() not in ("content-type", "content-length")]
+    meta = orjson.dumps([response.status, response.content_type, headers])
+    return meta + b"\n" + response.body
+
+
+def _load_response(request: Request, value: bytes) -> HTTPResponse:
+    """
+    从缓存的值还原响应，缓存的响应带有ETag并且和客户端的If-None-Match匹配时返回304
+    Args:
+        request: 请求
+        value: 缓存的值
+
+    Returns:
+
+    """
+    meta, _, body = value.partition(b"\n")
+    status, content_type, headers = orjson.loads(meta)
+    response = HTTPResponse(body, status=status, headers=headers, content_type=content_type)
+    etag = response.headers.get("etag")
+    if etag and etag_matches(request, etag):
+        return not_modified(etag)
+    return response
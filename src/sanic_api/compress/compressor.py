@@ -0,0 +1,229 @@
+import asyncio
+import gzip
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
+
+from sanic import Request, Sanic
+from sanic.response import BaseHTTPResponse
+from sanic_routing import Route
+
+from sanic_api.cache.backend import MemoryBackend
+from sanic_api.config.defaults import DEFAULT_CONTENT_TYPES
+from sanic_api.utils.route import match_route
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class ResponseCompressor:
+    """
+    响应压缩
+    客户端支持时优先使用brotli（需要安装brotli库），否则使用gzip。
+    较大的响应体放到线程池中压缩，不阻塞事件循环；带有ETag的响应会缓存压缩后的字节
+    """
+
+    def __init__(
+        self,
+        app: Sanic,
+        *,
+        min_size: int = 1024,
+        content_types: list[str] | tuple[str, ...] = DEFAULT_CONTENT_TYPES,
+        gzip_level: int = 6,
+        brotli_level: int = 4,
+        route_levels: dict[str, int] | None = None,
+        offload_size: int = 128 * 1024,
+        offload_workers: int = 2,
+        cache_max_bytes: int = 32 * 1024 * 1024,
+        cache_ttl: float = 300,
+    ):
+        """
+        Args:
+            app: Sanic App
+            min_size: 响应体小于这个字节数时不压缩
+            content_types: 需要压缩的内容类型，可以使用通配符，例如 text/*
+            gzip_level: gzip的压缩级别，1-9
+            brotli_level: brotli的压缩级别，0-11
+            route_levels: 路由单独的压缩级别，键支持路由名称或路径的通配符。为0时该路由不压缩，
+                超出算法的最大级别时按最大级别
+            offload_size: 响应体大于这个字节数时放到线程池中压缩
+            offload_workers: 压缩线程池的线程数
+            cache_max_bytes: 压缩结果缓存的最大字节数，为0时不缓存
+            cache_ttl: 压缩结果缓存的过期时间，单位秒
+        """
+        self.app = app
+        self.min_size = min_size
+        self.content_types = tuple(content_types)
+        self.gzip_level = gzip_level
+        self.brotli_level = brotli_level
+        self.route_levels = route_levels or {}
+        self.offload_size = offload_size
+        self.offload_workers = offload_workers
+        self.cache = MemoryBackend(max_bytes=cache_max_bytes) if cache_max_bytes else None
+        self.cache_ttl = cache_ttl
+        self._content_type_matches: dict[str, bool] = {}
+        self._executor: ThreadPoolExecutor | None = None
+
+    def setup(self):
+        """
+        注册压缩响应的中间件
+        Returns:
+
+        """
+        self.app.on_response(self._on_response)
+        self.app.before_server_stop(self._before_server_stop)
+
+    async def _on_response(self, request: Request, response: BaseHTTPResponse):
+        body = response.body
+        if not body or len(body) < self.min_size or not self._should_compress(request, response):
+            return
+
+        encoding = select_encoding(request.headers.get("accept-encoding", ""))
+        if encoding is None:
+            return
+        level = self._get_level(request.route, encoding)
+        if level <= 0:
+            return
+
+        etag = response.headers.get("etag")
+        cache_key = None
+        compressed = None
+        if etag and self.cache:
+            cache_key = f"{hashlib.blake2b(body, digest_size=16).hexdigest()}:{encoding}:{level}"
+            compressed = await self.cache.get(cache_key)
+        if compressed is None:
+            compressed = await self._compress(body, encoding, level)
+            if cache_key:
+                await self.cache.set(cache_key, compressed, self.cache_ttl)
+        if len(compressed) >= len(body):
+            return
+
+        response.body = compressed
+        response.headers["content-encoding"] = encoding
+        response.headers.pop("content-length", None)
+        vary = response.headers.get("vary")
+        if not vary:
+            response.headers["vary"] = "Accept-Encoding"
+        elif "accept-encoding" not in vary.lower():
+            response.headers["vary"] = f"{vary}, Accept-Encoding"
+        # 压缩后的字节和原始的不同，强ETag改为弱ETag
+        if etag and not etag.startswith("W/"):
+            response.headers["etag"] = f"W/{etag}"
+
+    async def _before_server_stop(self, _app: Sanic):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _should_compress(self, request: Request, response: BaseHTTPResponse) -> bool:
+        """
+        响应是否需要压缩
+        Args:
+            request: 请求
+            response: 响应
+
+        Returns:
+
+        """
+        if request.method == "HEAD" or response.status < 200 or response.status in (204, 304):
+            return False
+        headers = response.headers
+        if "content-encoding" in headers or "no-transform" in headers.get("cache-control", ""):
+            return False
+
+        content_type = (headers.get("content-type") or response.content_type or "").split(";", 1)[0].strip()
+        matched = self._content_type_matches.get(content_type)
+        if matched is None:
+            matched = any(fnmatchcase(content_type, pattern) for pattern in self.content_types)
+            self._content_type_matches[content_type] = matched
+        return matched
+
+    def _get_level(self, route: Route | None, encoding: str) -> int:
+        """
+        获取路由的压缩级别，路由单独的级别缓存在路由的ctx上
+        Args:
+            route: 路由
+            encoding: 压缩算法
+
+        Returns:
+
+        """
+        default_level = self.brotli_level if encoding == "br" else self.gzip_level
+        if route is None or not self.route_levels:
+            return default_level
+
+        try:
+            route_level = route.ctx.compress_level
+        except AttributeError:
+            route_level = None
+            for pattern, pattern_level in self.route_levels.items():
+                if match_route(route, [pattern]):
+                    route_level = pattern_level
+                    break
+            route.ctx.compress_level = route_level
+
+        return default_level if route_level is None else route_level
+
+    async def _compress(self, body: bytes, encoding: str, level: int) -> bytes:
+        """
+        压缩响应体，较大的响应体放到线程池中压缩，压缩库在压缩时会释放GIL
+        Args:
+            body: 响应体
+            encoding: 压缩算法
+            level: 压缩级别
+
+        Returns:
+
+        """
+        if len(body) < self.offload_size:
+            return compress_body(body, encoding, level)
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.offload_workers, thread_name_prefix="sanic_api_compress")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, compress_body, body, encoding, level)
+
+
+def select_encoding(accept_encoding: str) -> str | None:
+    """
+    根据请求的Accept-Encoding选择压缩算法
+    Args:
+        accept_encoding: 请求的Accept-Encoding
+
+    Returns:
+        压缩算法，客户端不支持时返回None
+    """
+    accepted, refused = set(), set()
+    for item in accept_encoding.lower().split(","):
+        name, *params = item.split(";")
+        name = name.strip()
+        quality = next((param.strip()[2:] for param in params if param.strip().startswith("q=")), "1")
+        try:
+            # q=0表示明确拒绝，*不能覆盖明确拒绝的算法
+            (accepted if float(quality) > 0 else refused).add(name)
+        except ValueError:
+            continue
+
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or ("*" in accepted and "gzip" not in refused):
+        return "gzip"
+    return None
+
+
+def compress_body(body: bytes, encoding: str, level: int) -> bytes:
+    """
+    压缩字节
+    Args:
+        body: 原始字节
+        encoding: 压缩算法，br或gzip
+        level: 压缩级别
+
+    Returns:
+
+    """
+    if encoding == "br":
+        return brotli.compress(body, quality=min(level, 11))
+    return gzip.compress(body, compresslevel=min(level, 9), mtime=0)
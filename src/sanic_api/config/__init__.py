@@ -1 +1,19 @@
-from sanic_api.config.setting import DefaultSettings, RunModeEnum, SettingsBase
+from sanic_api.config.setting import (
+    CacheBackendEnum,
+    CacheSettings,
+    CompressSettings,
+    DefaultSettings,
+    HotReloadSettings,
+    LimiterSettings,
+    LogLevelEnum,
+    MetricsSettings,
+    OffloadSettings,
+    OpenAPISettings,
+    ReqBodyModeEnum,
+    ReqBodySettings,
+    RunModeEnum,
+    SentrySettings,
+    ServerSettings,
+    SettingsBase,
+    UploadSettings,
+)
@@ -0,0 +1,14 @@
+# 配置的默认值，运行时的模块也从这里导入，配置模块本身不需要导入这些运行时的模块
+
+# 默认压缩的内容类型
+DEFAULT_CONTENT_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/*",
+)
+
+# 默认的耗时分桶，单位秒。比prometheus的默认分桶多了亚毫秒级，用来区分各个阶段
+DEFAULT_TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
@@ -0,0 +1,312 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import orjson
+from pydantic import BaseModel, ValidationError
+from pydantic_core import to_jsonable_python
+from sanic.log import logger
+
+from sanic_api.config.setting import DefaultSettings
+
+# 主进程写入热加载配置的目录，由主进程创建后通过环境变量传给工作进程
+SETTINGS_DIR_ENV = "SANIC_API_SETTINGS_DIR"
+
+# 热加载配置的快照文件名
+SNAPSHOT_FILE_NAME = "settings.json"
+
+# 需要监视的配置文件，和hs_config读取的文件一致
+CONFIG_FILE_NAMES = ("settings.json", "settings.ini", "settings.yaml", "settings.toml", ".env")
+
+# 可以热加载的配置，使用点号分隔嵌套的配置
+RELOADABLE_FIELDS = (
+    "access_log",
+    "cors_origins",
+    "sentry.traces_sample_rate",
+    "sentry.ignore_routes",
+    "sentry.route_sample_rates",
+    "sentry.slow_threshold",
+    "sentry.boost_sample_rate",
+    "sentry.boost_seconds",
+    "logger.level",
+    "logger.req_body",
+    "limiter.max_concurrency",
+    "limiter.queue_size",
+    "limiter.queue_timeout",
+    "limiter.retry_after",
+)
+
+
+def get_reloadable(settings: DefaultSettings) -> dict[str, Any]:
+    """
+    获取可以热加载的配置，值转换成json兼容的类型
+    Args:
+        settings: 配置
+
+    Returns:
+        配置路径对应的值
+    """
+    values = {}
+    for path in RELOADABLE_FIELDS:
+        parent, name = _resolve(settings, path)
+        values[path] = to_jsonable_python(getattr(parent, name))
+    return values
+
+
+def set_reloadable(settings: DefaultSettings, values: dict[str, Any]) -> set[str]:
+    """
+    校验并设置可以热加载的配置
+    先在配置的副本上校验所有的值，全部通过后再设置，有值校验失败时抛出ValidationError，配置不会被修改
+    Args:
+        settings: 配置
+        values: 配置路径对应的值
+
+    Returns:
+        发生了变化的配置路径
+    """
+    current = get_reloadable(settings)
+    changed = {path: value for path, value in values.items() if path in current and current[path] != value}
+    if not changed:
+        return set()
+
+    validated = settings.model_copy(deep=True)
+    for path, value in changed.items():
+        parent, name = _resolve(validated, path)
+        parent.__pydantic_validator__.validate_assignment(parent, name, value)
+
+    for path in changed:
+        parent, name = _resolve(settings, path)
+        validated_parent, _ = _resolve(validated, path)
+        setattr(parent, name, getattr(validated_parent, name))
+    return set(changed)
+
+
+def _resolve(settings: BaseModel, path: str) -> tuple[BaseModel, str]:
+    """
+    根据配置路径找到所在的模型和字段名
+    Args:
+        settings: 配置
+        path: 配置路径
+
+    Returns:
+        (模型, 字段名)
+    """
+    *parents, name = path.split(".")
+    model = settings
+    for parent in parents:
+        model = getattr(model, parent)
+    return model, name
+
+
+class SettingsWatcher:
+    """
+    主进程中的配置文件监视器
+    在后台线程中定时检查配置文件的修改时间，变化后重新读取配置，把可以热加载的配置写入共享目录的快照文件，
+    其他配置的变化只输出警告。工作进程启动时已经通过pickle拿到了完整的配置，不会再去读取配置文件
+    """
+
+    def __init__(self, settings: DefaultSettings, *, interval: float = 2.0, config_dir: Path | None = None):
+        """
+        Args:
+            settings: 主进程中的配置
+            interval: 检查的时间间隔，单位秒
+            config_dir: 配置文件所在的目录，为空时使用hs_config的默认目录
+        """
+        self.settings = settings
+        self.interval = interval
+        self.config_dir = config_dir or Path.cwd() / "configs"
+        self.snapshot_path: Path | None = None
+        self._created_dir = False
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._signature = self._get_signature()
+
+    def start(self):
+        """
+        写入初始的快照并启动监视线程
+        Returns:
+
+        """
+        settings_dir = os.environ.get(SETTINGS_DIR_ENV)
+        if not settings_dir:
+            settings_dir = os.environ[SETTINGS_DIR_ENV] = tempfile.mkdtemp(prefix="sanic_api_settings_")
+            self._created_dir = True
+        self.snapshot_path = Path(settings_dir) / SNAPSHOT_FILE_NAME
+        self._write_snapshot(get_reloadable(self.settings))
+
+        self._thread = threading.Thread(target=self._run, name="sanic_api_settings_watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        停止监视线程，删除自己创建的共享目录
+        Returns:
+
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._created_dir:
+            shutil.rmtree(os.environ.pop(SETTINGS_DIR_ENV), ignore_errors=True)
+            self._created_dir = False
+
+    def check(self) -> set[str]:
+        """
+        检查配置文件是否变化，变化后重新读取配置并写入快照
+        Returns:
+            发生了变化的可以热加载的配置路径
+        """
+        signature = self._get_signature()
+        if signature == self._signature:
+            return set()
+        self._signature = signature
+
+        try:
+            new_settings = type(self.settings)()
+        except ValidationError as e:
+            logger.error(f"重新读取配置失败，继续使用原来的配置: {e}")
+            return set()
+
+        values = get_reloadable(new_settings)
+        changed = set_reloadable(self.settings, values)
+        self._warn_structural(new_settings)
+        if changed:
+            self._write_snapshot(values)
+            logger.info(f"配置已热加载: {', '.join(sorted(changed))}")
+        return changed
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.exception(f"检查配置文件变化失败: {e}")
+
+    def _get_signature(self) -> tuple:
+        """
+        获取所有配置文件的修改时间和大小，用于判断配置文件是否变化
+        Returns:
+
+        """
+        signature = []
+        for name in CONFIG_FILE_NAMES:
+            try:
+                stat = (self.config_dir / name).stat()
+            except OSError:
+                continue
+            signature.append((name, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def _warn_structural(self, new_settings: DefaultSettings):
+        """
+        不能热加载的配置发生变化时输出警告
+        Args:
+            new_settings: 重新读取的配置
+
+        Returns:
+
+        """
+        old_data = self.settings.model_dump(mode="json")
+        new_data = new_settings.model_dump(mode="json")
+        for data in (old_data, new_data):
+            for path in RELOADABLE_FIELDS:
+                *parents, name = path.split(".")
+                parent_data = data
+                for parent in parents:
+                    parent_data = parent_data.get(parent, {})
+                parent_data.pop(name, None)
+
+        changed = sorted(key for key in old_data.keys() | new_data.keys() if old_data.get(key) != new_data.get(key))
+        if changed:
+            logger.warning(f"配置 {', '.join(changed)} 发生了变化，需要重启服务才会生效")
+
+    def _write_snapshot(self, values: dict[str, Any]):
+        """
+        原子地写入快照文件
+        Args:
+            values: 可以热加载的配置
+
+        Returns:
+
+        """
+        tmp_path = self.snapshot_path.with_suffix(".tmp")
+        tmp_path.write_bytes(orjson.dumps(values))
+        os.replace(tmp_path, self.snapshot_path)
+
+
+class SettingsSubscriber:
+    """
+    工作进程中的热加载配置订阅者
+    定时检查快照文件的修改时间，变化后读取快照，更新配置并通知变化的配置路径
+    """
+
+    def __init__(
+        self,
+        settings: DefaultSettings,
+        on_change: Callable[[set[str]], None],
+        *,
+        interval: float = 2.0,
+    ):
+        """
+        Args:
+            settings: 工作进程中的配置
+            on_change: 配置变化后的回调，参数是发生了变化的配置路径
+            interval: 检查的时间间隔，单位秒
+        """
+        self.settings = settings
+        self.on_change = on_change
+        self.interval = interval
+        self.snapshot_path: Path | None = None
+        self._mtime_ns = 0
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        """
+        启动定时检查的任务，没有共享目录时（例如没有启用热加载的主进程）不启动
+        Returns:
+
+        """
+        settings_dir = os.environ.get(SETTINGS_DIR_ENV)
+        if not settings_dir:
+            return
+        self.snapshot_path = Path(settings_dir) / SNAPSHOT_FILE_NAME
+        self._task = asyncio.create_task(self._check_loop())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def check(self) -> set[str]:
+        """
+        检查快照文件是否变化，变化后更新配置
+        Returns:
+            发生了变化的配置路径
+        """
+        try:
+            mtime_ns = self.snapshot_path.stat().st_mtime_ns
+            if mtime_ns == self._mtime_ns:
+                return set()
+            values = orjson.loads(self.snapshot_path.read_bytes())
+        except (OSError, orjson.JSONDecodeError):
+            return set()
+        self._mtime_ns = mtime_ns
+
+        changed = set_reloadable(self.settings, values)
+        if changed:
+            self.on_change(changed)
+        return changed
+
+    async def _check_loop(self):
+        while True:
+            try:
+                self.check()
+            except Exception as e:
+                logger.exception(f"热加载配置失败: {e}")
+            await asyncio.sleep(self.interval)
@@ -1,6 +1,7 @@
 from hs_config import SettingsBase
-from pydantic import BaseModel, Field, FilePath, HttpUrl, NewPath
+from pydantic import BaseModel, Field, FilePath, HttpUrl, NewPath, RedisDsn
 
+from sanic_api.config.defaults import DEFAULT_CONTENT_TYPES, DEFAULT_TIME_BUCKETS
 from sanic_api.utils.enum import EnumBase, EnumField
 
 
@@ -13,11 +14,62 @@ class RunModeEnum(EnumBase):
     PRODUCTION = EnumField("prod", desc="生产模式")
 
 
+class LogLevelEnum(EnumBase):
+    """
+    日志级别
+    """
+
+    TRACE = EnumField("TRACE", desc="追踪")
+    DEBUG = EnumField("DEBUG", desc="调试")
+    INFO = EnumField("INFO", desc="信息")
+    SUCCESS = EnumField("SUCCESS", desc="成功")
+    WARNING = EnumField("WARNING", desc="警告")
+    ERROR = EnumField("ERROR", desc="错误")
+    CRITICAL = EnumField("CRITICAL", desc="严重错误")
+
+
+class ReqBodyModeEnum(EnumBase):
+    """
+    访问日志中请求体的记录模式
+    """
+
+    OFF = EnumField("off", desc="不记录")
+    SAMPLED = EnumField("sampled", desc="按采样率记录")
+    FULL = EnumField("full", desc="全部记录")
+
+
+class ReqBodySettings(BaseModel):
+    """
+    访问日志中请求体的记录配置
+    """
+
+    # 记录模式
+    mode: ReqBodyModeEnum = Field(default=ReqBodyModeEnum.FULL)
+
+    # 采样率。采样模式下有多大比例的请求会记录请求体
+    sample_rate: float = Field(default=0.1, ge=0, le=1)
+
+    # 最多记录多少字节，超出的部分会被截断。为0时不限制
+    max_bytes: int = Field(default=4096, ge=0)
+
+    # 只记录这些路由的请求体，为空时记录所有路由。支持路由名称或路径，可以使用通配符，例如 /user/*
+    include_routes: list[str] = Field(default_factory=list)
+
+    # 不记录这些路由的请求体。支持路由名称或路径，可以使用通配符
+    exclude_routes: list[str] = Field(default_factory=list)
+
+    # 需要脱敏的字段名，不区分大小写
+    redact_fields: list[str] = Field(default_factory=lambda: ["password", "token", "secret"])
+
+
 class LoggerSettings(BaseModel):
     """
     日志配置类
     """
 
+    # 日志级别，可以热加载。为空时loguru的日志为DEBUG，标准日志开发模式为DEBUG，生产模式为INFO
+    level: LogLevelEnum | None = Field(default=None)
+
     # 日志文件路径
     file: FilePath | NewPath | None = Field(default=None)
 
@@ -36,6 +88,285 @@ class LoggerSettings(BaseModel):
     # loji的地址。如果存在，则会把日志推送给logki
     loki_url: HttpUrl | None = Field(default=None)
 
+    # loki每批推送的最大日志数。队列中的日志达到这个数量时立即推送
+    loki_batch_size: int = Field(default=500, gt=0)
+
+    # loki推送的时间间隔，单位秒
+    loki_flush_interval: float = Field(default=1.0, gt=0)
+
+    # loki推送队列的最大长度。超出时丢弃最旧的日志，避免loki不可用时占满内存
+    loki_queue_size: int = Field(default=10000, gt=0)
+
+    # loki推送请求的超时时间，单位秒
+    loki_timeout: float = Field(default=5.0, gt=0)
+
+    # loki推送失败时的最大重试次数
+    loki_max_retries: int = Field(default=3, ge=0)
+
+    # 拦截标准日志的快速模式。直接使用标准日志记录中已有的调用位置，不再逐帧查找调用者
+    fast_intercept: bool = Field(default=False)
+
+    # 访问日志中请求体的记录配置
+    req_body: ReqBodySettings = Field(default_factory=ReqBodySettings)
+
+
+class SentrySettings(BaseModel):
+    """
+    哨兵配置类
+    """
+
+    # 哨兵连接dsn，如果存在则会把错误信息推送给哨兵
+    dsn: HttpUrl | None = Field(default=None)
+
+    # 链路追踪的默认采样率
+    traces_sample_rate: float = Field(default=0.1, ge=0, le=1)
+
+    # 性能分析的采样率，相对于被采样的链路
+    profiles_sample_rate: float = Field(default=0, ge=0, le=1)
+
+    # 不进行链路追踪的路由。支持路由名称或路径，可以使用通配符
+    ignore_routes: list[str] = Field(default_factory=lambda: ["/ping"])
+
+    # 路由单独的采样率。键支持路由名称或路径，可以使用通配符，例如 {"/user/*": 0.5}
+    route_sample_rates: dict[str, float] = Field(default_factory=dict)
+
+    # 慢请求的阈值，单位秒。路由出现慢请求或者错误后，一段时间内提升采样率。为空时只在出现错误时提升
+    slow_threshold: float | None = Field(default=1.0, gt=0)
+
+    # 出现慢请求或错误后提升到的采样率
+    boost_sample_rate: float = Field(default=1.0, ge=0, le=1)
+
+    # 提升采样率的持续时间，单位秒
+    boost_seconds: float = Field(default=60, ge=0)
+
+
+class MetricsSettings(BaseModel):
+    """
+    指标配置类
+    """
+
+    # 是否启用按路由的指标统计。默认关闭，开启后会注册输出指标的路由
+    enable: bool = Field(default=False)
+
+    # 输出prometheus格式指标的路由路径
+    path: str = Field(default="/metrics")
+
+    # 访问指标路由需要的令牌，请求头为 Authorization: Bearer <token>。为空时不校验，需要自行限制访问
+    token: str | None = Field(default=None)
+
+    # 耗时直方图的分桶，单位秒
+    buckets: list[float] = Field(default_factory=lambda: list(DEFAULT_TIME_BUCKETS), min_length=1)
+
+    # 不记录指标的路由。支持路由名称或路径，可以使用通配符
+    ignore_routes: list[str] = Field(default_factory=lambda: ["/metrics"])
+
+    # 工作进程汇总指标的时间间隔，单位秒
+    flush_interval: float = Field(default=1.0, gt=0)
+
+
+class CacheBackendEnum(EnumBase):
+    """
+    缓存后端
+    """
+
+    MEMORY = EnumField("memory", desc="进程内缓存")
+    REDIS = EnumField("redis", desc="redis缓存，所有工作进程共享")
+
+
+class CacheSettings(BaseModel):
+    """
+    响应缓存配置类
+    """
+
+    # 缓存后端
+    backend: CacheBackendEnum = Field(default=CacheBackendEnum.MEMORY)
+
+    # 进程内缓存的最大字节数，超出时淘汰最久未使用的缓存
+    max_bytes: int = Field(default=64 * 1024 * 1024, gt=0)
+
+    # redis的连接地址。使用redis缓存时必须设置
+    redis_url: RedisDsn | None = Field(default=None)
+
+    # redis缓存键的前缀
+    redis_prefix: str = Field(default="sanic_api:cache:")
+
+
+class CompressSettings(BaseModel):
+    """
+    响应压缩配置类
+    """
+
+    # 是否启用响应压缩。客户端支持时优先使用brotli（需要安装brotli库），否则使用gzip
+    enable: bool = Field(default=True)
+
+    # 响应体小于这个字节数时不压缩
+    min_size: int = Field(default=1024, ge=0)
+
+    # 需要压缩的内容类型，可以使用通配符，例如 text/*
+    content_types: list[str] = Field(default_factory=lambda: list(DEFAULT_CONTENT_TYPES))
+
+    # gzip的压缩级别
+    gzip_level: int = Field(default=6, ge=1, le=9)
+
+    # brotli的压缩级别
+    brotli_level: int = Field(default=4, ge=0, le=11)
+
+    # 路由单独的压缩级别，为0时该路由不压缩。键支持路由名称或路径，可以使用通配符，例如 {"/export/*": 1}
+    route_levels: dict[str, int] = Field(default_factory=dict)
+
+    # 响应体大于这个字节数时放到线程池中压缩，避免阻塞事件循环
+    offload_size: int = Field(default=128 * 1024, ge=0)
+
+    # 压缩线程池的线程数
+    offload_workers: int = Field(default=2, gt=0)
+
+    # 带有ETag的响应会缓存压缩后的字节，这是缓存的最大字节数，为0时不缓存
+    cache_max_bytes: int = Field(default=32 * 1024 * 1024, ge=0)
+
+    # 压缩结果缓存的过期时间，单位秒
+    cache_ttl: float = Field(default=300, gt=0)
+
+
+class OffloadSettings(BaseModel):
+    """
+    处理函数卸载配置类
+    """
+
+    # 进程池的进程数，为0时不启用进程池。进程池由主进程中启动的服务持有，所有工作进程共享，进程在第一次使用时创建
+    process_workers: int = Field(default=0, ge=0)
+
+    # 每个工作进程中线程池的线程数，为空时使用标准库的默认值
+    thread_workers: int | None = Field(default=None, gt=0)
+
+
+class LimiterSettings(BaseModel):
+    """
+    并发限制配置类
+    """
+
+    # 每个工作进程所有路由加起来的最大并发数，为空时不限制
+    max_concurrency: int | None = Field(default=None, gt=0)
+
+    # 路由单独的最大并发数，匹配到的每个路由各自计算。键支持路由名称或路径，可以使用通配符，例如 {"/export/*": 4}
+    route_limits: dict[str, int] = Field(default_factory=dict)
+
+    # 超出并发数时等待队列的长度，队列已满时直接返回503
+    queue_size: int = Field(default=100, ge=0)
+
+    # 排队的超时时间，单位秒，超时后返回503。为0时不排队
+    queue_timeout: float = Field(default=1.0, ge=0)
+
+    # 503响应中Retry-After的秒数
+    retry_after: int = Field(default=1, ge=0)
+
+    # 不限制并发的路由。支持路由名称或路径，可以使用通配符
+    exempt_routes: list[str] = Field(default_factory=lambda: ["/ping", "/metrics"])
+
+    # 503响应模板中的业务状态码
+    reject_code: str = Field(default="503")
+
+    # 503响应模板中的消息
+    reject_msg: str = Field(default="服务繁忙，请稍后重试")
+
+    # 是否按请求的耗时自适应调整并发数，配置的并发数作为上限
+    adaptive: bool = Field(default=False)
+
+    # 自适应的目标耗时，单位秒。耗时不超过目标时逐步增大并发数，超过时减小
+    adaptive_latency: float = Field(default=0.5, gt=0)
+
+    # 自适应时并发数的下限
+    adaptive_min_limit: int = Field(default=1, gt=0)
+
+    # 耗时超过目标时并发数的回退系数
+    adaptive_backoff: float = Field(default=0.9, gt=0, lt=1)
+
+
+class ServerSettings(BaseModel):
+    """
+    服务调优配置类
+    """
+
+    # 工作进程数。为空时开发模式为1，生产模式为容器实际可用的CPU数量（考虑cgroup的CPU配额）
+    workers: int | None = Field(default=None, gt=0)
+
+    # 等待accept的连接队列长度
+    backlog: int = Field(default=100, gt=0)
+
+    # 是否启用keep-alive
+    keep_alive: bool = Field(default=True)
+
+    # keep-alive连接的空闲超时时间，单位秒，默认与Sanic一致。位于负载均衡之后时应调大到超过负载均衡的空闲超时
+    keep_alive_timeout: float = Field(default=5, gt=0)
+
+    # 请求的最大字节数，超出时返回413
+    request_max_size: int = Field(default=100_000_000, gt=0)
+
+    # 请求体的缓冲区字节数，流式请求时缓冲区满了会暂停读取
+    request_buffer_size: int = Field(default=65536, gt=0)
+
+    # 接收请求的超时时间，单位秒
+    request_timeout: float = Field(default=60, gt=0)
+
+    # 处理请求的超时时间，单位秒
+    response_timeout: float = Field(default=60, gt=0)
+
+    # 优雅停止时等待请求处理完成的时间，单位秒
+    graceful_shutdown_timeout: float = Field(default=15, ge=0)
+
+    # 后台日志记录器的队列长度。访问日志由sanic_ext的单个后台进程写入，队列满时日志在工作进程中同步写入
+    log_queue_size: int = Field(default=4096, gt=0)
+
+
+class UploadSettings(BaseModel):
+    """
+    文件上传配置类
+    """
+
+    # 上传请求中所有文件在内存中最多保留的字节数，超出后写入临时文件，同时也是普通字段值的最大字节数
+    spool_size: int = Field(default=1024 * 1024, gt=0)
+
+    # 上传请求体的最大字节数，超出时返回413。为空时和其他请求一样使用server.request_max_size
+    max_size: int | None = Field(default=None, gt=0)
+
+
+class OpenAPISettings(BaseModel):
+    """
+    openapi文档配置类
+    """
+
+    # 是否启用文档。文档由第一个收到请求的工作进程生成并共享给其他工作进程，之后直接返回生成好的字节
+    enable: bool = Field(default=True)
+
+    # 文档标题，为空时使用服务名称
+    title: str | None = Field(default=None)
+
+    # 接口版本
+    version: str = Field(default="1.0.0")
+
+    # 文档描述
+    description: str | None = Field(default=None)
+
+    # 文档路由的前缀，swagger页面为 前缀/swagger，redoc页面为 前缀/redoc，文档为 前缀/openapi.json
+    url_prefix: str = Field(default="/docs")
+
+    # 不生成文档的路由，支持路由名称或路径的通配符
+    ignore_routes: list[str] = Field(default_factory=lambda: ["/ping", "/metrics"])
+
+
+class HotReloadSettings(BaseModel):
+    """
+    配置热加载配置类
+    """
+
+    # 是否启用热加载。主进程监视configs目录下的配置文件，变化后把可以热加载的配置推送给工作进程，不需要重启。
+    # 可以热加载的配置：access_log、cors_origins、sentry的采样配置、logger.level、logger.req_body、
+    # limiter的并发数和排队配置，其他配置的变化需要重启服务才会生效。
+    # 通过代码传入的配置在重新加载时会丢失，热加载只适用于从文件和环境变量读取的配置
+    enable: bool = Field(default=False)
+
+    # 检查配置文件变化的时间间隔，单位秒
+    interval: float = Field(default=2.0, gt=0)
+
 
 class DefaultSettings(SettingsBase):
     """
@@ -64,8 +395,38 @@ class DefaultSettings(SettingsBase):
     # 跨域设置
     cors_origins: list[str] | None = Field(default_factory=list)
 
-    # 哨兵连接dsn，如果存在则会把错误信息推送给哨兵
+    # 哨兵连接dsn，如果存在则会把错误信息推送给哨兵。推荐使用sentry.dsn
     sentry_dsn: HttpUrl | None = Field(default=None)
 
+    # 哨兵配置
+    sentry: SentrySettings = Field(default_factory=SentrySettings)
+
     # 日志配置
     logger: LoggerSettings = Field(default_factory=LoggerSettings)
+
+    # 指标配置
+    metrics: MetricsSettings = Field(default_factory=MetricsSettings)
+
+    # 响应缓存配置
+    cache: CacheSettings = Field(default_factory=CacheSettings)
+
+    # 响应压缩配置
+    compress: CompressSettings = Field(default_factory=CompressSettings)
+
+    # 服务调优配置
+    server: ServerSettings = Field(default_factory=ServerSettings)
+
+    # 处理函数卸载配置
+    offload: OffloadSettings = Field(default_factory=OffloadSettings)
+
+    # 并发限制配置
+    limiter: LimiterSettings = Field(default_factory=LimiterSettings)
+
+    # 文件上传配置
+    upload: UploadSettings = Field(default_factory=UploadSettings)
+
+    # openapi文档配置
+    openapi: OpenAPISettings = Field(default_factory=OpenAPISettings)
+
+    # 配置热加载配置
+    hot_reload: HotReloadSettings = Field(default_factory=HotReloadSettings)
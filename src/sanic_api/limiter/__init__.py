@@ -0,0 +1 @@
+from sanic_api.limiter.limiter import ConcurrencyLimiter, ConcurrencyLimitExceeded, Limit
@@ -0,0 +1,377 @@
+import asyncio
+import contextlib
+from collections import deque
+from time import monotonic, perf_counter
+
+from sanic import HTTPResponse, Request, Sanic
+from sanic.exceptions import ServiceUnavailable
+from sanic.log import logger
+from sanic.models.server_types import ConnInfo
+from sanic.response import BaseHTTPResponse
+from sanic_routing import Route
+
+from sanic_api.api.response import JSON_CONTENT_TYPE, TempModel
+from sanic_api.metrics.registry import MetricsRegistry
+from sanic_api.utils.route import match_route
+
+
+class ConcurrencyLimitExceeded(ServiceUnavailable):
+    """
+    并发数超出限制，并且排队已满或者排队超时
+    """
+
+
+class Limit:
+    """
+    带有等待队列的并发限制
+    空出的并发数直接交给队列中最早的请求；启用自适应时按请求的耗时调整并发数：
+    耗时不超过目标时每完成一批请求加1，超过目标时乘以回退系数
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        *,
+        queue_size: int = 100,
+        adaptive: bool = False,
+        latency_target: float = 0.5,
+        min_limit: int = 1,
+        backoff: float = 0.9,
+    ):
+        """
+        Args:
+            limit: 最大并发数，启用自适应时是并发数的上限
+            queue_size: 等待队列的长度
+            adaptive: 是否按请求的耗时自适应调整并发数
+            latency_target: 自适应的目标耗时，单位秒
+            min_limit: 自适应时并发数的下限
+            backoff: 耗时超过目标时并发数的回退系数
+        """
+        self.max_limit = limit
+        self.limit = float(limit)
+        self.queue_size = queue_size
+        self.adaptive = adaptive
+        self.latency_target = latency_target
+        self.min_limit = min(min_limit, limit)
+        self.backoff = backoff
+        self.inflight = 0
+        self.waiters: deque[asyncio.Future] = deque()
+        self._last_backoff_time = 0.0
+
+    async def acquire(self, timeout: float) -> bool:
+        """
+        获取一个并发数，没有空闲时排队等待
+        Args:
+            timeout: 排队的超时时间，单位秒
+
+        Returns:
+            是否获取成功，排队已满或者超时时返回False
+        """
+        if self.inflight < int(self.limit) and not self.waiters:
+            self.inflight += 1
+            return True
+        if timeout <= 0 or len(self.waiters) >= self.queue_size:
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:  # noqa: UP041 python3.10中wait_for超时抛出的不是内置的TimeoutError
+            self._remove_waiter(waiter)
+            return False
+        except asyncio.CancelledError:
+            # 已经交给了这个请求的并发数需要归还
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._remove_waiter(waiter)
+            raise
+        return True
+
+    def release(self, latency: float | None = None):
+        """
+        归还一个并发数，交给队列中最早的请求
+        Args:
+            latency: 请求的耗时，单位秒，用于自适应调整并发数
+
+        Returns:
+
+        """
+        self.inflight -= 1
+        if self.adaptive and latency is not None:
+            self._adjust(latency)
+
+        self._wake_waiters()
+
+    def resize(self, limit: int):
+        """
+        修改最大并发数，增大时空出的并发数直接交给队列中的请求
+        Args:
+            limit: 最大并发数，启用自适应时是并发数的上限
+
+        Returns:
+
+        """
+        self.max_limit = limit
+        self.limit = min(self.limit, limit) if self.adaptive else float(limit)
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        while self.waiters and self.inflight < int(self.limit):
+            waiter = self.waiters.popleft()
+            if waiter.done():
+                continue
+            waiter.set_result(None)
+            self.inflight += 1
+
+    def _adjust(self, latency: float):
+        """
+        按请求的耗时调整并发数，加法增大乘法减小。每个目标耗时的时间内最多减小一次，避免一批慢请求把并发数降到最低
+        Args:
+            latency: 请求的耗时，单位秒
+
+        Returns:
+
+        """
+        if latency <= self.latency_target:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            return
+
+        now = monotonic()
+        if now - self._last_backoff_time >= self.latency_target:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+            self._last_backoff_time = now
+
+    def _remove_waiter(self, waiter: asyncio.Future):
+        with contextlib.suppress(ValueError):
+            self.waiters.remove(waiter)
+
+
+class _Slot:
+    """
+    一个请求获取到的并发数，归还是幂等的
+    """
+
+    __slots__ = ("limits", "start_time")
+
+    def __init__(self, limits: list[Limit]):
+        self.limits = limits
+        self.start_time = perf_counter()
+
+    def release(self):
+        limits, self.limits = self.limits, []
+        latency = perf_counter() - self.start_time
+        for limit in limits:
+            limit.release(latency)
+
+
+class ConcurrencyLimiter:
+    """
+    请求的并发限制和过载保护
+    在路由匹配之后、读取请求体之前获取并发数，响应时归还；客户端断开连接时在连接结束时归还。
+    超出并发数的请求进入有限的等待队列，队列已满或者排队超时时快速返回503
+    """
+
+    def __init__(
+        self,
+        app: Sanic,
+        *,
+        max_concurrency: int | None = None,
+        route_limits: dict[str, int] | None = None,
+        queue_size: int = 100,
+        queue_timeout: float = 1.0,
+        retry_after: int = 1,
+        exempt_routes: list[str] | None = None,
+        reject_code: str = "503",
+        reject_msg: str = "服务繁忙，请稍后重试",
+        adaptive: bool = False,
+        adaptive_latency: float = 0.5,
+        adaptive_min_limit: int = 1,
+        adaptive_backoff: float = 0.9,
+        registry: MetricsRegistry | None = None,
+    ):
+        """
+        Args:
+            app: Sanic App
+            max_concurrency: 每个工作进程所有路由加起来的最大并发数，为空时不限制
+            route_limits: 路由单独的最大并发数，键支持路由名称或路径的通配符，匹配到的每个路由各自计算
+            queue_size: 每个限制的等待队列长度
+            queue_timeout: 排队的超时时间，单位秒，为0时不排队
+            retry_after: 503响应中Retry-After的秒数
+            exempt_routes: 不限制并发的路由，支持路由名称或路径的通配符
+            reject_code: 503响应模板中的业务状态码
+            reject_msg: 503响应模板中的消息
+            adaptive: 是否按请求的耗时自适应调整并发数，配置的并发数作为上限
+            adaptive_latency: 自适应的目标耗时，单位秒
+            adaptive_min_limit: 自适应时并发数的下限
+            adaptive_backoff: 耗时超过目标时并发数的回退系数
+            registry: 指标注册表，存在时记录被拒绝的请求数和自适应的并发数
+        """
+        self.app = app
+        self.route_limits = route_limits or {}
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.exempt_routes = exempt_routes or []
+        self.adaptive = adaptive
+        self.adaptive_latency = adaptive_latency
+        self.adaptive_min_limit = adaptive_min_limit
+        self.adaptive_backoff = adaptive_backoff
+        self.global_limit = self._create_limit(max_concurrency) if max_concurrency else None
+
+        # 503响应的内容是固定的，提前序列化好
+        reject_data = TempModel(code=reject_code, msg=reject_msg)
+        self.reject_body = reject_data.__pydantic_serializer__.to_json(reject_data)
+        self.reject_headers = {"retry-after": str(retry_after)}
+
+        self.rejected = self.limit_gauge = None
+        if registry is not None:
+            self.rejected = registry.counter(
+                "sanic_api_rejected_requests_total",
+                "并发数超出限制被拒绝的请求数",
+                ("route",),
+            )
+            if adaptive:
+                self.limit_gauge = registry.gauge(
+                    "sanic_api_concurrency_limit",
+                    "自适应调整后的最大并发数，global为所有路由的限制",
+                    ("limit",),
+                )
+
+    def setup(self):
+        """
+        注册获取和归还并发数的信号，以及503响应的异常处理
+        Returns:
+
+        """
+        self.app.signal("http.routing.after")(self._on_routing_after)
+        self.app.signal("http.lifecycle.response")(self._on_response)
+        self.app.signal("http.lifecycle.complete")(self._on_complete)
+        self.app.exception(ConcurrencyLimitExceeded)(self._on_exceeded)
+
+    def reload(self, *, max_concurrency: int | None, queue_size: int, queue_timeout: float, retry_after: int):
+        """
+        热加载全局的并发数和排队配置，正在处理和排队的请求不受影响
+        Args:
+            max_concurrency: 每个工作进程所有路由加起来的最大并发数
+            queue_size: 每个限制的等待队列长度
+            queue_timeout: 排队的超时时间，单位秒
+            retry_after: 503响应中Retry-After的秒数
+
+        Returns:
+
+        """
+        if self.global_limit is not None and max_concurrency:
+            self.global_limit.resize(max_concurrency)
+        elif bool(self.global_limit) != bool(max_concurrency):
+            logger.warning("开启或关闭全局的并发限制需要重启服务才会生效")
+
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.reject_headers = {"retry-after": str(retry_after)}
+        limits = {self.global_limit} if self.global_limit else set()
+        for route in self.app.router.routes:
+            limits.update(getattr(route.ctx, "concurrency_limits", ()))
+        for limit in limits:
+            limit.queue_size = queue_size
+
+    def _create_limit(self, limit: int) -> Limit:
+        return Limit(
+            limit,
+            queue_size=self.queue_size,
+            adaptive=self.adaptive,
+            latency_target=self.adaptive_latency,
+            min_limit=self.adaptive_min_limit,
+            backoff=self.adaptive_backoff,
+        )
+
+    def _get_limits(self, route: Route) -> tuple[Limit, ...]:
+        """
+        获取路由需要经过的并发限制，结果缓存在路由的ctx上
+        Args:
+            route: 路由
+
+        Returns:
+            并发限制，先路由的再全局的，不限制的路由返回空元组
+        """
+        try:
+            return route.ctx.concurrency_limits
+        except AttributeError:
+            pass
+
+        limits = []
+        if not match_route(route, self.exempt_routes):
+            for pattern, route_limit in self.route_limits.items():
+                if match_route(route, [pattern]):
+                    limits.append(self._create_limit(route_limit))
+                    break
+            if self.global_limit:
+                limits.append(self.global_limit)
+        route.ctx.concurrency_limits = tuple(limits)
+        return route.ctx.concurrency_limits
+
+    async def _on_routing_after(self, request: Request, route: Route, **_):
+        limits = self._get_limits(route)
+        if not limits:
+            return
+
+        start_time = perf_counter()
+        acquired = []
+        for limit in limits:
+            timeout = self.queue_timeout - (perf_counter() - start_time)
+            if not await limit.acquire(timeout):
+                for acquired_limit in acquired:
+                    acquired_limit.release()
+                if self.rejected is not None:
+                    self.rejected.inc((route.name,))
+                raise ConcurrencyLimitExceeded()
+            acquired.append(limit)
+
+        phase_times = getattr(request, "phase_times", None)
+        if phase_times is not None:
+            phase_times["queue"] = perf_counter() - start_time
+
+        # HTTP/1.1的一个连接同时只会处理一个请求，客户端断开时在连接结束的信号中归还
+        slot = _Slot(acquired)
+        request.ctx.concurrency_slot = slot
+        if request.conn_info is not None:
+            request.conn_info.ctx.concurrency_slot = slot
+
+    async def _on_response(self, request: Request, response: BaseHTTPResponse):
+        slot = getattr(request.ctx, "concurrency_slot", None)
+        if slot is None:
+            return
+        slot.release()
+        request.ctx.concurrency_slot = None
+        if request.conn_info is not None:
+            request.conn_info.ctx.concurrency_slot = None
+        self._update_gauge(request.route)
+
+    async def _on_complete(self, conn_info: ConnInfo):
+        slot = getattr(conn_info.ctx, "concurrency_slot", None)
+        if slot is not None:
+            slot.release()
+            conn_info.ctx.concurrency_slot = None
+
+    async def _on_exceeded(self, _request: Request, _exception: ConcurrencyLimitExceeded) -> HTTPResponse:
+        return HTTPResponse(
+            self.reject_body,
+            status=503,
+            headers=self.reject_headers,
+            content_type=JSON_CONTENT_TYPE,
+        )
+
+    def _update_gauge(self, route: Route | None):
+        """
+        记录自适应调整后的并发数
+        Args:
+            route: 路由
+
+        Returns:
+
+        """
+        if self.limit_gauge is None or route is None:
+            return
+        for limit in route.ctx.concurrency_limits:
+            name = "global" if limit is self.global_limit else route.name
+            self.limit_gauge.set((name,), int(limit.limit))
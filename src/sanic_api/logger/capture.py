@@ -0,0 +1,206 @@
+import random
+from collections.abc import Iterable
+from typing import Any
+
+import orjson
+from pydantic import BaseModel
+from sanic import BadRequest, Request
+from sanic_routing import Route
+
+from sanic_api.config.setting import ReqBodyModeEnum
+from sanic_api.utils.route import match_route
+
+# 脱敏后的字段值
+REDACTED = "******"
+
+
+class ReqBodyCapture:
+    """
+    访问日志中请求体的记录器
+    优先使用已经校验过的json_data、form_data、query_data，没有时才去解析原始参数，
+    并按照配置进行采样、路由过滤、字段脱敏和大小截断
+    """
+
+    def __init__(
+        self,
+        mode: ReqBodyModeEnum = ReqBodyModeEnum.FULL,
+        *,
+        sample_rate: float = 1.0,
+        max_bytes: int = 0,
+        include_routes: list[str] | None = None,
+        exclude_routes: list[str] | None = None,
+        redact_fields: list[str] | None = None,
+    ):
+        """
+        Args:
+            mode: 记录模式
+            sample_rate: 采样模式下的采样率
+            max_bytes: 最多记录多少字节，为0时不限制
+            include_routes: 只记录这些路由的请求体，支持路由名称或路径的通配符
+            exclude_routes: 不记录这些路由的请求体，支持路由名称或路径的通配符
+            redact_fields: 需要脱敏的字段名，不区分大小写
+        """
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.include_routes = include_routes or []
+        self.exclude_routes = exclude_routes or []
+        self.redact_fields = frozenset(f.lower() for f in redact_fields or [])
+
+    def reload(
+        self,
+        mode: ReqBodyModeEnum,
+        *,
+        sample_rate: float,
+        max_bytes: int,
+        include_routes: list[str],
+        exclude_routes: list[str],
+        redact_fields: list[str],
+        routes: Iterable[Route] = (),
+    ):
+        """
+        热加载记录配置，清除路由上缓存的是否记录
+        Args:
+            mode: 记录模式
+            sample_rate: 采样模式下的采样率
+            max_bytes: 最多记录多少字节，为0时不限制
+            include_routes: 只记录这些路由的请求体
+            exclude_routes: 不记录这些路由的请求体
+            redact_fields: 需要脱敏的字段名
+            routes: 需要清除缓存的路由
+
+        Returns:
+
+        """
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.include_routes = include_routes
+        self.exclude_routes = exclude_routes
+        self.redact_fields = frozenset(f.lower() for f in redact_fields)
+        for route in routes:
+            vars(route.ctx).pop("log_req_body", None)
+
+    def __call__(self, req: Request | None) -> dict | str | None:
+        """
+        获取需要记录的请求体数据
+        Args:
+            req: 请求
+
+        Returns:
+            返回具有 json、query、form参数的json，超出大小时返回截断后的字符串
+        """
+        if not req:
+            return None
+
+        data = {}
+        plan = getattr(req, "_binding_plan", None)
+        for name, attr in (("args", "query_data"), ("form", "form_data")):
+            attr_data = self._get_model_data(req, attr)
+            if attr_data is None:
+                field_index = plan.field_indexes.get(attr) if plan else None
+                collection_fields = field_index.collection_fields if field_index else frozenset()
+                attr_data = self._get_param_data(getattr(req, name), collection_fields)
+            if attr_data:
+                data[name] = attr_data
+
+        json_data = self._get_model_data(req, "json_data")
+        if json_data is None:
+            json_data = self._get_raw_json(req)
+        if json_data:
+            data["json"] = json_data
+
+        if self.redact_fields:
+            data = self._redact(data)
+        return self._truncate(data)
+
+    def enabled(self, req: Request | None) -> bool:
+        """
+        这个请求是否需要记录请求体
+        Args:
+            req: 请求
+
+        Returns:
+
+        """
+        if self.mode == ReqBodyModeEnum.OFF:
+            return False
+        if req and req.route and not self._route_enabled(req.route):
+            return False
+        if self.mode == ReqBodyModeEnum.SAMPLED:
+            return random.random() < self.sample_rate  # nosec B311
+        return True
+
+    def _route_enabled(self, route) -> bool:
+        """
+        路由是否需要记录请求体，结果缓存在路由的ctx上
+        Args:
+            route: 路由
+
+        Returns:
+
+        """
+        enabled = getattr(route.ctx, "log_req_body", None)
+        if enabled is None:
+            included = not self.include_routes or match_route(route, self.include_routes)
+            enabled = included and not match_route(route, self.exclude_routes)
+            route.ctx.log_req_body = enabled
+        return enabled
+
+    @staticmethod
+    def _get_model_data(req: Request, attr: str) -> dict | None:
+        """
+        获取已经校验过的参数数据，只包含请求中传入的字段
+        """
+        model: BaseModel | None = getattr(req, attr, None)
+        if model is None:
+            return None
+        return model.model_dump(mode="json", exclude_unset=True)
+
+    @staticmethod
+    def _get_param_data(params, collection_fields: frozenset[str]) -> dict:
+        """
+        获取原始的form或query参数，只有一个值的参数去掉外层的列表，参数模型中的列表字段保留列表
+        """
+        return {
+            k: v[0] if isinstance(v, list) and len(v) == 1 and k not in collection_fields else v
+            for k, v in params.items()
+        }
+
+    def _get_raw_json(self, req: Request) -> Any:
+        """
+        获取原始的json参数，请求体超出大小时不去解析，因为无法脱敏也不记录内容
+        """
+        if not req.body:
+            return None
+        if self.max_bytes and len(req.body) > self.max_bytes:
+            return f"...(共{len(req.body)}字节，未记录)"
+        try:
+            return req.json
+        except BadRequest:
+            return None
+
+    def _redact(self, value: Any) -> Any:
+        """
+        递归脱敏字段
+        """
+        if isinstance(value, dict):
+            return {k: REDACTED if str(k).lower() in self.redact_fields else self._redact(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._redact(v) for v in value]
+        return value
+
+    def _truncate(self, data: dict) -> dict | str:
+        """
+        超出大小时把数据截断为字符串
+        """
+        if not self.max_bytes:
+            return data
+        text = orjson.dumps(data, default=str)
+        if len(text) <= self.max_bytes:
+            return data
+        return self._truncate_text(text[: self.max_bytes].decode(errors="ignore"), len(text))
+
+    @staticmethod
+    def _truncate_text(text: str, total: int) -> str:
+        return f"{text}...(共{total}字节，已截断)"
@@ -1,39 +1,52 @@
 import inspect
 import logging.config
+import os
+import sys
 from logging import LogRecord, StreamHandler
 
 from loguru import logger
-from sanic import BadRequest, Request, Sanic
+
+# noinspection PyProtectedMember
+from loguru._recattrs import RecordFile
+from sanic import Request
+
+from sanic_api.api.context import get_request_context
+from sanic_api.logger.capture import ReqBodyCapture
+
+# 标准日志记录自带的属性，不在这里面的就是扩展信息
+_STANDARD_ATTRS = frozenset(LogRecord("", 0, "", 0, "", None, None, "").__dict__)
 
 
 class InterceptHandler(StreamHandler):
+    def __init__(self, fast: bool = False, req_body_capture: ReqBodyCapture | None = None):
+        """
+        Args:
+            fast: 快速模式。直接使用标准日志记录中已有的调用位置，不再逐帧查找调用者
+            req_body_capture: 访问日志中请求体的记录器，为空时全部记录
+        """
+        super().__init__()
+        self.fast = fast
+        self.req_body_capture = req_body_capture or ReqBodyCapture()
+        self._levels: dict[str, str | int] = {}
+        self._module_names: dict[str, str] = {}
+        self._fast_logger = logger.patch(self._patch_location)
+
     def emit(self, record: logging.LogRecord):
-        # Get corresponding Loguru level if it exists.
-        level: str | int
-        try:
-            level = logger.level(record.levelname).name
-        except ValueError:
-            level = record.levelno
-
-        # Find caller from where originated the logged message.
-        frame, depth = inspect.currentframe(), 0
-        while frame and (depth == 0 or frame.f_code.co_filename == logging.__file__):
-            frame = frame.f_back
-            depth += 1
+        level = self._get_level(record)
 
         # 获取标准日志的扩展信息
-        default_record = LogRecord("", 0, "", 0, "", None, None, "")
-        etxra_info = {key: value for key, value in record.__dict__.items() if key not in default_record.__dict__}
+        etxra_info = {key: value for key, value in record.__dict__.items() if key not in _STANDARD_ATTRS}
 
-        # 加入情求ID。用来识别情求链
-        req_id = self._get_req_id()
-        if req_id:
-            etxra_info.update({"req_id": req_id})
+        # 加入请求上下文中的请求ID、追踪ID和自定义字段。用来识别情求链
+        context = get_request_context()
+        if context:
+            etxra_info.update(context.log_fields())
 
-        # 给访问日志里面加入情求体数据
+        # 给访问日志里面加入情求体数据，只有访问日志才需要获取请求对象
         if record.name == "sanic.access":
-            req_body = self._get_req_body()
-            etxra_info.update({"req_body": req_body})
+            req = self._get_req()
+            if self.req_body_capture.enabled(req):
+                etxra_info.update({"req_body": self.req_body_capture(req)})
 
         # 如果没有扩展信息，则为空字符串
         etxra_info = etxra_info if etxra_info else ""
@@ -44,56 +57,69 @@ class InterceptHandler(StreamHandler):
 
         # 把标准日志的名字加入到loguru日志的type字段
         etxra_data = {"type": record.name, "etxra_info": etxra_info}
-        logger.bind(**etxra_data).opt(depth=depth, exception=record.exc_info).log(level, msg)
+        if self.fast:
+            log = self._fast_logger.bind(_std_record=record, **etxra_data).opt(exception=record.exc_info)
+        else:
+            log = logger.bind(**etxra_data).opt(depth=self._get_depth(), exception=record.exc_info)
+        log.log(level, msg)
 
-    # noinspection PyUnresolvedReferences,PyBroadException
-    @staticmethod
-    def _get_req() -> Request | None:
+    def _get_level(self, record: logging.LogRecord) -> str | int:
         """
-        获取请求
+        获取对应的loguru日志级别，结果会缓存起来
         """
+        level = self._levels.get(record.levelname)
+        if level is None:
+            try:
+                level = logger.level(record.levelname).name
+            except ValueError:
+                return record.levelno
+            self._levels[record.levelname] = level
+        return level
 
-        try:
-            app = Sanic.get_app()
-            req = app.request_class.get_current()
-        except Exception:
-            req = None
-        return req
-
-    def _get_req_id(self) -> str:
+    @staticmethod
+    def _get_depth() -> int:
         """
-        获取请求ID
+        逐帧查找日志的调用者
         """
+        # 从emit方法所在的帧开始查找
+        frame, depth = inspect.currentframe().f_back, 0
+        while frame and (depth == 0 or frame.f_code.co_filename == logging.__file__):
+            frame = frame.f_back
+            depth += 1
+        return depth
 
-        req = self._get_req()
-        return str(req.id) if req else ""
-
-    def _get_req_body(self) -> dict | None:
+    def _patch_location(self, loguru_record: dict):
+        """
+        快速模式下，使用标准日志记录中的调用位置替换loguru日志记录中的调用位置
+        """
+        record: LogRecord = loguru_record["extra"].pop("_std_record")
+        loguru_record["name"] = self._get_module_name(record)
+        loguru_record["module"] = record.module
+        loguru_record["function"] = record.funcName
+        loguru_record["line"] = record.lineno
+        loguru_record["file"] = RecordFile(record.filename, record.pathname)
+
+    def _get_module_name(self, record: LogRecord) -> str:
         """
-        获取请求体数据
+        根据文件路径获取模块名，结果会缓存起来
+        """
+        name = self._module_names.get(record.pathname)
+        if name is None:
+            name = record.module
+            pathname = os.path.abspath(record.pathname)
+            for module_name, module in list(sys.modules.items()):
+                module_file = getattr(module, "__file__", None)
+                if module_file and os.path.abspath(module_file) == pathname:
+                    name = module_name
+                    break
+            self._module_names[record.pathname] = name
+        return name
 
-        Returns:
-            返回具有 json、query、form参数的json
+    # noinspection PyUnresolvedReferences,PyBroadException
+    @staticmethod
+    def _get_req() -> Request | None:
         """
-        req = self._get_req()
-        if not req:
-            return None
-
-        data = {}
-        for attr in ["args", "form"]:
-            attr_data = {}
-            for k, v in getattr(req, attr).items():
-                if isinstance(v, list) and len(v) == 1:
-                    attr_data[k] = v[0]
-                else:
-                    attr_data[k] = v
-            if attr_data:
-                data[attr] = attr_data
-
-        try:
-            if req.json:
-                data["json"] = req.json
-        except BadRequest:
-            ...
-
-        return data
+        获取请求
+        """
+
+        return Request._current.get(None)
@@ -2,18 +2,22 @@ import logging
 import logging.config
 import sys
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 from loguru import logger
 
 # noinspection PyProtectedMember
 from loguru._defaults import env
-from loki_logger_handler.loki_logger_handler import LoguruFormatter, LokiLoggerHandler
 from sanic import Sanic
 from sanic.application.constants import Mode
 from sanic_ext import Extension
 
+from sanic_api.logger.capture import ReqBodyCapture
 from sanic_api.logger.config import InterceptHandler
 
+if TYPE_CHECKING:
+    from sanic_api.logger.loki import LokiShipper
+
 
 class LoggerExtend(Extension):
     """
@@ -32,6 +36,14 @@ class LoggerExtend(Extension):
         compression: str | None = None,
         loki_url: str | None = None,
         loki_labels: dict[str, str] | None = None,
+        loki_batch_size: int = 500,
+        loki_flush_interval: float = 1.0,
+        loki_queue_size: int = 10000,
+        loki_timeout: float = 5.0,
+        loki_max_retries: int = 3,
+        fast_intercept: bool = False,
+        req_body_capture: ReqBodyCapture | None = None,
+        level: str | None = None,
     ):
         """
         Args:
@@ -42,6 +54,14 @@ class LoggerExtend(Extension):
             compression: 日志文件压缩格式： "gz", "bz2", "xz", "lzma", "tar", "tar.gz", "tar.bz2", "tar.xz", "zip"
             loki_url: 推送loki的url
             loki_labels：loki推送时的标签
+            loki_batch_size: loki每批推送的最大日志数
+            loki_flush_interval: loki推送的时间间隔，单位秒
+            loki_queue_size: loki推送队列的最大长度，超出时丢弃最旧的日志
+            loki_timeout: loki推送请求的超时时间，单位秒
+            loki_max_retries: loki推送失败时的最大重试次数
+            fast_intercept: 拦截标准日志时使用快速模式，直接使用标准日志记录中的调用位置
+            req_body_capture: 访问日志中请求体的记录器，为空时全部记录
+            level: 日志级别，为空时loguru的日志为DEBUG，标准日志开发模式为DEBUG，生产模式为INFO
 
         """
         self.app = app
@@ -51,6 +71,16 @@ class LoggerExtend(Extension):
         self.compression = compression
         self.loki_url = loki_url
         self.loki_labels = loki_labels
+        self.loki_batch_size = loki_batch_size
+        self.loki_flush_interval = loki_flush_interval
+        self.loki_queue_size = loki_queue_size
+        self.loki_timeout = loki_timeout
+        self.loki_max_retries = loki_max_retries
+        self.fast_intercept = fast_intercept
+        self.req_body_capture = req_body_capture
+        self.level = level
+        self.loki_shipper: LokiShipper | None = None
+        self._level_no = logger.level(level or "DEBUG").no
         self.setup()
 
     def startup(self, bootstrap) -> None:
@@ -71,7 +101,52 @@ class LoggerExtend(Extension):
 
         """
         logger.remove()
+        self._add_handlers()
+
+        # 接收logging的日志
+        intercept_handler = InterceptHandler(fast=self.fast_intercept, req_body_capture=self.req_body_capture)
+        logging.basicConfig(handlers=[intercept_handler], level=self._get_logging_level(), force=True)
+
+    def set_level(self, level: str | None):
+        """
+        修改日志级别，用于热加载。只修改本扩展的loguru输出过滤用的级别，不重新添加输出，用户自己添加的输出不受影响
+        Args:
+            level: 日志级别，为空时使用默认的级别
+
+        Returns:
+
+        """
+        self._level_no = logger.level(level or "DEBUG").no
+        self.level = level
+        logging.getLogger().setLevel(self._get_logging_level())
+
+    def _filter(self, record: dict) -> bool:
+        """
+        本扩展的loguru输出的过滤器，按当前的级别过滤
+        Args:
+            record: loguru的日志记录
+
+        Returns:
+
+        """
+        return record["level"].no >= self._level_no
 
+    def _get_logging_level(self) -> int:
+        """
+        获取标准日志的级别
+        Returns:
+
+        """
+        if self.level:
+            return logger.level(self.level).no
+        return logging.DEBUG if self.app.state.mode is Mode.DEBUG else logging.INFO
+
+    def _add_handlers(self):
+        """
+        添加loguru的输出：控制台、日志文件及loki推送
+        Returns:
+
+        """
         log_format = env(
             "LOGURU_FORMAT",
             str,
@@ -81,7 +156,6 @@ class LoggerExtend(Extension):
             "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - "
             "<level>{message}</level>{extra[etxra_info]}",
         )
-
         # 基本的控制台输出
         log_handlers = [
             {"sink": sys.stdout, "format": log_format, "colorize": True},
@@ -103,27 +177,38 @@ class LoggerExtend(Extension):
                 }
             )
 
-        # loki 推送
+        # loki 推送，只在配置了地址时才导入
         if self.loki_url:
-            loki_handler = LokiLoggerHandler(
-                url=self.loki_url,
-                labels=self.loki_labels or {},
-                labelKeys={},
-                timeout=10,
-                defaultFormatter=LoguruFormatter(),
-            )
+            from sanic_api.logger.loki import LokiShipper
+
+            if self.loki_shipper is None:
+                self.loki_shipper = LokiShipper(
+                    url=str(self.loki_url),
+                    labels=self.loki_labels,
+                    batch_size=self.loki_batch_size,
+                    flush_interval=self.loki_flush_interval,
+                    queue_size=self.loki_queue_size,
+                    timeout=self.loki_timeout,
+                    max_retries=self.loki_max_retries,
+                )
             log_handlers.append(
                 {
-                    "sink": loki_handler,
+                    "sink": self.loki_shipper,
                     "format": log_format,
                     "colorize": False,
                     "serialize": True,
                 }
             )
 
-        # 配置日志
-        logger.configure(handlers=log_handlers)
+        # 输出本身不限制级别，由过滤器按当前的级别过滤，热加载时只需要修改级别
+        for handler in log_handlers:
+            logger.add(**handler, level=0, filter=self._filter)
 
-        # 接收logging的日志
-        log_level = logging.DEBUG if self.app.state.mode is Mode.DEBUG else logging.INFO
-        logging.basicConfig(handlers=[InterceptHandler()], level=log_level, force=True)
+    def flush(self):
+        """
+        等待后台推送的日志全部推送完成
+        Returns:
+
+        """
+        if self.loki_shipper:
+            self.loki_shipper.flush()
@@ -0,0 +1,253 @@
+import atexit
+import gzip
+import http.client
+import random
+import sys
+import threading
+from base64 import b64encode
+from collections import deque
+from urllib.parse import urlsplit
+
+import orjson
+
+# 重试等待时间的随机抖动
+_random = random.SystemRandom()
+
+
+class LokiShipper:
+    """
+    loki日志推送器
+    作为loguru的sink使用，日志只会放入有界队列中，由后台线程按批量大小或时间间隔gzip压缩后推送，
+    不会给请求增加任何延迟。队列满时丢弃最旧的日志，推送失败时带抖动的指数退避重试。
+    """
+
+    def __init__(
+        self,
+        url: str,
+        labels: dict[str, str] | None = None,
+        *,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        queue_size: int = 10000,
+        timeout: float = 5.0,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+    ):
+        """
+        Args:
+            url: loki的推送地址，例如 http://127.0.0.1:3100/loki/api/v1/push
+            labels: 推送时的标签
+            batch_size: 每批推送的最大日志数，队列中的日志达到这个数量时立即推送
+            flush_interval: 推送的时间间隔，单位秒
+            queue_size: 队列的最大长度，超出时丢弃最旧的日志
+            timeout: 推送请求的超时时间，单位秒
+            max_retries: 推送失败时的最大重试次数
+            retry_backoff: 重试的基础等待时间，单位秒，每次重试翻倍
+        """
+        url_info = urlsplit(str(url))
+        self.url = str(url)
+        self.labels = labels or {}
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        # 推送的统计数据
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+
+        self._host = url_info.hostname or ""
+        self._port = url_info.port
+        self._https = url_info.scheme == "https"
+        self._path = url_info.path or "/"
+        if url_info.query:
+            self._path = f"{self._path}?{url_info.query}"
+        self._headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+        if url_info.username:
+            credentials = f"{url_info.username}:{url_info.password or ''}".encode()
+            self._headers["Authorization"] = f"Basic {b64encode(credentials).decode()}"
+
+        self._queue: deque[tuple[str, str, str]] = deque(maxlen=queue_size)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._idle = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._conn: http.client.HTTPConnection | None = None
+
+    def __call__(self, message):
+        """
+        loguru的sink入口，只做入队操作
+        Args:
+            message: loguru的日志消息
+
+        Returns:
+
+        """
+        record = message.record
+        log_time = record["time"]
+        timestamp = str(int(log_time.timestamp()) * 1_000_000_000 + log_time.microsecond * 1000)
+        entry = (timestamp, record["level"].name, str(message).rstrip("\n"))
+
+        with self._lock:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append(entry)
+            size = len(self._queue)
+            if self._thread is None:
+                self._start()
+
+        if size >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        等待队列中的日志全部推送完成
+        Args:
+            timeout: 最长等待时间，单位秒，默认为推送超时时间乘以最大请求次数
+
+        Returns:
+            是否在超时前推送完成
+        """
+        if self._thread is None or not self._thread.is_alive():
+            return not self._queue
+
+        timeout = timeout if timeout is not None else self.timeout * (self.max_retries + 1)
+        self._idle.clear()
+        self._wakeup.set()
+        return self._idle.wait(timeout)
+
+    def close(self, timeout: float | None = None):
+        """
+        停止后台线程，停止前会推送剩余的日志
+        Args:
+            timeout: 最长等待时间，单位秒
+
+        Returns:
+
+        """
+        if self._thread is None or self._stopped.is_set():
+            return
+
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join(timeout if timeout is not None else self.timeout * (self.max_retries + 1))
+        if self.dropped or self.failed:
+            sys.stderr.write(
+                f"loki日志推送: 成功 {self.sent} 条，队列满丢弃 {self.dropped} 条，推送失败 {self.failed} 条\n"
+            )
+
+    def _start(self):
+        """
+        启动后台推送线程，在收到第一条日志时才启动
+        Returns:
+
+        """
+        self._thread = threading.Thread(target=self._run, name="loki-shipper", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        """
+        后台线程的主循环
+        Returns:
+
+        """
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._ship_pending()
+            self._idle.set()
+        self._ship_pending()
+        self._idle.set()
+
+    def _ship_pending(self):
+        """
+        分批推送队列中的所有日志
+        Returns:
+
+        """
+        while True:
+            with self._lock:
+                count = min(len(self._queue), self.batch_size)
+                batch = [self._queue.popleft() for _ in range(count)]
+            if not batch:
+                return
+            self._push(batch)
+
+    def _push(self, batch: list[tuple[str, str, str]]):
+        """
+        推送一批日志，失败时重试
+        Args:
+            batch: 一批日志
+
+        Returns:
+
+        """
+        body = gzip.compress(self._encode(batch), compresslevel=5)
+        for attempt in range(self.max_retries + 1):
+            retry = self._send(body)
+            if retry is None:
+                self.sent += len(batch)
+                return
+            if not retry or attempt == self.max_retries:
+                break
+
+            # 带抖动的指数退避，停止时不再等待
+            delay = self.retry_backoff * (2**attempt) * _random.uniform(0.5, 1.5)
+            if self._stopped.wait(delay):
+                break
+        self.failed += len(batch)
+
+    def _send(self, body: bytes) -> bool | None:
+        """
+        发送推送请求，复用长连接
+        Args:
+            body: 压缩后的请求体
+
+        Returns:
+            成功返回None，失败时返回是否需要重试
+        """
+        try:
+            if self._conn is None:
+                conn_class = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+                self._conn = conn_class(self._host, self._port, timeout=self.timeout)
+            self._conn.request("POST", self._path, body=body, headers=self._headers)
+            resp = self._conn.getresponse()
+            resp.read()
+        except (OSError, http.client.HTTPException):
+            self._reset_conn()
+            return True
+
+        if resp.status < 300:
+            return None
+        if resp.will_close:
+            self._reset_conn()
+        # 客户端错误重试也不会成功，限流除外
+        return resp.status == 429 or resp.status >= 500
+
+    def _reset_conn(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _encode(self, batch: list[tuple[str, str, str]]) -> bytes:
+        """
+        按照日志级别分组，编码成loki的推送格式
+        Args:
+            batch: 一批日志
+
+        Returns:
+
+        """
+        streams: dict[str, list[list[str]]] = {}
+        for timestamp, level, line in batch:
+            streams.setdefault(level, []).append([timestamp, line])
+        data = {
+            "streams": [
+                {"stream": {**self.labels, "level": level}, "values": values} for level, values in streams.items()
+            ]
+        }
+        return orjson.dumps(data)
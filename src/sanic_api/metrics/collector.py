@@ -0,0 +1,330 @@
+import asyncio
+import hmac
+import os
+import shutil
+import tempfile
+from collections.abc import Iterable
+from pathlib import Path
+from time import perf_counter
+
+import orjson
+from sanic import HTTPResponse, Request, Sanic
+from sanic.response import BaseHTTPResponse
+from sanic_routing import Route
+
+from sanic_api.config.defaults import DEFAULT_TIME_BUCKETS
+from sanic_api.metrics.registry import DEFAULT_SIZE_BUCKETS, Gauge, MetricsRegistry
+from sanic_api.utils.route import match_route
+
+# 工作进程之间共享指标快照的目录，由主进程创建后通过环境变量传给工作进程
+METRICS_DIR_ENV = "SANIC_API_METRICS_DIR"
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 没有匹配到路由的请求使用的路由标签
+UNMATCHED_ROUTE = "unmatched"
+
+# 已经结束的工作进程的状态
+_EXITED_STATES = ("TERMINATED", "FAILED", "COMPLETED")
+
+
+class RouteMetrics:
+    """
+    按路由记录的延迟和吞吐量指标
+    每个工作进程只在内存中记录，定时把快照写入共享目录；
+    访问指标路由时汇总所有工作进程的快照，输出prometheus的文本格式
+    """
+
+    def __init__(
+        self,
+        app: Sanic,
+        *,
+        path: str = "/metrics",
+        buckets: Iterable[float] = DEFAULT_TIME_BUCKETS,
+        ignore_routes: list[str] | None = None,
+        flush_interval: float = 1.0,
+        token: str | None = None,
+    ):
+        """
+        Args:
+            app: Sanic App
+            path: 指标路由的路径
+            buckets: 耗时直方图的分桶，单位秒
+            ignore_routes: 不记录指标的路由，支持路由名称或路径的通配符
+            flush_interval: 工作进程把快照写入共享目录的时间间隔，单位秒
+            token: 访问指标路由需要的令牌，为空时不校验
+        """
+        self.app = app
+        self.path = path
+        self.token = token
+        self.ignore_routes = ignore_routes or []
+        self.flush_interval = flush_interval
+        self.metrics_dir: Path | None = None
+        self._created_dir = False
+        self._dump_task: asyncio.Task | None = None
+
+        self.registry = MetricsRegistry()
+        self.requests = self.registry.counter(
+            "sanic_api_requests_total",
+            "请求数",
+            ("route", "method", "status"),
+        )
+        self.duration = self.registry.histogram(
+            "sanic_api_request_duration_seconds",
+            "请求的总耗时",
+            ("route",),
+            buckets,
+        )
+        self.phase = self.registry.histogram(
+            "sanic_api_request_phase_seconds",
+            "请求各阶段的耗时。queue: 并发限制的排队，receive: 接收请求体，validate: 参数校验，"
+            "handler: 处理函数（包含serialize），serialize: 响应序列化",
+            ("route", "phase"),
+            buckets,
+        )
+        self.request_size = self.registry.histogram(
+            "sanic_api_request_size_bytes",
+            "请求体的大小",
+            ("route",),
+            DEFAULT_SIZE_BUCKETS,
+        )
+        self.response_size = self.registry.histogram(
+            "sanic_api_response_size_bytes",
+            "响应体的大小，流式响应不记录",
+            ("route",),
+            DEFAULT_SIZE_BUCKETS,
+        )
+        self.validation_errors = self.registry.counter(
+            "sanic_api_validation_errors_total",
+            "参数校验失败的次数",
+            ("route",),
+        )
+
+    def setup(self):
+        """
+        注册记录指标的信号和共享目录的监听器
+        Returns:
+
+        """
+        self.app.signal("http.lifecycle.request")(self._on_request)
+        self.app.signal("http.handler.before")(self._on_handler_before)
+        self.app.signal("http.handler.after")(self._on_handler_after)
+        self.app.signal("http.lifecycle.response")(self._on_response)
+        self.app.main_process_start(self._main_process_start)
+        self.app.main_process_stop(self._main_process_stop)
+        self.app.after_server_start(self._after_server_start)
+        self.app.before_server_stop(self._before_server_stop)
+
+    def setup_route(self):
+        """
+        注册指标路由
+        Returns:
+
+        """
+        self.app.add_route(self._handle, self.path, name="metrics", methods=["GET"])
+
+    async def _handle(self, request: Request) -> HTTPResponse:
+        """
+        指标路由，汇总所有工作进程的指标
+        Args:
+            request: 请求
+
+        Returns:
+
+        """
+        if not self._check_token(request):
+            return HTTPResponse(status=401, headers={"www-authenticate": "Bearer"})
+
+        snapshot = self.registry.snapshot()
+        if self.metrics_dir is None:
+            snapshots = [snapshot]
+        else:
+            # 读写共享目录中的快照文件放到线程池中，不阻塞事件循环
+            snapshots = await asyncio.get_running_loop().run_in_executor(None, self._collect, snapshot)
+        return HTTPResponse(self.registry.render(snapshots), content_type=PROMETHEUS_CONTENT_TYPE)
+
+    def _check_token(self, request: Request) -> bool:
+        """
+        校验请求头中的令牌
+        Args:
+            request: 请求
+
+        Returns:
+            没有设置令牌或者令牌一致时返回True
+        """
+        if not self.token:
+            return True
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), self.token.encode())
+
+    def _collect(self, snapshot: dict[str, list]) -> list[dict[str, list]]:
+        """
+        写入本进程最新的快照后读取所有工作进程的快照，在线程池中执行
+        Args:
+            snapshot: 本进程的指标快照
+
+        Returns:
+
+        """
+        self._dump(snapshot)
+        return self._load_snapshots()
+
+    def _get_route_label(self, route: Route | None) -> str | None:
+        """
+        获取路由的标签值，结果缓存在路由的ctx上
+        Args:
+            route: 路由
+
+        Returns:
+            路由标签，忽略的路由返回None
+        """
+        if route is None:
+            return UNMATCHED_ROUTE
+        try:
+            return route.ctx.metrics_label
+        except AttributeError:
+            pass
+
+        label = None if match_route(route, self.ignore_routes) else route.name
+        route.ctx.metrics_label = label
+        return label
+
+    async def _on_request(self, request: Request):
+        request.ctx.metrics_start_time = perf_counter()
+
+    async def _on_handler_before(self, request: Request):
+        request.ctx.metrics_handler_start_time = perf_counter()
+
+    async def _on_handler_after(self, request: Request):
+        start_time = getattr(request.ctx, "metrics_handler_start_time", None)
+        if start_time is not None:
+            request.phase_times["handler"] = perf_counter() - start_time
+
+    async def _on_response(self, request: Request, response: BaseHTTPResponse):
+        label = self._get_route_label(request.route)
+        if label is None:
+            return
+
+        route_labels = (label,)
+        self.requests.inc((label, request.method, str(response.status)))
+        start_time = getattr(request.ctx, "metrics_start_time", None)
+        if start_time is not None:
+            self.duration.observe(route_labels, perf_counter() - start_time)
+        if request.route is None:
+            return
+
+        for phase, seconds in request.phase_times.items():
+            self.phase.observe((label, phase), seconds)
+        if request.body:
+            self.request_size.observe(route_labels, len(request.body))
+        if response.body is not None:
+            self.response_size.observe(route_labels, len(response.body))
+        if request.validation_failed:
+            self.validation_errors.inc(route_labels)
+
+    async def _main_process_start(self, _app: Sanic):
+        """
+        主进程中创建共享目录，已经通过环境变量指定的则直接使用
+        Args:
+            _app: Sanic App
+
+        Returns:
+
+        """
+        if not os.environ.get(METRICS_DIR_ENV):
+            os.environ[METRICS_DIR_ENV] = tempfile.mkdtemp(prefix="sanic_api_metrics_")
+            self._created_dir = True
+
+    async def _main_process_stop(self, _app: Sanic):
+        if self._created_dir:
+            shutil.rmtree(os.environ.pop(METRICS_DIR_ENV), ignore_errors=True)
+
+    async def _after_server_start(self, _app: Sanic):
+        """
+        工作进程启动后定时写入快照。没有共享目录时（例如单进程模式）只使用本进程的指标
+        Args:
+            _app: Sanic App
+
+        Returns:
+
+        """
+        metrics_dir = os.environ.get(METRICS_DIR_ENV)
+        if not metrics_dir:
+            return
+        self.metrics_dir = Path(metrics_dir)
+        self.metrics_dir.mkdir(parents=True, exist_ok=True)
+        self._dump_task = asyncio.create_task(self._dump_loop())
+
+    async def _before_server_stop(self, _app: Sanic):
+        if self._dump_task is None:
+            return
+        self._dump_task.cancel()
+        self._dump_task = None
+        self._dump()
+
+    async def _dump_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            # 快照在事件循环中获取，保证和指标的更新不会同时发生，写文件放到线程池中
+            await loop.run_in_executor(None, self._dump, self.registry.snapshot())
+
+    def _dump(self, snapshot: dict[str, list] | None = None):
+        """
+        把本进程的指标快照原子地写入共享目录
+        Args:
+            snapshot: 指标快照，为空时获取当前的快照
+
+        Returns:
+
+        """
+        if snapshot is None:
+            snapshot = self.registry.snapshot()
+        path = self.metrics_dir / f"{os.getpid()}.json"
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            tmp_path.write_bytes(orjson.dumps(snapshot))
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+
+    def _load_snapshots(self) -> list[dict[str, list]]:
+        """
+        读取共享目录中所有工作进程的快照。已经退出的工作进程的快照也会保留，保证计数器和直方图不会回退；
+        仪表盘表示的是当前的状态，已经退出的工作进程的仪表盘数据会被丢弃
+        Returns:
+
+        """
+        live_pids = self._get_live_pids()
+        snapshots = []
+        for path in self.metrics_dir.glob("*.json"):
+            try:
+                snapshot = orjson.loads(path.read_bytes())
+            except (OSError, orjson.JSONDecodeError):
+                continue
+            if live_pids is not None and path.stem not in live_pids:
+                snapshot = {
+                    name: items
+                    for name, items in snapshot.items()
+                    if not isinstance(self.registry.metrics.get(name), Gauge)
+                }
+            snapshots.append(snapshot)
+        return snapshots
+
+    def _get_live_pids(self) -> set[str] | None:
+        """
+        从sanic的工作进程管理器获取所有还在运行的工作进程的PID
+        Returns:
+            PID的集合，无法获取时返回None
+        """
+        try:
+            workers = self.app.m.workers
+        except (AttributeError, OSError, EOFError):
+            # 不是由sanic的工作进程管理器启动，或者主进程已经退出
+            return None
+
+        live_pids = {str(os.getpid())}
+        for info in workers.values():
+            if "pid" in info and info.get("state") not in _EXITED_STATES:
+                live_pids.add(str(info["pid"]))
+        return live_pids
@@ -0,0 +1,266 @@
+import math
+from bisect import bisect_left
+from collections.abc import Iterable
+
+# 默认的大小分桶，单位字节
+DEFAULT_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Counter:
+    """
+    计数器
+    """
+
+    type = "counter"
+
+    def __init__(self, name: str, doc: str, labels: tuple[str, ...]):
+        """
+        Args:
+            name: 指标名称
+            doc: 指标说明
+            labels: 标签名
+        """
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self.values: dict[tuple[str, ...], list[float]] = {}
+
+    def inc(self, label_values: tuple[str, ...], amount: float = 1):
+        """
+        增加计数
+        Args:
+            label_values: 标签值，和标签名一一对应
+            amount: 增加的数量
+
+        Returns:
+
+        """
+        value = self.values.get(label_values)
+        if value is None:
+            value = self.values[label_values] = [0]
+        value[0] += amount
+
+    def render(self, values: dict[tuple[str, ...], list[float]]) -> Iterable[str]:
+        """
+        渲染成prometheus的文本格式
+        Args:
+            values: 指标数据
+
+        Returns:
+
+        """
+        for label_values, (value,) in values.items():
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """
+    仪表盘，值可以增加也可以减少，汇总时把各个进程的值相加
+    """
+
+    type = "gauge"
+
+    def set(self, label_values: tuple[str, ...], amount: float):
+        """
+        设置数值
+        Args:
+            label_values: 标签值，和标签名一一对应
+            amount: 数值
+
+        Returns:
+
+        """
+        self.values[label_values] = [amount]
+
+    def dec(self, label_values: tuple[str, ...], amount: float = 1):
+        """
+        减少数值
+        Args:
+            label_values: 标签值，和标签名一一对应
+            amount: 减少的数量
+
+        Returns:
+
+        """
+        self.inc(label_values, -amount)
+
+
+class Histogram:
+    """
+    直方图
+    每个分桶只记录落在自己区间内的数量，渲染时再累加，记录时只需要一次二分查找
+    """
+
+    type = "histogram"
+
+    def __init__(self, name: str, doc: str, labels: tuple[str, ...], buckets: Iterable[float]):
+        """
+        Args:
+            name: 指标名称
+            doc: 指标说明
+            labels: 标签名
+            buckets: 分桶的上界，不需要包含+Inf
+        """
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self.buckets = tuple(sorted(bucket for bucket in buckets if not math.isinf(bucket)))
+        # 每组标签的值依次是各个分桶的数量、+Inf分桶的数量、总和
+        self.values: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, label_values: tuple[str, ...], amount: float):
+        """
+        记录一个观测值
+        Args:
+            label_values: 标签值，和标签名一一对应
+            amount: 观测值
+
+        Returns:
+
+        """
+        value = self.values.get(label_values)
+        if value is None:
+            value = self.values[label_values] = [0] * (len(self.buckets) + 2)
+        value[bisect_left(self.buckets, amount)] += 1
+        value[-1] += amount
+
+    def render(self, values: dict[tuple[str, ...], list[float]]) -> Iterable[str]:
+        """
+        渲染成prometheus的文本格式
+        Args:
+            values: 指标数据
+
+        Returns:
+
+        """
+        bounds = [*(_format_value(bucket) for bucket in self.buckets), "+Inf"]
+        for label_values, value in values.items():
+            count = 0
+            for bound, bucket_count in zip(bounds, value, strict=False):
+                count += bucket_count
+                labels = _format_labels((*self.labels, "le"), (*label_values, bound))
+                yield f"{self.name}_bucket{labels} {_format_value(count)}"
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {_format_value(value[-1])}"
+            yield f"{self.name}_count{labels} {_format_value(count)}"
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+    每个工作进程各自记录，通过快照在进程间汇总
+    """
+
+    def __init__(self):
+        self.metrics: dict[str, Counter | Gauge | Histogram] = {}
+
+    def counter(self, name: str, doc: str, labels: tuple[str, ...]) -> Counter:
+        """
+        注册计数器
+        Args:
+            name: 指标名称
+            doc: 指标说明
+            labels: 标签名
+
+        Returns:
+
+        """
+        metric = self.metrics[name] = Counter(name, doc, labels)
+        return metric
+
+    def gauge(self, name: str, doc: str, labels: tuple[str, ...]) -> Gauge:
+        """
+        注册仪表盘
+        Args:
+            name: 指标名称
+            doc: 指标说明
+            labels: 标签名
+
+        Returns:
+
+        """
+        metric = self.metrics[name] = Gauge(name, doc, labels)
+        return metric
+
+    def histogram(self, name: str, doc: str, labels: tuple[str, ...], buckets: Iterable[float]) -> Histogram:
+        """
+        注册直方图
+        Args:
+            name: 指标名称
+            doc: 指标说明
+            labels: 标签名
+            buckets: 分桶的上界
+
+        Returns:
+
+        """
+        metric = self.metrics[name] = Histogram(name, doc, labels, buckets)
+        return metric
+
+    def snapshot(self) -> dict[str, list]:
+        """
+        获取当前进程的指标快照，可以直接序列化成json
+        Returns:
+
+        """
+        return {
+            name: [[list(label_values), list(value)] for label_values, value in metric.values.items()]
+            for name, metric in self.metrics.items()
+        }
+
+    def render(self, snapshots: Iterable[dict[str, list]]) -> str:
+        """
+        汇总多个进程的快照并渲染成prometheus的文本格式
+        Args:
+            snapshots: 各个进程的指标快照
+
+        Returns:
+
+        """
+        merged: dict[str, dict[tuple[str, ...], list[float]]] = {name: {} for name in self.metrics}
+        for snapshot in snapshots:
+            for name, items in snapshot.items():
+                values = merged.get(name)
+                if values is None:
+                    continue
+                for label_values, value in items:
+                    label_values = tuple(label_values)
+                    total = values.get(label_values)
+                    if total is None:
+                        values[label_values] = list(value)
+                    elif len(total) == len(value):
+                        values[label_values] = [a + b for a, b in zip(total, value, strict=True)]
+
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.doc}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            lines.extend(metric.render(merged[name]))
+        lines.append("")
+        return "\n".join(lines)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    """
+    格式化标签
+    Args:
+        names: 标签名
+        values: 标签值
+
+    Returns:
+
+    """
+    if not names:
+        return ""
+    pairs = (f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True))
+    return "{" + ",".join(pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
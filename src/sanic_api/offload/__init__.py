@@ -0,0 +1,2 @@
+from sanic_api.offload.decorator import offload
+from sanic_api.offload.pool import OffloadPool, ProcessPoolService
@@ -0,0 +1,94 @@
+import importlib
+import inspect
+from functools import wraps
+
+from sanic import Request
+
+from sanic_api.offload.pool import OFFLOAD_KINDS, OffloadPool
+
+# 没有使用BaseApp时的默认池
+_default_pool: OffloadPool | None = None
+
+
+def offload(kind: str = "thread"):
+    """
+    把处理函数放到事件循环之外执行，避免CPU密集或阻塞的处理函数阻塞工作进程中的其他请求
+    处理函数可以是同步函数，也可以是协程函数（在池中使用新的事件循环运行）。
+    校验后的json_data、form_data、query_data参数和路径参数会传给处理函数，
+    进程池中执行时请求对象无法跨进程传递，处理函数不能有request参数，参数和返回值需要能被pickle，
+    并且处理函数需要定义在模块的顶层
+    Args:
+        kind: 池类型。thread: 线程池，适合阻塞IO或者会释放GIL的计算；
+            process: 进程池，适合纯python的CPU密集计算，需要设置offload.process_workers启用
+
+    Returns:
+
+    """
+    if kind not in OFFLOAD_KINDS:
+        raise ValueError(f"不支持的池类型：{kind}，可选值为 {OFFLOAD_KINDS}")
+
+    def decorator(handler):
+        signature = inspect.signature(handler)
+        params = list(signature.parameters.values())
+        pass_request = bool(params) and params[0].name == "request"
+        target = handler
+        if kind == "process":
+            if pass_request:
+                raise TypeError(f"{handler.__qualname__} 在进程池中执行时不能有request参数，请使用json_data等参数")
+            if "<locals>" in handler.__qualname__:
+                raise TypeError(f"{handler.__qualname__} 在进程池中执行时需要定义在模块的顶层")
+            target = _HandlerRef(handler.__module__, handler.__qualname__)
+
+        @wraps(handler)
+        async def wrapper(request: Request, *args, **kwargs):
+            pool = _get_pool(request)
+            if pass_request:
+                return await pool.run(kind, target, request, *args, **kwargs)
+            return await pool.run(kind, target, *args, **kwargs)
+
+        # sanic会检查处理函数的第一个参数是否存在，处理函数没有request参数时在签名上补上
+        if not pass_request:
+            request_param = inspect.Parameter("request", inspect.Parameter.POSITIONAL_OR_KEYWORD)
+            wrapper.__signature__ = signature.replace(parameters=[request_param, *params])
+        wrapper.__offload_handler__ = handler
+        return wrapper
+
+    return decorator
+
+
+class _HandlerRef:
+    """
+    处理函数的引用
+    模块中的处理函数名指向的是装饰后的函数，无法直接pickle原始函数，这里在子进程中按模块和名称重新找到原始函数
+    """
+
+    def __init__(self, module: str, qualname: str):
+        self.module = module
+        self.qualname = qualname
+
+    def __call__(self, *args, **kwargs):
+        obj = importlib.import_module(self.module)
+        for name in self.qualname.split("."):
+            obj = getattr(obj, name)
+        # 外层的装饰器使用functools.wraps时会复制__offload_handler__属性
+        handler = getattr(obj, "__offload_handler__", obj)
+        return handler(*args, **kwargs)
+
+
+def _get_pool(request: Request) -> OffloadPool:
+    """
+    获取app上设置的池，没有设置时使用进程内的默认池
+    Args:
+        request: 请求
+
+    Returns:
+
+    """
+    global _default_pool
+
+    pool = getattr(request.app.ctx, "offload_pool", None)
+    if pool is None:
+        if _default_pool is None:
+            _default_pool = OffloadPool()
+        pool = _default_pool
+    return pool
@@ -0,0 +1,352 @@
+import asyncio
+import contextlib
+import inspect
+import multiprocessing
+import multiprocessing.util
+import os
+import signal
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextvars import copy_context
+from multiprocessing.managers import BaseManager
+
+from sanic_api.api.context import RequestContext, get_request_context, reset_request_context, set_request_context
+from sanic_api.config.defaults import DEFAULT_TIME_BUCKETS
+from sanic_api.metrics.registry import MetricsRegistry
+
+# 支持的池类型
+OFFLOAD_KINDS = ("thread", "process")
+
+# 进程池服务的地址，由主进程启动服务后通过环境变量传给工作进程
+OFFLOAD_ADDRESS_ENV = "SANIC_API_OFFLOAD_ADDRESS"
+
+
+class OffloadPool:
+    """
+    工作进程内的线程池和进程池，用于把CPU密集或阻塞的处理函数放到事件循环之外执行
+    池在第一次使用时创建，服务停止时关闭。
+    sanic的工作进程是守护进程，不能创建子进程，所以进程池由主进程中启动的ProcessPoolService持有，所有工作进程共享；
+    没有进程池服务时，只有当前进程不是守护进程（例如单进程模式）才会在本进程中创建进程池
+    """
+
+    def __init__(
+        self,
+        *,
+        process_workers: int = 1,
+        thread_workers: int | None = None,
+        registry: MetricsRegistry | None = None,
+        address: str | None = None,
+    ):
+        """
+        Args:
+            process_workers: 进程池的进程数，使用进程池服务时是同时提交到服务中的最大任务数
+            thread_workers: 每个工作进程中线程池的线程数，为空时使用标准库的默认值
+            registry: 指标注册表，存在时记录池的排队情况
+            address: 进程池服务的地址，为空时使用环境变量中的地址
+        """
+        self.process_workers = process_workers
+        self.thread_workers = thread_workers
+        self.address = address
+        self._executors: dict[str, Executor] = {}
+        self._lock = threading.Lock()
+
+        self.inflight = self.wait_time = self.run_time = None
+        if registry is not None:
+            self.inflight = registry.gauge(
+                "sanic_api_offload_inflight",
+                "已提交到池中还未完成的任务数，超出池大小的部分在排队",
+                ("kind",),
+            )
+            self.wait_time = registry.histogram(
+                "sanic_api_offload_wait_seconds",
+                "任务在池中排队等待的时间",
+                ("kind",),
+                DEFAULT_TIME_BUCKETS,
+            )
+            self.run_time = registry.histogram(
+                "sanic_api_offload_run_seconds",
+                "任务在池中的执行时间",
+                ("kind",),
+                DEFAULT_TIME_BUCKETS,
+            )
+
+    def start(self):
+        """
+        预先创建线程池和进程池
+        Returns:
+
+        """
+        for kind in OFFLOAD_KINDS:
+            self.get_executor(kind)
+
+    def shutdown(self, wait: bool = True):
+        """
+        关闭所有的池
+        Args:
+            wait: 是否等待正在执行的任务完成
+
+        Returns:
+
+        """
+        with self._lock:
+            executors, self._executors = self._executors, {}
+        for executor in executors.values():
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def get_executor(self, kind: str) -> Executor:
+        """
+        获取池，没有时创建
+        Args:
+            kind: 池类型，thread或process
+
+        Returns:
+
+        """
+        executor = self._executors.get(kind)
+        if executor is not None:
+            return executor
+
+        with self._lock:
+            executor = self._executors.get(kind)
+            if executor is None:
+                executor = self._executors[kind] = self._create_executor(kind)
+        return executor
+
+    async def run(self, kind: str, func: Callable, *args, **kwargs):
+        """
+        在池中执行函数，协程函数会在池中使用新的事件循环运行
+        进程池中执行时函数、参数和返回值都需要能被pickle。
+        线程池中执行时复制当前的上下文，进程池中执行时传递请求上下文的副本，函数中的日志同样带有请求ID
+        Args:
+            kind: 池类型，thread或process
+            func: 执行的函数
+            *args: 位置参数
+            **kwargs: 关键字参数
+
+        Returns:
+            函数的返回值
+        """
+        executor = self.get_executor(kind)
+        labels = (kind,)
+        if self.inflight is not None:
+            self.inflight.inc(labels)
+        submit_time = time.time()
+        try:
+            if kind == "thread":
+                future = executor.submit(copy_context().run, _call, func, args, kwargs)
+            else:
+                future = executor.submit(_call, func, args, kwargs, get_request_context())
+            start_time, end_time, result = await asyncio.wrap_future(future)
+        finally:
+            if self.inflight is not None:
+                self.inflight.dec(labels)
+
+        if self.wait_time is not None:
+            self.wait_time.observe(labels, max(start_time - submit_time, 0))
+            self.run_time.observe(labels, end_time - start_time)
+        return result
+
+    def _create_executor(self, kind: str) -> Executor:
+        """
+        创建池
+        Args:
+            kind: 池类型，thread或process
+
+        Returns:
+
+        """
+        if kind == "thread":
+            return ThreadPoolExecutor(self.thread_workers, thread_name_prefix="sanic_api_offload")
+        if kind != "process":
+            raise ValueError(f"不支持的池类型：{kind}，可选值为 {OFFLOAD_KINDS}")
+
+        if not self.process_workers:
+            raise RuntimeError("没有启用进程池，请设置offload.process_workers")
+        address = self.address or os.environ.get(OFFLOAD_ADDRESS_ENV)
+        if address:
+            return _ServiceExecutor(address, self.process_workers)
+        if multiprocessing.current_process().daemon:
+            raise RuntimeError("守护进程中不能创建进程池，请设置offload.process_workers在主进程中启动进程池服务")
+        return _create_process_executor(self.process_workers)
+
+
+class ProcessPoolService:
+    """
+    进程池服务，在主进程中启动
+    服务进程由主进程创建，不是守护进程，可以创建进程池；地址通过环境变量传给之后启动的工作进程，所有工作进程共享一个进程池。
+    工作进程和主进程使用相同的authkey，连接服务时不需要额外的认证配置
+    """
+
+    def __init__(self, workers: int = 1):
+        """
+        Args:
+            workers: 进程池的进程数，进程在第一次提交任务时创建
+        """
+        self.workers = workers
+        self.address: str | None = None
+        self._manager: _ServiceManager | None = None
+
+    def start(self):
+        """
+        启动服务进程，并把地址设置到环境变量中
+        Returns:
+
+        """
+        manager = _ServiceManager(ctx=multiprocessing.get_context("spawn"))
+        manager.start(_init_service, (self.workers,))
+        self._manager = manager
+        self.address = manager.address
+        os.environ[OFFLOAD_ADDRESS_ENV] = manager.address
+
+    def stop(self):
+        """
+        关闭进程池并停止服务进程
+        Returns:
+
+        """
+        manager, self._manager = self._manager, None
+        if manager is None:
+            return
+        if os.environ.get(OFFLOAD_ADDRESS_ENV) == self.address:
+            os.environ.pop(OFFLOAD_ADDRESS_ENV)
+        with contextlib.suppress(OSError, EOFError):
+            manager.get_pool().shutdown()
+        manager.shutdown()
+
+
+class _ServiceManager(BaseManager):
+    """
+    进程池服务的管理器，服务进程和工作进程中都使用它
+    """
+
+
+class _ServicePool:
+    """
+    服务进程中的进程池，每个连接在服务进程中有单独的线程，线程中同步等待任务的结果
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, args: tuple, kwargs: dict):
+        with self._lock:
+            if self._executor is None:
+                self._executor = _create_process_executor(self.workers)
+            executor = self._executor
+        return executor.submit(fn, *args, **kwargs).result()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 服务进程中的进程池
+_service_pool: _ServicePool | None = None
+
+
+def _init_service(workers: int):
+    global _service_pool
+    _service_pool = _ServicePool(workers)
+
+
+def _get_service_pool() -> _ServicePool:
+    return _service_pool
+
+
+_ServiceManager.register("get_pool", callable=_get_service_pool)
+
+
+class _ServiceExecutor(Executor):
+    """
+    把任务提交到进程池服务，每个任务占用一个转发线程等待服务返回结果
+    代理对象在每个线程中使用单独的连接，可以在多个线程中同时调用
+    """
+
+    def __init__(self, address: str, max_workers: int):
+        manager = _ServiceManager(address=address, authkey=multiprocessing.current_process().authkey)
+        manager.connect()
+        self._pool = manager.get_pool()
+        self._threads = ThreadPoolExecutor(max_workers, thread_name_prefix="sanic_api_offload_process")
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> Future:
+        return self._threads.submit(self._pool.submit, fn, args, kwargs)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        self._threads.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+def _create_process_executor(workers: int) -> ProcessPoolExecutor:
+    """
+    创建进程池，使用spawn方式创建子进程，子进程在父进程退出时跟随退出
+    Args:
+        workers: 进程数
+
+    Returns:
+
+    """
+    executor = ProcessPoolExecutor(
+        workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_process,
+    )
+    # 进程异常退出时multiprocessing会先等待所有非守护的子进程退出，这时进程池还没有通知子进程退出会互相等待，
+    # 这里注册一个优先执行的清理函数先关闭进程池
+    multiprocessing.util.Finalize(executor, executor.shutdown, kwargs={"cancel_futures": True}, exitpriority=100)
+    return executor
+
+
+def _call(
+    func: Callable,
+    args: tuple,
+    kwargs: dict,
+    request_context: RequestContext | None = None,
+) -> tuple[float, float, object]:
+    """
+    在池中执行函数，同时返回开始和结束的时间用于统计排队和执行耗时
+    Args:
+        func: 执行的函数
+        args: 位置参数
+        kwargs: 关键字参数
+        request_context: 进程池中执行时传入的请求上下文
+
+    Returns:
+        (开始时间, 结束时间, 返回值)
+    """
+    start_time = time.time()
+    token = set_request_context(request_context) if request_context else None
+    try:
+        result = func(*args, **kwargs)
+        if inspect.isawaitable(result):
+            result = asyncio.run(_await(result))
+    finally:
+        if token is not None:
+            reset_request_context(token)
+    return start_time, time.time(), result
+
+
+async def _await(awaitable):
+    return await awaitable
+
+
+def _init_process():
+    """
+    进程池子进程的初始化函数
+    忽略Ctrl+C，由工作进程在服务停止时关闭；父进程退出时跟随退出，避免工作进程被强制结束后留下孤儿进程
+    Returns:
+
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    parent = multiprocessing.parent_process()
+    if parent is not None:
+        threading.Thread(target=_exit_with_parent, args=(parent,), daemon=True).start()
+
+
+def _exit_with_parent(parent: multiprocessing.process.BaseProcess):
+    parent.join()
+    os._exit(0)
@@ -0,0 +1,2 @@
+from sanic_api.openapi.builder import build_spec
+from sanic_api.openapi.extension import OpenAPIDocs, SpecBlob
@@ -0,0 +1,270 @@
+import inspect
+import re
+from datetime import date
+from typing import Annotated, Any, get_args, get_origin
+from uuid import UUID
+
+from pydantic import BaseModel
+from pydantic.json_schema import JsonSchemaMode, models_json_schema
+from sanic import Sanic
+from sanic_ext.extensions.openapi.builders import OperationBuilder, OperationStore
+from sanic_routing import Route
+
+from sanic_api.api.binding import BindingPlan
+from sanic_api.api.response import BaseResp, BaseRespTml
+from sanic_api.utils.route import match_route
+
+# 组件的引用模板
+REF_TEMPLATE = "#/components/schemas/{model}"
+
+# 不生成文档的请求方法
+IGNORE_METHODS = frozenset(("HEAD", "OPTIONS", "TRACE"))
+
+# 路径参数的类型对应的json schema
+_PARAM_SCHEMAS: dict[type, dict[str, str]] = {
+    int: {"type": "integer"},
+    float: {"type": "number"},
+    UUID: {"type": "string", "format": "uuid"},
+    date: {"type": "string", "format": "date"},
+}
+
+# 路径中的参数，例如 <user_id:int>
+_PATH_PARAM_RE = re.compile(r"<([^:>]+)(?::[^>]*)?>")
+
+
+def build_spec(
+    app: Sanic,
+    *,
+    title: str,
+    version: str,
+    description: str | None = None,
+    ignore_routes: list[str] | None = None,
+) -> dict[str, Any]:
+    """
+    根据路由生成openapi文档
+    请求参数取自处理函数的json_data、form_data、query_data、files_data参数或者自定义请求类上的注解，
+    响应取自处理函数返回值注解上的BaseResp、BaseRespTml子类，也可以使用 Annotated[HTTPResponse, 响应类] 注解。
+    所有模型的schema一次生成，放到components中。
+    处理函数上sanic_ext的openapi装饰器（例如 @openapi.summary、@openapi.exclude）声明的内容优先于自动生成的内容
+    Args:
+        app: Sanic App，路由需要已经设置好
+        title: 文档标题
+        version: 接口版本
+        description: 文档描述
+        ignore_routes: 不生成文档的路由，支持路由名称或路径的通配符
+
+    Returns:
+        openapi文档，可以直接序列化成json
+    """
+    ignore_routes = ignore_routes or []
+    docs_prefix = f"{app.name}.openapi."
+    routes = [
+        route
+        for route in app.router.routes
+        if not (route.name or "").startswith(docs_prefix) and not match_route(route, ignore_routes)
+    ]
+    routes.sort(key=lambda r: r.path)
+    # 使用 @openapi.exclude 的路由不生成文档
+    declared_routes = [(route, _get_declared_operation(route)) for route in routes]
+    declared_routes = [(route, declared) for route, declared in declared_routes if not (declared and declared._exclude)]
+
+    # 先收集所有用到的模型，再一次生成它们的schema，相同的模型只生成一次
+    route_models = [(route, declared, *_get_route_models(route)) for route, declared in declared_routes]
+    model_keys: dict[tuple[type[BaseModel], JsonSchemaMode], None] = {}
+    for _route, _declared, plan, resp_model in route_models:
+        models = (plan.json_data_type, plan.form_data_type, plan.query_data_type, plan.files_data_type)
+        for model in (*models, plan.stream_data_type):
+            if model is not None:
+                model_keys[(model, "validation")] = None
+        if resp_model is not None:
+            model_keys[(resp_model, "serialization")] = None
+
+    refs, schemas = {}, {}
+    if model_keys:
+        refs, top_schema = models_json_schema(list(model_keys), ref_template=REF_TEMPLATE)
+        schemas = top_schema.get("$defs", {})
+
+    paths: dict[str, dict[str, Any]] = {}
+    for route, declared, plan, resp_model in route_models:
+        path_item = paths.setdefault(_get_path(route), {})
+        operation = _build_operation(route, plan, resp_model, refs, schemas)
+        if declared is not None:
+            _merge_declared_operation(operation, declared)
+        operation_id = operation.pop("operationId", None)
+        for method in sorted(route.methods - IGNORE_METHODS):
+            path_item[method.lower()] = {**operation, "operationId": operation_id or f"{method.lower()}~{route.name}"}
+
+    info = {"title": title, "version": version}
+    if description:
+        info["description"] = description
+    spec = {"openapi": "3.1.0", "info": info, "paths": {path: item for path, item in paths.items() if item}}
+    if schemas:
+        spec["components"] = {"schemas": schemas}
+    return spec
+
+
+def _get_route_models(route: Route) -> tuple[BindingPlan, type[BaseModel] | None]:
+    """
+    获取路由的绑定计划和响应模型
+    Args:
+        route: 路由
+
+    Returns:
+        (绑定计划, 响应模型)
+    """
+    plan = BindingPlan.get(route)
+    handler = inspect.unwrap(route.handler)
+    resp_type = inspect.getfullargspec(handler).annotations.get("return")
+    # 处理函数实际返回的是HTTPResponse，可以使用 Annotated[HTTPResponse, 响应类] 注解响应类
+    candidates = get_args(resp_type)[1:] if get_origin(resp_type) is Annotated else (resp_type,)
+    for candidate in candidates:
+        if not inspect.isclass(candidate):
+            continue
+        if issubclass(candidate, BaseRespTml):
+            return plan, candidate._tml_model or candidate
+        if issubclass(candidate, BaseResp):
+            return plan, candidate
+    return plan, None
+
+
+def _get_declared_operation(route: Route) -> OperationBuilder | None:
+    """
+    获取处理函数上sanic_ext的openapi装饰器声明的操作，处理函数被其他装饰器包装时沿着__wrapped__查找
+    Args:
+        route: 路由
+
+    Returns:
+        没有使用装饰器时返回None
+    """
+    store = OperationStore()
+    handler = route.handler
+    while handler is not None:
+        if handler in store:
+            return store[handler]
+        handler = getattr(handler, "__wrapped__", None)
+    return None
+
+
+def _merge_declared_operation(operation: dict[str, Any], builder: OperationBuilder):
+    """
+    把sanic_ext的openapi装饰器声明的内容合并到自动生成的操作对象中，声明的内容优先。
+    参数按名称和位置覆盖，响应按状态码覆盖
+    Args:
+        operation: 自动生成的操作对象
+        builder: 装饰器声明的操作
+
+    Returns:
+
+    """
+    declared = builder.build().serialize()
+    parameters = declared.pop("parameters", [])
+    # 没有声明响应时sanic_ext会补上一个默认的响应，这里忽略它
+    responses = declared.pop("responses", {}) if builder.responses else {}
+    operation.update(declared)
+
+    if parameters:
+        keys = {(param["name"], param["in"]) for param in parameters}
+        others = [param for param in operation.get("parameters", []) if (param["name"], param["in"]) not in keys]
+        operation["parameters"] = others + parameters
+    if responses:
+        operation["responses"] = {**operation["responses"], **{str(status): r for status, r in responses.items()}}
+
+
+def _get_path(route: Route) -> str:
+    """
+    把路由的路径转换成openapi的路径格式，例如 /user/<user_id:int> 转换成 /user/{user_id}
+    Args:
+        route: 路由
+
+    Returns:
+
+    """
+    return "/" + _PATH_PARAM_RE.sub(r"{\1}", route.path.lstrip("/"))
+
+
+def _build_operation(
+    route: Route,
+    plan: BindingPlan,
+    resp_model: type[BaseModel] | None,
+    refs: dict,
+    schemas: dict[str, dict],
+) -> dict[str, Any]:
+    """
+    生成路由的操作对象，多个请求方法共用
+    Args:
+        route: 路由
+        plan: 绑定计划
+        resp_model: 响应模型
+        refs: 模型对应的引用
+        schemas: 所有模型的schema
+
+    Returns:
+
+    """
+    operation: dict[str, Any] = {}
+
+    # 蓝图的路由名称是 app.蓝图.处理函数，使用蓝图名称作为标签
+    name_parts = (route.name or "").split(".")
+    if len(name_parts) > 2:
+        operation["tags"] = [name_parts[1]]
+
+    docstring = inspect.getdoc(inspect.unwrap(route.handler))
+    if docstring:
+        summary, _, desc = docstring.partition("\n")
+        operation["summary"] = summary.strip()
+        if desc.strip():
+            operation["description"] = desc.strip()
+    else:
+        operation["summary"] = name_parts[-1]
+
+    parameters = []
+    for param in route.defined_params.values():
+        schema = _PARAM_SCHEMAS.get(param.cast, {"type": "string"})
+        parameters.append({"name": param.name, "in": "path", "required": True, "schema": schema})
+    if plan.query_data_type is not None:
+        parameters.extend(_get_query_params(refs[(plan.query_data_type, "validation")], schemas))
+    if parameters:
+        operation["parameters"] = parameters
+
+    content = {}
+    if plan.json_data_type is not None:
+        content["application/json"] = {"schema": refs[(plan.json_data_type, "validation")]}
+    if plan.form_data_type is not None:
+        schema = refs[(plan.form_data_type, "validation")]
+        content["application/x-www-form-urlencoded"] = {"schema": schema}
+        content["multipart/form-data"] = {"schema": schema}
+    if plan.files_data_type is not None:
+        content["multipart/form-data"] = {"schema": refs[(plan.files_data_type, "validation")]}
+    if plan.stream_data_type is not None:
+        item_schema = refs[(plan.stream_data_type, "validation")]
+        content["application/x-ndjson"] = {"schema": item_schema}
+        content.setdefault("application/json", {"schema": {"type": "array", "items": item_schema}})
+    if content:
+        operation["requestBody"] = {"required": True, "content": content}
+
+    response = {"description": "成功"}
+    if resp_model is not None:
+        response["content"] = {"application/json": {"schema": refs[(resp_model, "serialization")]}}
+    operation["responses"] = {"200": response}
+    return operation
+
+
+def _get_query_params(ref: dict[str, str], schemas: dict[str, dict]) -> list[dict[str, Any]]:
+    """
+    把查询参数模型的字段展开成openapi的查询参数
+    Args:
+        ref: 查询参数模型的引用
+        schemas: 所有模型的schema
+
+    Returns:
+
+    """
+    schema = schemas.get(ref["$ref"].rsplit("/", 1)[-1], {})
+    required = set(schema.get("required", ()))
+    params = []
+    for name, prop in schema.get("properties", {}).items():
+        param = {"name": name, "in": "query", "required": name in required, "schema": prop}
+        if prop.get("description") or prop.get("title"):
+            param["description"] = prop.get("description") or prop.get("title")
+        params.append(param)
+    return params
@@ -1,41 +1,264 @@
-from typing import TYPE_CHECKING
+import asyncio
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any
 
-from sanic import Blueprint
-from sanic_ext.extensions.openapi.blueprint import blueprint_factory
-from sanic_ext.extensions.openapi.builders import SpecificationBuilder
-from sanic_ext.extensions.openapi.extension import OpenAPIExtension as BaseExtension
+import orjson
+import sanic_ext
+from sanic import Blueprint, HTTPResponse, Request, Sanic
+from sanic.log import logger
+from sanic.response import html, json
 
-if TYPE_CHECKING:
-    from sanic_ext import Extend
+from sanic_api.api.etag import etag_matches, make_etag, not_modified
+from sanic_api.api.response import JSON_CONTENT_TYPE
+from sanic_api.compress.compressor import brotli, compress_body, select_encoding
+from sanic_api.openapi.builder import build_spec
 
+# 工作进程共享的文档目录，由主进程创建后通过环境变量传给工作进程，第一个生成文档的工作进程写入，其他工作进程读取
+OPENAPI_DIR_ENV = "SANIC_API_OPENAPI_DIR"
 
-class OpenAPIExtension(BaseExtension):
-    name = "openapi"
-    bp: Blueprint
+# 文档文件名
+SPEC_FILE_NAME = "openapi.json"
 
-    def startup(self, bootstrap: Extend) -> None:
-        if self.app.config.OAS:
-            self.bp = blueprint_factory(self.app.config)
-            self.app.blueprint(self.bp)
-            bootstrap._openapi = SpecificationBuilder()
+# 预先压缩的算法及压缩级别
+SPEC_ENCODINGS = {"gzip": 9, "br": 11}
 
+# sanic_ext自带的文档页面模板所在的目录
+UI_DIR = Path(sanic_ext.__file__).parent / "extensions" / "openapi" / "ui"
 
-"""
-import inspect
-import ast
+# swagger ui的版本，需要支持openapi 3.1
+SWAGGER_UI_VERSION = "5.17.14"
 
-def build_spec(app, loop):
-    ...
+# swagger ui的配置
+SWAGGER_UI_CONFIGURATION = {"apisSorter": "alpha", "operationsSorter": "alpha", "docExpansion": "list"}
 
-source_code = inspect.getsource(blueprint_factory)
-ast_tree = ast.parse(source_code)
 
-my_source_code = inspect.getsource(build_spec)
-my_func_ast = ast.parse(my_source_code)
+class SpecBlob:
+    """
+    序列化好的文档，以及它的ETag和预先压缩的字节
+    """
 
-ast_tree.body[0].body[6] = my_func_ast
-modified_code = compile(ast_tree, filename="<ast>", mode="exec")
+    __slots__ = ("body", "encoded", "etag")
 
+    def __init__(self, body: bytes, encoded: dict[str, bytes] | None = None):
+        """
+        Args:
+            body: json字节
+            encoded: 压缩算法对应的压缩后的字节，为空时立即压缩
+        """
+        self.body = body
+        self.etag = make_etag(body)
+        if encoded is None:
+            encoded = {
+                encoding: compress_body(body, encoding, level)
+                for encoding, level in SPEC_ENCODINGS.items()
+                if encoding != "br" or brotli is not None
+            }
+        self.encoded = encoded
 
+    def dump(self, path: Path):
+        """
+        把json字节和压缩后的字节写入目录。
+        每个文件先写入临时文件再替换，json文件最后写入，读取时json文件存在说明压缩后的文件已经写好
+        Args:
+            path: 目录
 
-"""
+        Returns:
+
+        """
+        files = {f"{SPEC_FILE_NAME}.{encoding}": body for encoding, body in self.encoded.items()}
+        files[SPEC_FILE_NAME] = self.body
+        for name, body in files.items():
+            fd, tmp_path = tempfile.mkstemp(dir=path, prefix=f".{name}.")
+            with os.fdopen(fd, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, path / name)
+
+    @classmethod
+    def load(cls, path: Path) -> "SpecBlob":
+        """
+        从目录中读取文档
+        Args:
+            path: 目录
+
+        Returns:
+
+        """
+        encoded = {}
+        for encoding in SPEC_ENCODINGS:
+            encoded_path = path / f"{SPEC_FILE_NAME}.{encoding}"
+            if encoded_path.exists():
+                encoded[encoding] = encoded_path.read_bytes()
+        return cls((path / SPEC_FILE_NAME).read_bytes(), encoded)
+
+
+class OpenAPIDocs:
+    """
+    openapi文档
+    替代sanic_ext在每个工作进程启动时生成文档：第一次请求文档时根据工作进程注册好的路由生成，序列化并压缩后写入共享目录，
+    其他工作进程直接读取字节，之后的请求从内存返回，支持ETag和预先压缩的gzip、br。
+    处理函数上sanic_ext的openapi装饰器声明的内容会合并到文档中
+    """
+
+    def __init__(
+        self,
+        app: Sanic,
+        *,
+        title: str,
+        version: str = "1.0.0",
+        description: str | None = None,
+        url_prefix: str = "/docs",
+        ignore_routes: list[str] | None = None,
+        share: bool = True,
+    ):
+        """
+        Args:
+            app: Sanic App
+            title: 文档标题
+            version: 接口版本
+            description: 文档描述
+            url_prefix: 文档路由的前缀
+            ignore_routes: 不生成文档的路由，支持路由名称或路径的通配符
+            share: 是否在工作进程之间共享生成的文档，路由会变化时（例如开启自动重载）应该关闭
+        """
+        self.app = app
+        self.title = title
+        self.version = version
+        self.description = description
+        self.url_prefix = "/" + url_prefix.strip("/")
+        self.ignore_routes = ignore_routes or []
+        self.share = share
+        self.blob: SpecBlob | None = None
+        self._created_dir = False
+        self._lock: asyncio.Lock | None = None
+
+    def setup(self):
+        """
+        关闭sanic_ext的文档，注册文档路由和共享目录的监听器
+        Returns:
+
+        """
+        self.app.config.OAS = False
+
+        bp = Blueprint("openapi", url_prefix=self.url_prefix)
+        for ui in ("swagger", "redoc"):
+            page = (UI_DIR / f"{ui}.html").read_text(encoding="utf-8")
+            page = (
+                page.replace("__VERSION__", SWAGGER_UI_VERSION)
+                .replace("__URL_PREFIX__", self.url_prefix)
+                .replace("__HTML_TITLE__", self.title)
+                .replace("__HTML_CUSTOM_CSS__", "")
+            )
+            bp.add_route(self._make_page_handler(page), ui, name=ui, methods=["GET"])
+            if ui == "swagger":
+                bp.add_route(self._make_page_handler(page), "", name="index", methods=["GET"], strict_slashes=False)
+        bp.add_route(self._handle_config, "swagger-config", name="config", methods=["GET"])
+        bp.add_route(self._handle_spec, SPEC_FILE_NAME, name="spec", methods=["GET"])
+        self.app.blueprint(bp)
+
+        self.app.main_process_start(self._main_process_start)
+        self.app.main_process_stop(self._main_process_stop)
+
+    def build(self) -> dict[str, Any]:
+        """
+        根据当前注册的路由生成文档
+        Returns:
+
+        """
+        return build_spec(
+            self.app,
+            title=self.title,
+            version=self.version,
+            description=self.description,
+            ignore_routes=self.ignore_routes,
+        )
+
+    async def get_blob(self) -> SpecBlob:
+        """
+        获取文档，第一次调用时优先读取其他工作进程写入共享目录的文档，没有时生成并写入共享目录
+        Returns:
+
+        """
+        if self.blob is not None:
+            return self.blob
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.blob is None:
+                self.blob = await self._load_or_build()
+        return self.blob
+
+    async def _load_or_build(self) -> SpecBlob:
+        loop = asyncio.get_running_loop()
+        spec_dir = os.environ.get(OPENAPI_DIR_ENV) if self.share else None
+        if spec_dir and (Path(spec_dir) / SPEC_FILE_NAME).exists():
+            try:
+                return await loop.run_in_executor(None, SpecBlob.load, Path(spec_dir))
+            except OSError as e:
+                logger.warning(f"读取openapi文档失败，重新生成: {e}")
+
+        # 压缩比较耗时，放到线程池中
+        blob = await loop.run_in_executor(None, SpecBlob, orjson.dumps(self.build()))
+        if spec_dir:
+            try:
+                await loop.run_in_executor(None, blob.dump, Path(spec_dir))
+            except OSError as e:
+                logger.warning(f"写入openapi文档失败: {e}")
+        return blob
+
+    async def _main_process_start(self, _app: Sanic):
+        """
+        主进程中创建共享目录，文档由工作进程生成
+        Args:
+            _app: Sanic App
+
+        Returns:
+
+        """
+        if not self.share or os.environ.get(OPENAPI_DIR_ENV):
+            return
+        os.environ[OPENAPI_DIR_ENV] = tempfile.mkdtemp(prefix="sanic_api_openapi_")
+        self._created_dir = True
+
+    async def _main_process_stop(self, _app: Sanic):
+        if self._created_dir:
+            shutil.rmtree(os.environ.pop(OPENAPI_DIR_ENV), ignore_errors=True)
+            self._created_dir = False
+
+    async def _handle_spec(self, request: Request) -> HTTPResponse:
+        """
+        文档路由，返回内存中的字节
+        Args:
+            request: 请求
+
+        Returns:
+
+        """
+        blob = await self.get_blob()
+
+        headers = {"cache-control": "no-cache", "vary": "Accept-Encoding"}
+        encoding = select_encoding(request.headers.get("accept-encoding", ""))
+        body = blob.encoded.get(encoding)
+        # 压缩后的字节和原始的不同，使用弱ETag
+        etag = blob.etag if body is None else f"W/{blob.etag}"
+        if etag_matches(request, etag):
+            return not_modified(etag, headers)
+
+        if body is None:
+            body = blob.body
+        else:
+            headers["content-encoding"] = encoding
+        headers["etag"] = etag
+        return HTTPResponse(body, headers=headers, content_type=JSON_CONTENT_TYPE)
+
+    async def _handle_config(self, _request: Request) -> HTTPResponse:
+        return json(SWAGGER_UI_CONFIGURATION)
+
+    @staticmethod
+    def _make_page_handler(page: str):
+        async def _handle_page(_request: Request) -> HTTPResponse:
+            return html(page)
+
+        return _handle_page
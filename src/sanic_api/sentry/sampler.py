@@ -0,0 +1,167 @@
+import time
+from typing import Any
+
+from sanic import NotFound, Request, Sanic
+from sanic.response import BaseHTTPResponse
+from sanic_routing import Route
+
+from sanic_api.utils.route import match_route
+
+
+class TracesSampler:
+    """
+    按路由决定链路追踪的采样率
+    忽略的路由不采样；配置了采样率的路由使用自己的采样率；
+    最近出现过慢请求或错误的路由在一段时间内提升采样率
+    """
+
+    def __init__(
+        self,
+        app: Sanic,
+        *,
+        sample_rate: float = 0.1,
+        ignore_routes: list[str] | None = None,
+        route_sample_rates: dict[str, float] | None = None,
+        slow_threshold: float | None = None,
+        boost_sample_rate: float = 1.0,
+        boost_seconds: float = 60,
+    ):
+        """
+        Args:
+            app: Sanic App
+            sample_rate: 默认的采样率
+            ignore_routes: 不采样的路由，支持路由名称或路径的通配符
+            route_sample_rates: 路由的采样率，键支持路由名称或路径的通配符
+            slow_threshold: 慢请求的阈值，单位秒，为空时不根据耗时提升采样率
+            boost_sample_rate: 出现慢请求或错误后提升到的采样率
+            boost_seconds: 提升采样率的持续时间，单位秒
+        """
+        self.app = app
+        self.sample_rate = sample_rate
+        self.ignore_routes = ignore_routes or []
+        self.route_sample_rates = route_sample_rates or {}
+        self.slow_threshold = slow_threshold
+        self.boost_sample_rate = boost_sample_rate
+        self.boost_seconds = boost_seconds
+
+    def setup(self):
+        """
+        注册记录请求耗时和状态的信号，用来发现慢请求和错误
+        Returns:
+
+        """
+        self.app.signal("http.lifecycle.request")(self._on_request)
+        self.app.signal("http.lifecycle.response")(self._on_response)
+
+    def reload(
+        self,
+        *,
+        sample_rate: float,
+        ignore_routes: list[str],
+        route_sample_rates: dict[str, float],
+        slow_threshold: float | None,
+        boost_sample_rate: float,
+        boost_seconds: float,
+    ):
+        """
+        热加载采样配置，清除路由上缓存的采样率
+        Args:
+            sample_rate: 默认的采样率
+            ignore_routes: 不采样的路由
+            route_sample_rates: 路由的采样率
+            slow_threshold: 慢请求的阈值，单位秒
+            boost_sample_rate: 出现慢请求或错误后提升到的采样率
+            boost_seconds: 提升采样率的持续时间，单位秒
+
+        Returns:
+
+        """
+        self.sample_rate = sample_rate
+        self.ignore_routes = ignore_routes
+        self.route_sample_rates = route_sample_rates
+        self.slow_threshold = slow_threshold
+        self.boost_sample_rate = boost_sample_rate
+        self.boost_seconds = boost_seconds
+        for route in self.app.router.routes:
+            vars(route.ctx).pop("sentry_sample_rate", None)
+
+    def __call__(self, sampling_context: dict[str, Any]) -> float:
+        """
+        sentry的traces_sampler入口
+        Args:
+            sampling_context: 采样上下文
+
+        Returns:
+            采样率
+        """
+        route = self._get_route(Request._current.get(None))
+        rate = self._get_route_rate(route) if route else self.sample_rate
+        if rate is None:
+            return 0
+
+        # 上游服务已经做出了采样决定的则沿用
+        parent_sampled = sampling_context.get("parent_sampled")
+        if parent_sampled is not None:
+            return float(parent_sampled)
+
+        if route is not None and getattr(route.ctx, "sentry_boost_until", 0) > time.monotonic():
+            return max(rate, self.boost_sample_rate)
+        return rate
+
+    def _get_route(self, request: Request | None) -> Route | None:
+        """
+        获取请求对应的路由。采样发生在路由之前，这里借助路由器的缓存提前查找
+        Args:
+            request: 请求
+
+        Returns:
+
+        """
+        if request is None:
+            return None
+        if request.route:
+            return request.route
+        try:
+            route, _, _ = self.app.router.get(request.path, request.method, request.headers.getone("host", None))
+        except NotFound:
+            return None
+        return route
+
+    def _get_route_rate(self, route: Route) -> float | None:
+        """
+        获取路由的采样率，结果缓存在路由的ctx上
+        Args:
+            route: 路由
+
+        Returns:
+            采样率，忽略的路由返回None
+        """
+        try:
+            return route.ctx.sentry_sample_rate
+        except AttributeError:
+            pass
+
+        rate = self.sample_rate
+        if match_route(route, self.ignore_routes):
+            rate = None
+        else:
+            for pattern, pattern_rate in self.route_sample_rates.items():
+                if match_route(route, [pattern]):
+                    rate = pattern_rate
+                    break
+        route.ctx.sentry_sample_rate = rate
+        return rate
+
+    async def _on_request(self, request: Request):
+        request.ctx.sentry_start_time = time.monotonic()
+
+    async def _on_response(self, request: Request, response: BaseHTTPResponse):
+        route = request.route
+        start_time = getattr(request.ctx, "sentry_start_time", None)
+        if route is None or start_time is None:
+            return
+
+        now = time.monotonic()
+        is_slow = self.slow_threshold is not None and now - start_time > self.slow_threshold
+        if is_slow or response.status >= 500:
+            route.ctx.sentry_boost_until = now + self.boost_seconds
@@ -0,0 +1,54 @@
+import math
+import os
+from pathlib import Path
+
+# cgroup v2 的CPU限制文件
+CGROUP_V2_CPU_MAX = Path("/sys/fs/cgroup/cpu.max")
+
+# cgroup v1 的CPU限制文件
+CGROUP_V1_CPU_QUOTA = Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+CGROUP_V1_CPU_PERIOD = Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+
+
+def get_cpu_count() -> int:
+    """
+    获取当前进程实际可用的CPU数量
+    在容器中os.cpu_count获取的是宿主机的CPU数量，这里同时考虑CPU亲和性和cgroup的CPU配额，取其中最小的
+    Returns:
+
+    """
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        count = os.cpu_count() or 1
+
+    quota = get_cgroup_cpu_quota()
+    if quota is not None:
+        count = min(count, math.ceil(quota))
+    return max(count, 1)
+
+
+def get_cgroup_cpu_quota() -> float | None:
+    """
+    获取cgroup限制的CPU配额，即配额除以周期
+    Returns:
+        CPU配额，没有限制时返回None
+    """
+    try:
+        # cgroup v2: "max 100000" 或者 "200000 100000"
+        quota, period = CGROUP_V2_CPU_MAX.read_text().split()
+        if quota == "max":
+            return None
+        return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+
+    try:
+        # cgroup v1: 配额为-1时表示不限制
+        quota = int(CGROUP_V1_CPU_QUOTA.read_text())
+        period = int(CGROUP_V1_CPU_PERIOD.read_text())
+    except (OSError, ValueError):
+        return None
+    if quota <= 0 or period <= 0:
+        return None
+    return quota / period
@@ -1,6 +1,6 @@
 import json
 from dataclasses import dataclass, field
-from enum import Enum, auto
+from enum import Enum, EnumMeta, auto
 from types import DynamicClassAttribute
 from typing import Any
 
@@ -15,15 +15,51 @@ class EnumField:
     desc: str = field(default_factory=str)
 
 
-class EnumBase(Enum):
+class EnumBaseMeta(EnumMeta):
+    """
+    枚举基类的元类
+    创建枚举类时把字段的值加入值到成员的索引，并缓存值列表和描述，按值查找时直接查字典
+    """
+
+    def __new__(metacls, cls, bases, classdict, **kwds):
+        enum_class = super().__new__(metacls, cls, bases, classdict, **kwds)
+
+        # 成员的_value_是EnumField，不可哈希，标准库只能逐个比较，这里用字段的值建立索引
+        value_map = enum_class._value2member_map_
+        enum_class._hashable = True
+        for member in enum_class:
+            try:
+                value_map.setdefault(member.value, member)
+            except TypeError:
+                enum_class._hashable = False
+
+        enum_class._values = tuple(member.value for member in enum_class)
+        try:
+            enum_class._desc_json = json.dumps({d.value: d.desc for d in enum_class}, ensure_ascii=False)
+        except TypeError:
+            # 值不能作为json的键时在调用to_desc时再报错
+            enum_class._desc_json = None
+        return enum_class
+
+
+class EnumBase(Enum, metaclass=EnumBaseMeta):
     """
     枚举基类
     """
 
     @classmethod
     def _missing_(cls, value: object) -> Any:
-        result = list(filter(lambda d: d.value == value, cls))
-        return result[0] if result else None
+        # pydantic的校验查找不到时也会调用这里，例如json中的true和1.0，先查索引，值都可哈希时不用再逐个比较
+        try:
+            member = cls._value2member_map_.get(value)
+        except TypeError:
+            member = None
+        if member is not None or cls._hashable:
+            return member
+        for member in cls:
+            if member.value == value:
+                return member
+        return None
 
     @DynamicClassAttribute
     def value(self) -> Any:
@@ -50,9 +86,11 @@ class EnumBase(Enum):
 
     @classmethod
     def list(cls) -> list:
-        return [c.value for c in cls]
+        return list(cls._values)
 
     @classmethod
     def to_desc(cls) -> str:
-        data = {d.value: d.desc for d in cls}
-        return json.dumps(data, ensure_ascii=False)
+        if cls._desc_json is None:
+            data = {d.value: d.desc for d in cls}
+            return json.dumps(data, ensure_ascii=False)
+        return cls._desc_json
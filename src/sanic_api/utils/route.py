@@ -0,0 +1,17 @@
+from fnmatch import fnmatchcase
+
+from sanic_routing import Route
+
+
+def match_route(route: Route, patterns: list[str]) -> bool:
+    """
+    路由是否匹配其中一个模式
+    Args:
+        route: 路由
+        patterns: 路由名称或路径的模式，可以使用通配符，例如 /user/*
+
+    Returns:
+
+    """
+    names = (route.name or "", f"/{route.path.lstrip('/')}")
+    return any(fnmatchcase(name, pattern) for pattern in patterns for name in names)
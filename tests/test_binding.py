@@ -0,0 +1,180 @@
+import itertools
+from typing import Annotated, Optional
+
+import pytest
+from pydantic import AliasChoices, AliasPath, BaseModel, ConfigDict, Field
+from sanic import Sanic, json
+
+from sanic_api.api import Request, StreamData
+from sanic_api.api.binding import BindingPlan, FieldIndex
+
+_app_ids = itertools.count()
+
+
+class UserQuery(BaseModel):
+    name: str
+    ids: list[int] = []
+
+
+class Params(BaseModel):
+    name: str
+    age: int | None = None
+    tags: list[str] = []
+    ids: Optional[list[int]] = None  # noqa: UP007
+    scores: Annotated[set[int] | None, Field(description="分数")] = None
+    items: tuple[int, ...] = ()
+    raw: bytes = b""
+    page_size: int = Field(default=10, alias="pageSize")
+    keyword: str | None = Field(default=None, validation_alias=AliasChoices("kw", "q"))
+    first: int | None = Field(default=None, validation_alias=AliasPath("values", 0))
+
+
+class NamedParams(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    page_size: int = Field(default=10, alias="pageSize")
+
+
+class ExtraParams(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    name: str = ""
+
+
+class CustomRequest(Request):
+    form_data: Params
+    stream_data: StreamData[NamedParams]
+
+
+def _create_app() -> Sanic:
+    app = Sanic(f"binding_{next(_app_ids)}", request_class=Request)
+    app.signal("http.routing.after")(Request.bind_without_body)
+
+    @app.route("/user", methods=["GET", "POST", "DELETE"])
+    async def user_list(request: Request, query_data: UserQuery):
+        return json(query_data.model_dump())
+
+    return app
+
+
+def test_bind_query_without_body():
+    # 没有请求体的请求sanic不会调用receive_body，query_data在路由匹配后绑定
+    app = _create_app()
+    for method in ("get", "delete"):
+        _, response = getattr(app.test_client, method)("/user?name=tom&ids=1&ids=2")
+        assert response.status == 200
+        assert response.json == {"name": "tom", "ids": [1, 2]}
+
+
+def test_bind_query_with_body():
+    # 有请求体的请求仍然在receive_body中绑定
+    app = _create_app()
+    _, response = app.test_client.post("/user?name=tom&ids=1", content=b"x")
+    assert response.status == 200
+    assert response.json == {"name": "tom", "ids": [1]}
+
+
+def test_bind_query_invalid():
+    app = _create_app()
+    _, response = app.test_client.get("/user?ids=x")
+    assert response.status == 500
+
+
+def test_field_index():
+    index = FieldIndex.build(Params)
+    assert index.scalar_fields == {"name", "age", "raw", "pageSize", "kw", "q"}
+    # Optional、Annotated包装的列表类型也是列表字段，AliasPath按下标取值也不能解包
+    assert index.collection_fields == {"tags", "ids", "scores", "items", "values"}
+    assert index.known_fields == index.scalar_fields | index.collection_fields
+    # 没有设置populate_by_name时只能使用别名
+    assert "page_size" not in index.known_fields
+
+    assert FieldIndex.build(NamedParams).scalar_fields == {"pageSize", "page_size"}
+    assert FieldIndex.build(ExtraParams).known_fields is None
+    assert FieldIndex.get(Params) is FieldIndex.get(Params)
+
+
+def test_field_index_unwrap():
+    index = FieldIndex.get(Params)
+    params = {
+        "name": ["tom"],
+        "age": ["1", "2"],
+        "tags": ["a"],
+        "ids": ["1"],
+        "scores": ["1"],
+        "pageSize": ["20"],
+        "q": ["x"],
+        "values": ["3"],
+        "other": ["y"],
+    }
+    data = index.unwrap(params)
+    assert data == {
+        "name": "tom",
+        # 非列表字段有多个值时保留列表，交给pydantic报错
+        "age": ["1", "2"],
+        "tags": ["a"],
+        "ids": ["1"],
+        "scores": ["1"],
+        "pageSize": "20",
+        "q": "x",
+        "values": ["3"],
+    }
+    # 生成新的字典，不修改原始参数
+    assert params["name"] == ["tom"]
+
+    model = Params(**{k: v for k, v in data.items() if k != "age"})
+    assert model.ids == [1]
+    assert model.scores == {1}
+    assert model.page_size == 20
+    assert model.keyword == "x"
+    assert model.first == 3
+
+    # 模型允许额外的字段时保留所有的参数
+    assert FieldIndex.get(ExtraParams).unwrap({"name": ["a"], "other": ["b"]}) == {"name": "a", "other": ["b"]}
+
+
+@pytest.fixture
+def routes() -> dict:
+    app = Sanic(f"binding_{next(_app_ids)}", request_class=Request)
+
+    @app.get("/args")
+    async def args_handler(request: Request, query_data: Params, form_data: ExtraParams, other: int = 0):
+        return json({})
+
+    @app.post("/request")
+    async def request_handler(request: CustomRequest, query_data: NamedParams):
+        return json({})
+
+    @app.post("/stream")
+    async def stream_handler(request: Request, stream_data: StreamData[NamedParams]):
+        return json({})
+
+    app.router.finalize()
+    return {route.path: route for route in app.router.routes}
+
+
+def test_binding_plan(routes: dict):
+    plan = BindingPlan.get(routes["args"])
+    assert plan.request_type is None
+    assert plan.query_data_type is Params
+    assert plan.form_data_type is ExtraParams
+    assert plan.json_data_type is None
+    assert plan.inject_args == {"query_data", "form_data"}
+    assert plan.field_indexes == {"query_data": FieldIndex.get(Params), "form_data": FieldIndex.get(ExtraParams)}
+    # 编译一次后缓存在路由上
+    assert BindingPlan.get(routes["args"]) is plan
+
+
+def test_binding_plan_request_type(routes: dict):
+    # 没有对应的参数时从自定义的请求类上获取类型，但不注入到处理函数参数
+    plan = BindingPlan.get(routes["request"])
+    assert plan.request_type is CustomRequest
+    assert plan.query_data_type is NamedParams
+    assert plan.form_data_type is Params
+    assert plan.stream_data_type is NamedParams
+    assert plan.inject_args == {"query_data"}
+
+    plan = BindingPlan.get(routes["stream"])
+    assert plan.stream_data_type is NamedParams
+    assert plan.inject_args == {"stream_data"}
+    assert plan.field_indexes == {}
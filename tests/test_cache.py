@@ -0,0 +1,80 @@
+import pytest
+from pydantic import BaseModel
+from sanic import Request, Sanic, json, text
+
+from sanic_api.api import Request as ApiRequest
+from sanic_api.api import UploadFile
+from sanic_api.cache import cached
+from sanic_api.cache.backend import CacheBackend, MemoryBackend
+
+BOUNDARY = "sanic-api-boundary"
+
+
+class AvatarModel(BaseModel):
+    avatar: UploadFile
+
+
+def test_key_includes_method():
+    app = Sanic("cache_method")
+    calls = []
+
+    @app.route("/item", methods=["GET", "POST"])
+    @cached(ttl=60)
+    async def item(request: Request):
+        calls.append(request.method)
+        return text(request.method)
+
+    _, response = app.test_client.get("/item")
+    assert response.text == "GET"
+    _, response = app.test_client.post("/item")
+    assert response.text == "POST"
+    _, response = app.test_client.get("/item")
+    assert response.text == "GET"
+    assert calls == ["GET", "POST"]
+
+
+def test_custom_key_includes_method():
+    app = Sanic("cache_custom_key")
+
+    @app.route("/item", methods=["GET", "DELETE"])
+    @cached(ttl=60, key=lambda request: "item")
+    async def item(request: Request):
+        return text(request.method)
+
+    app.test_client.get("/item")
+    _, response = app.test_client.delete("/item")
+    assert response.text == "DELETE"
+
+
+def test_backend_is_abstract():
+    class GetOnlyBackend(CacheBackend):
+        async def get(self, key: str) -> bytes | None:
+            return None
+
+    with pytest.raises(TypeError):
+        CacheBackend()
+    with pytest.raises(TypeError):
+        GetOnlyBackend()
+
+
+def test_upload_not_cached():
+    app = Sanic("cache_upload", request_class=ApiRequest)
+    app.signal("http.routing.after")(ApiRequest.bind_without_body)
+    backend = MemoryBackend()
+
+    @app.post("/avatar")
+    @cached(ttl=60, backend=backend)
+    async def avatar(request: ApiRequest, files_data: AvatarModel):
+        return json({"content": files_data.avatar.read().decode()})
+
+    headers = {"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+    for content in ("a", "b"):
+        body = (
+            f"--{BOUNDARY}\r\n"
+            'Content-Disposition: form-data; name="avatar"; filename="a.txt"\r\n\r\n'
+            f"{content}\r\n--{BOUNDARY}--\r\n"
+        )
+        _, response = app.test_client.post("/avatar", content=body.encode(), headers=headers)
+        assert response.json == {"content": content}
+    # 上传文件的请求不读取也不写入缓存
+    assert len(backend._data) == 0
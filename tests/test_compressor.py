@@ -0,0 +1,35 @@
+import pytest
+
+from sanic_api.compress.compressor import brotli, select_encoding
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        ("", None),
+        ("identity", None),
+        ("gzip", "gzip"),
+        ("deflate, gzip;q=0.5", "gzip"),
+        ("*", "gzip"),
+        ("gzip;q=0", None),
+        ("gzip;q=0, *", None),
+        ("*, gzip;q=0.000", None),
+        ("gzip; q=0, *;q=1", None),
+        ("gzip;q=0, br;q=0, *", None),
+        ("gzip;q=0.001", "gzip"),
+        ("*;q=0", None),
+        ("gzip;q=abc", None),
+        ("GZIP", "gzip"),
+    ],
+)
+def test_select_encoding(accept_encoding: str, expected: str | None):
+    assert select_encoding(accept_encoding) == expected
+
+
+@pytest.mark.skipif(brotli is None, reason="没有安装brotli")
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [("gzip, br", "br"), ("br;q=0, gzip", "gzip"), ("br;q=0, *", "gzip")],
+)
+def test_select_encoding_brotli(accept_encoding: str, expected: str):
+    assert select_encoding(accept_encoding) == expected
@@ -0,0 +1,62 @@
+import itertools
+
+from sanic import Sanic, json
+from sanic.models.server_types import ConnInfo
+
+from sanic_api.api import Request
+from sanic_api.api.context import RequestContext, get_request_context, setup_request_context
+
+_app_ids = itertools.count()
+
+TRACEPARENT = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+
+def _create_app() -> Sanic:
+    app = Sanic(f"context_{next(_app_ids)}", request_class=Request)
+    setup_request_context(app)
+    app.ctx.completed = []
+
+    @app.get("/context", name="context")
+    async def context(request: Request):
+        ctx = get_request_context()
+        return json({"request_id": ctx.request_id, "trace_id": ctx.trace_id, "route_name": ctx.route_name})
+
+    @app.signal("http.lifecycle.complete", priority=-1)
+    async def on_complete(conn_info: ConnInfo):
+        app.ctx.completed.append(get_request_context())
+
+    return app
+
+
+def test_request_context():
+    app = _create_app()
+    headers = {"X-Request-ID": "req-1", "traceparent": TRACEPARENT}
+    _, response = app.test_client.get("/context", headers=headers)
+    assert response.json == {
+        "request_id": "req-1",
+        "trace_id": "4bf92f3577b34da6a3ce929d0e0e4736",
+        "route_name": f"{app.name}.context",
+    }
+    assert response.headers["X-Request-ID"] == "req-1"
+
+    _, response = app.test_client.get("/context", headers={"X-Request-ID": "bad id"})
+    assert response.json["request_id"] != "bad id"
+    assert response.headers["X-Request-ID"] == response.json["request_id"]
+
+
+def test_reset_on_complete():
+    app = _create_app()
+    app.test_client.get("/context")
+    # 连接结束后不再保留最后一个请求的上下文
+    assert app.ctx.completed == [None]
+
+
+def test_from_headers():
+    context = RequestContext.from_headers({"traceparent": TRACEPARENT})
+    assert context.parent_span_id == "00f067aa0ba902b7"
+    assert context.traceparent.startswith("00-4bf92f3577b34da6a3ce929d0e0e4736-")
+    assert context.span_id != context.parent_span_id
+
+    context = RequestContext.from_headers({"traceparent": "00-" + "0" * 32 + "-00f067aa0ba902b7-01"})
+    assert context.parent_span_id is None
+    assert context.trace_id == context.request_id.replace("-", "")
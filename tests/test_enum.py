@@ -0,0 +1,99 @@
+import json
+
+import pytest
+from pydantic import BaseModel, ValidationError
+
+from sanic_api.utils.enum import EnumBase, EnumField
+
+
+class Status(EnumBase):
+    ON = EnumField(1, "开启")
+    OFF = EnumField(2, "关闭")
+
+
+class Color(EnumBase):
+    RED = EnumField("red", "红色")
+    BLUE = "blue"
+
+
+class Point(EnumBase):
+    ORIGIN = EnumField([0, 0], "原点")
+    ONE = EnumField([1, 1], "(1, 1)")
+
+
+class Level(EnumBase):
+    LOW = EnumField("low", "低")
+
+    @classmethod
+    def _missing_(cls, value: object):
+        if isinstance(value, str):
+            return super()._missing_(value.lower())
+        return None
+
+
+class StatusModel(BaseModel):
+    status: Status
+
+
+class PointModel(BaseModel):
+    point: Point
+
+
+class LevelModel(BaseModel):
+    level: Level
+
+
+def test_lookup():
+    assert Status(1) is Status.ON
+    assert Color("red") is Color.RED
+    assert Color("blue") is Color.BLUE
+    # 不可哈希的值逐个比较
+    assert Point([1, 1]) is Point.ONE
+    with pytest.raises(ValueError):
+        Status(3)
+    with pytest.raises(ValueError):
+        Point([2, 2])
+
+
+def test_list_and_desc():
+    assert Status.list() == [1, 2]
+    assert json.loads(Status.to_desc()) == {"1": "开启", "2": "关闭"}
+    assert Color.BLUE.desc == ""
+    assert Point.list() == [[0, 0], [1, 1]]
+
+
+@pytest.mark.parametrize("value", [1, True, 1.0])
+def test_validate_int(value):
+    assert StatusModel(status=value).status is Status.ON
+    assert StatusModel.model_validate_json(json.dumps({"status": value})).status is Status.ON
+
+
+@pytest.mark.parametrize("value", ["1", 3, None])
+def test_validate_int_invalid(value):
+    # 宽松模式下也不接受字符串形式的数字
+    with pytest.raises(ValidationError, match="Input should be 1 or 2"):
+        StatusModel(status=value)
+    with pytest.raises(ValidationError, match="Input should be 1 or 2"):
+        StatusModel.model_validate_json(json.dumps({"status": value}))
+
+
+def test_validate_strict():
+    assert StatusModel.model_validate({"status": Status.OFF}, strict=True).status is Status.OFF
+    with pytest.raises(ValidationError):
+        StatusModel.model_validate({"status": 2}, strict=True)
+
+
+def test_validate_unhashable():
+    assert PointModel(point=[1, 1]).point is Point.ONE
+    assert PointModel.model_validate_json('{"point": [0, 0]}').point is Point.ORIGIN
+    with pytest.raises(ValidationError):
+        PointModel(point=[2, 2])
+
+
+def test_validate_missing_override():
+    # 子类重写的_missing_在校验时仍然会调用
+    assert Level("LOW") is Level.LOW
+    assert LevelModel(level="LOW").level is Level.LOW
+    assert LevelModel.model_validate_json('{"level": "Low"}').level is Level.LOW
+    with pytest.raises(ValidationError):
+        LevelModel(level="high")
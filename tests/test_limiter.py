@@ -0,0 +1,21 @@
+import asyncio
+
+from sanic_api.limiter.limiter import Limit
+
+
+def test_acquire_timeout():
+    async def main():
+        limit = Limit(1, queue_size=1)
+        assert await limit.acquire(1)
+        assert not await limit.acquire(0.01)
+        assert not limit.waiters
+
+        # 排队中的请求在归还后获得并发数
+        waiter = asyncio.create_task(limit.acquire(1))
+        await asyncio.sleep(0)
+        assert not await limit.acquire(1)
+        limit.release()
+        assert await waiter
+        assert limit.inflight == 1
+
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+import itertools
+import logging
+import threading
+from collections.abc import Iterator
+from pathlib import Path
+
+import orjson
+import pytest
+from loguru import logger
+from sanic import Sanic
+
+from sanic_api.logger.extension import LoggerExtend
+
+_app_ids = itertools.count()
+
+
+@pytest.fixture
+def log_file(tmp_path: Path) -> Iterator[Path]:
+    yield tmp_path / "app.log"
+    logger.remove()
+    logging.basicConfig(handlers=[], level=logging.WARNING, force=True)
+
+
+def _read_messages(log_file: Path) -> list[str]:
+    return [orjson.loads(line)["record"]["message"] for line in log_file.read_text().splitlines()]
+
+
+def test_set_level(log_file: Path):
+    log_ext = LoggerExtend(Sanic(f"logger_{next(_app_ids)}"), log_file=log_file, level="WARNING")
+    user_messages = []
+    logger.add(user_messages.append, format="{message}", level="DEBUG")
+
+    logger.bind(type="test", etxra_info="").info("info-1")
+    logger.bind(type="test", etxra_info="").warning("warning-1")
+    logging.getLogger("test").info("std-info-1")
+    assert logging.getLogger().level == logging.WARNING
+
+    log_ext.set_level("DEBUG")
+    logger.bind(type="test", etxra_info="").debug("debug-2")
+    logging.getLogger("test").info("std-info-2")
+    assert logging.getLogger().level == logging.DEBUG
+
+    assert _read_messages(log_file) == ["warning-1", "debug-2", "std-info-2"]
+    # 用户自己添加的输出不受影响
+    assert [str(message).strip() for message in user_messages] == [
+        "info-1",
+        "warning-1",
+        "debug-2",
+        "std-info-2",
+    ]
+
+
+def test_default_level(log_file: Path):
+    log_ext = LoggerExtend(Sanic(f"logger_{next(_app_ids)}"), log_file=log_file, level="ERROR")
+    log_ext.set_level(None)
+    logger.bind(type="test", etxra_info="").debug("debug")
+    assert _read_messages(log_file) == ["debug"]
+    assert logging.getLogger().level == logging.INFO
+
+
+def test_set_level_concurrent(log_file: Path):
+    # 其他线程写日志的同时切换级别，每条日志只写入一次
+    log_ext = LoggerExtend(Sanic(f"logger_{next(_app_ids)}"), log_file=log_file, level="INFO")
+    done = threading.Event()
+
+    def write():
+        for i in range(500):
+            logger.bind(type="test", etxra_info="").warning(f"warning-{i}")
+        done.set()
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    while not done.is_set():
+        log_ext.set_level("DEBUG")
+        log_ext.set_level("INFO")
+    thread.join()
+
+    assert _read_messages(log_file) == [f"warning-{i}" for i in range(500)]
@@ -0,0 +1,150 @@
+import gzip
+import json
+import threading
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from loguru import logger
+
+from sanic_api.logger.loki import LokiShipper
+
+
+class LokiStub:
+    """
+    模拟loki推送接口的HTTP服务，按顺序返回指定的状态码，记录收到的请求
+    """
+
+    def __init__(self):
+        self.statuses: list[int] = []
+        self.requests: list[dict] = []
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                with stub.lock:
+                    status = stub.statuses.pop(0) if stub.statuses else 204
+                    stub.requests.append({"path": self.path, "headers": dict(self.headers), "body": body})
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/loki/api/v1/push"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def payloads(self) -> list[dict]:
+        return [json.loads(gzip.decompress(r["body"])) for r in self.requests]
+
+    def lines(self) -> list[str]:
+        return [value[1] for payload in self.payloads() for s in payload["streams"] for value in s["values"]]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub() -> Iterator[LokiStub]:
+    stub = LokiStub()
+    yield stub
+    stub.close()
+
+
+def _log(shipper: LokiShipper, messages: list[str], level: str = "INFO"):
+    handler_id = logger.add(shipper, format="{message}", level="DEBUG")
+    try:
+        for message in messages:
+            logger.log(level, message)
+    finally:
+        logger.remove(handler_id)
+
+
+def test_batch_and_gzip(stub: LokiStub):
+    shipper = LokiShipper(stub.url, {"app": "test"}, batch_size=3, flush_interval=60)
+    _log(shipper, [f"msg-{i}" for i in range(7)])
+    assert shipper.flush(timeout=5)
+    shipper.close(timeout=5)
+
+    assert [len(s["values"]) for p in stub.payloads() for s in p["streams"]] == [3, 3, 1]
+    assert stub.lines() == [f"msg-{i}" for i in range(7)]
+    request = stub.requests[0]
+    assert request["path"] == "/loki/api/v1/push"
+    assert request["headers"]["Content-Encoding"] == "gzip"
+    assert request["headers"]["Content-Type"] == "application/json"
+
+    stream = stub.payloads()[0]["streams"][0]
+    assert stream["stream"] == {"app": "test", "level": "INFO"}
+    timestamp, _ = stream["values"][0]
+    assert timestamp.isdigit() and len(timestamp) >= 19
+    assert shipper.sent == 7
+    assert shipper.failed == shipper.dropped == 0
+
+
+def test_group_by_level(stub: LokiStub):
+    shipper = LokiShipper(stub.url, {"app": "test"}, flush_interval=60)
+    _log(shipper, ["info"], "INFO")
+    _log(shipper, ["error"], "ERROR")
+    assert shipper.flush(timeout=5)
+    shipper.close(timeout=5)
+
+    streams = {s["stream"]["level"]: [v[1] for v in s["values"]] for s in stub.payloads()[0]["streams"]}
+    assert streams == {"INFO": ["info"], "ERROR": ["error"]}
+
+
+@pytest.mark.parametrize("status", [500, 503, 429])
+def test_retry(stub: LokiStub, status: int):
+    stub.statuses = [status, status]
+    shipper = LokiShipper(stub.url, {"app": "test"}, flush_interval=60, max_retries=3, retry_backoff=0.001)
+    _log(shipper, ["a", "b"])
+    assert shipper.flush(timeout=5)
+    shipper.close(timeout=5)
+
+    assert len(stub.requests) == 3
+    assert stub.payloads()[0] == stub.payloads()[-1]
+    assert shipper.sent == 2
+    assert shipper.failed == 0
+
+
+def test_retry_exhausted(stub: LokiStub):
+    stub.statuses = [500] * 10
+    shipper = LokiShipper(stub.url, {"app": "test"}, flush_interval=60, max_retries=2, retry_backoff=0.001)
+    _log(shipper, ["a", "b"])
+    assert shipper.flush(timeout=5)
+    shipper.close(timeout=5)
+
+    assert len(stub.requests) == 3
+    assert shipper.sent == 0
+    assert shipper.failed == 2
+
+
+@pytest.mark.parametrize("status", [400, 404, 413])
+def test_client_error_not_retried(stub: LokiStub, status: int):
+    stub.statuses = [status]
+    shipper = LokiShipper(stub.url, {"app": "test"}, flush_interval=60, max_retries=3, retry_backoff=0.001)
+    _log(shipper, ["a", "b", "c"])
+    assert shipper.flush(timeout=5)
+    shipper.close(timeout=5)
+
+    assert len(stub.requests) == 1
+    assert shipper.sent == 0
+    assert shipper.failed == 3
+
+
+def test_drop_oldest(stub: LokiStub):
+    shipper = LokiShipper(stub.url, {"app": "test"}, batch_size=100, flush_interval=60, queue_size=3)
+    _log(shipper, [f"msg-{i}" for i in range(5)])
+    assert shipper.dropped == 2
+    assert shipper.flush(timeout=5)
+    shipper.close(timeout=5)
+
+    assert stub.lines() == ["msg-2", "msg-3", "msg-4"]
+    assert shipper.sent == 3
@@ -0,0 +1,73 @@
+import itertools
+import os
+from pathlib import Path
+
+import orjson
+import pytest
+from sanic import Sanic
+
+from sanic_api.metrics.collector import RouteMetrics
+
+# 不存在的工作进程的PID
+DEAD_PID = "999999999"
+
+_app_ids = itertools.count()
+
+
+@pytest.fixture
+def metrics(tmp_path: Path) -> RouteMetrics:
+    metrics = RouteMetrics(Sanic(f"metrics_{next(_app_ids)}"))
+    metrics.metrics_dir = tmp_path
+    inflight = metrics.registry.gauge("sanic_api_offload_inflight", "正在执行的任务数", ("kind",))
+
+    inflight.set(("thread",), 2)
+    metrics.requests.inc(("app.index", "GET", "200"), 3)
+    metrics.duration.observe(("app.index",), 0.01)
+    (tmp_path / f"{DEAD_PID}.json").write_bytes(orjson.dumps(metrics.registry.snapshot()))
+
+    inflight.set(("thread",), 1)
+    metrics.requests.values.clear()
+    metrics.requests.inc(("app.index", "GET", "200"))
+    metrics._dump()
+    return metrics
+
+
+def test_drop_gauges_of_exited_workers(metrics: RouteMetrics, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(metrics, "_get_live_pids", lambda: {str(os.getpid())})
+    text = metrics.registry.render(metrics._load_snapshots())
+    assert 'sanic_api_offload_inflight{kind="thread"} 1\n' in text
+    assert 'sanic_api_requests_total{route="app.index",method="GET",status="200"} 4\n' in text
+    assert 'sanic_api_request_duration_seconds_count{route="app.index"} 2\n' in text
+
+
+def test_keep_all_without_worker_manager(metrics: RouteMetrics):
+    # 没有通过sanic的工作进程管理器启动时无法判断进程是否存活，全部保留
+    assert metrics._get_live_pids() is None
+    text = metrics.registry.render(metrics._load_snapshots())
+    assert 'sanic_api_offload_inflight{kind="thread"} 3\n' in text
+
+
+@pytest.mark.parametrize(
+    ("token", "authorization", "status"),
+    [
+        (None, None, 200),
+        ("secret", None, 401),
+        ("secret", "Bearer wrong", 401),
+        ("secret", "Basic secret", 401),
+        ("secret", "Bearer secret", 200),
+    ],
+)
+def test_handle_token(tmp_path: Path, token: str | None, authorization: str | None, status: int):
+    app = Sanic(f"metrics_{next(_app_ids)}")
+    metrics = RouteMetrics(app, token=token)
+    metrics.setup_route()
+    metrics.metrics_dir = tmp_path
+    metrics.requests.inc(("app.index", "GET", "200"))
+
+    headers = {"authorization": authorization} if authorization else {}
+    _, response = app.test_client.get("/metrics", headers=headers)
+    assert response.status == status
+    if status == 200:
+        assert 'sanic_api_requests_total{route="app.index",method="GET",status="200"} 1' in response.text
+        # 返回指标时同时写入了本进程的快照
+        assert (tmp_path / f"{os.getpid()}.json").exists()
@@ -0,0 +1,113 @@
+import itertools
+import multiprocessing
+import os
+import threading
+from collections.abc import Iterator
+from types import SimpleNamespace
+
+import pytest
+from sanic import Sanic, json
+
+from sanic_api.offload import OffloadPool, ProcessPoolService, offload
+from sanic_api.offload.pool import OFFLOAD_ADDRESS_ENV
+
+_app_ids = itertools.count()
+
+
+@offload("thread")
+def thread_handler(request, n: int):
+    return json({"n": n * 2, "thread": threading.current_thread().name, "path": request.path})
+
+
+@offload("process")
+def process_handler(n: int):
+    if n < 0:
+        raise ValueError("n不能小于0")
+    return json({"n": n * 2, "pid": os.getpid()})
+
+
+@offload("process")
+async def async_process_handler(n: int):
+    return json({"n": n * 3, "pid": os.getpid()})
+
+
+def _create_app(pool: OffloadPool) -> Sanic:
+    app = Sanic(f"offload_{next(_app_ids)}")
+    app.ctx.offload_pool = pool
+    app.add_route(thread_handler, "/thread/<n:int>")
+    app.add_route(process_handler, "/process/<n:int>")
+    app.add_route(async_process_handler, "/async_process/<n:int>")
+
+    @app.exception(ValueError)
+    async def value_error(request, exception: ValueError):
+        return json({"error": str(exception)}, status=400)
+
+    @app.after_server_stop
+    async def shutdown(app: Sanic):
+        app.ctx.offload_pool.shutdown()
+
+    return app
+
+
+@pytest.fixture
+def service() -> Iterator[ProcessPoolService]:
+    service = ProcessPoolService(2)
+    service.start()
+    yield service
+    service.stop()
+
+
+def test_thread():
+    app = _create_app(OffloadPool(thread_workers=2))
+    _, response = app.test_client.get("/thread/3")
+    assert response.status == 200
+    assert response.json["n"] == 6
+    assert response.json["thread"].startswith("sanic_api_offload")
+    assert response.json["path"] == "/thread/3"
+
+
+def test_process_local():
+    # 不是守护进程时在本进程中创建进程池
+    app = _create_app(OffloadPool(process_workers=1))
+    _, response = app.test_client.get("/process/3")
+    assert response.status == 200
+    assert response.json["n"] == 6
+    assert response.json["pid"] != os.getpid()
+
+
+def test_process_service(service: ProcessPoolService):
+    assert os.environ[OFFLOAD_ADDRESS_ENV] == service.address
+    app = _create_app(OffloadPool(process_workers=2))
+    _, response = app.test_client.get("/process/4")
+    assert response.json["n"] == 8
+    pid = response.json["pid"]
+    assert pid != os.getpid()
+
+    _, response = app.test_client.get("/async_process/4")
+    assert response.json["n"] == 12
+
+    # 处理函数中的异常原样传回工作进程
+    _, response = app.test_client.get("/process/-1")
+    assert response.status == 400
+    assert response.json == {"error": "n不能小于0"}
+
+    # 进程池在服务进程中创建，不是当前进程的子进程
+    assert pid not in [p.pid for p in multiprocessing.active_children()]
+
+
+def test_service_stop(service: ProcessPoolService):
+    service.stop()
+    assert OFFLOAD_ADDRESS_ENV not in os.environ
+
+
+def test_process_in_daemon(monkeypatch: pytest.MonkeyPatch):
+    # 守护进程中没有进程池服务时不能创建进程池，也不会修改守护标记
+    monkeypatch.setattr(multiprocessing, "current_process", lambda: SimpleNamespace(daemon=True))
+    pool = OffloadPool(process_workers=1)
+    with pytest.raises(RuntimeError):
+        pool.get_executor("process")
+
+
+def test_process_disabled():
+    with pytest.raises(RuntimeError):
+        OffloadPool(process_workers=0).get_executor("process")
@@ -0,0 +1,178 @@
+import gzip
+import itertools
+import json
+from pathlib import Path
+
+import pytest
+from pydantic import BaseModel, Field
+from sanic import HTTPResponse, Sanic
+from sanic import json as json_resp
+from sanic_ext import openapi
+
+from sanic_api.api import BaseResp, Request
+from sanic_api.compress.compressor import brotli
+from sanic_api.openapi import OpenAPIDocs, SpecBlob, build_spec
+from sanic_api.openapi.extension import OPENAPI_DIR_ENV, SPEC_FILE_NAME
+
+_app_ids = itertools.count()
+
+SPEC_URL = f"/docs/{SPEC_FILE_NAME}"
+
+
+class UserQuery(BaseModel):
+    name: str = Field(title="用户名")
+    page: int = 1
+
+
+class UserBody(BaseModel):
+    name: str
+
+
+class UserResp(BaseResp):
+    user_id: int
+    name: str
+
+
+def _create_app() -> Sanic:
+    app = Sanic(f"openapi_{next(_app_ids)}", request_class=Request)
+    app.signal("http.routing.after")(Request.bind_without_body)
+
+    @app.get("/user", name="user_list")
+    async def user_list(request: Request, query_data: UserQuery) -> UserResp:
+        return json_resp({})
+
+    @app.post("/user/<user_id:int>", name="user_update")
+    @openapi.summary("修改用户")
+    @openapi.tag("user")
+    @openapi.parameter("user_id", int, "path", description="用户ID")
+    @openapi.response(404, {"application/json": dict}, "用户不存在")
+    async def user_update(request: Request, user_id: int, json_data: UserBody) -> UserResp:
+        return json_resp({})
+
+    @app.get("/internal", name="internal")
+    @openapi.exclude()
+    async def internal(request: Request) -> HTTPResponse:
+        return json_resp({})
+
+    @app.get("/ping", name="ping")
+    async def ping(request: Request) -> HTTPResponse:
+        return json_resp({})
+
+    return app
+
+
+@pytest.fixture
+def docs(monkeypatch: pytest.MonkeyPatch) -> OpenAPIDocs:
+    monkeypatch.delenv(OPENAPI_DIR_ENV, raising=False)
+    docs = OpenAPIDocs(_create_app(), title="test", ignore_routes=["/ping"])
+    docs.setup()
+    return docs
+
+
+def test_build_spec():
+    spec = build_spec(_create_app(), title="test", version="1.0.0", ignore_routes=["/ping"])
+    assert spec["info"] == {"title": "test", "version": "1.0.0"}
+    assert sorted(spec["paths"]) == ["/user", "/user/{user_id}"]
+
+    operation = spec["paths"]["/user"]["get"]
+    assert [(p["name"], p["in"], p.get("required", False)) for p in operation["parameters"]] == [
+        ("name", "query", True),
+        ("page", "query", False),
+    ]
+    assert operation["responses"]["200"]["content"]["application/json"]["schema"] == {
+        "$ref": "#/components/schemas/UserResp"
+    }
+    assert {"UserResp", "UserBody"} <= set(spec["components"]["schemas"])
+
+
+def test_build_spec_decorators():
+    spec = build_spec(_create_app(), title="test", version="1.0.0")
+    # 使用 @openapi.exclude 的路由不生成文档
+    assert "/internal" not in spec["paths"]
+    assert "/ping" in spec["paths"]
+
+    operation = spec["paths"]["/user/{user_id}"]["post"]
+    assert operation["summary"] == "修改用户"
+    assert operation["tags"] == ["user"]
+    # 声明的参数覆盖自动生成的同名参数
+    params = [p for p in operation["parameters"] if p["name"] == "user_id"]
+    assert len(params) == 1
+    assert params[0]["description"] == "用户ID"
+    # 声明的响应和自动生成的响应合并
+    assert set(operation["responses"]) == {"200", "404"}
+    assert operation["responses"]["404"]["description"] == "用户不存在"
+    assert operation["requestBody"]["content"]["application/json"]["schema"] == {
+        "$ref": "#/components/schemas/UserBody"
+    }
+
+
+def test_spec(docs: OpenAPIDocs):
+    _, response = docs.app.test_client.get(SPEC_URL, headers={"accept-encoding": "identity"})
+    assert response.status == 200
+    assert "content-encoding" not in response.headers
+    assert response.headers["cache-control"] == "no-cache"
+    assert response.json["paths"].keys() == {"/user", "/user/{user_id}"}
+    assert not response.headers["etag"].startswith("W/")
+
+
+def test_spec_not_modified(docs: OpenAPIDocs):
+    _, response = docs.app.test_client.get(SPEC_URL, headers={"accept-encoding": "identity"})
+    etag = response.headers["etag"]
+
+    _, response = docs.app.test_client.get(SPEC_URL, headers={"accept-encoding": "identity", "if-none-match": etag})
+    assert response.status == 304
+    assert response.headers["etag"] == etag
+    assert response.body == b""
+
+    _, response = docs.app.test_client.get(
+        SPEC_URL, headers={"accept-encoding": "identity", "if-none-match": '"other"'}
+    )
+    assert response.status == 200
+
+
+def test_spec_gzip(docs: OpenAPIDocs):
+    # 测试客户端会自动解压，这里直接比较预先压缩的字节
+    _, response = docs.app.test_client.get(SPEC_URL, headers={"accept-encoding": "gzip"})
+    assert response.status == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    etag = response.headers["etag"]
+    # 压缩后的字节和原始的不同，使用弱ETag
+    assert etag == f"W/{docs.blob.etag}"
+    assert gzip.decompress(docs.blob.encoded["gzip"]) == docs.blob.body
+
+    _, response = docs.app.test_client.get(SPEC_URL, headers={"accept-encoding": "gzip", "if-none-match": etag})
+    assert response.status == 304
+
+
+@pytest.mark.skipif(brotli is None, reason="没有安装brotli")
+def test_spec_br(docs: OpenAPIDocs):
+    _, response = docs.app.test_client.get(SPEC_URL, headers={"accept-encoding": "br"})
+    assert response.status == 200
+    assert response.headers["content-encoding"] == "br"
+    assert brotli.decompress(docs.blob.encoded["br"]) == docs.blob.body
+
+
+def test_spec_shared(docs: OpenAPIDocs, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv(OPENAPI_DIR_ENV, str(tmp_path))
+    _, response = docs.app.test_client.get(SPEC_URL, headers={"accept-encoding": "identity"})
+    # 第一个生成文档的工作进程写入共享目录
+    assert (tmp_path / SPEC_FILE_NAME).read_bytes() == response.body
+    assert (tmp_path / f"{SPEC_FILE_NAME}.gzip").exists()
+    assert not list(tmp_path.glob(".*"))
+
+    # 其他工作进程直接读取共享目录中的文档，不再生成
+    SpecBlob(json.dumps({"openapi": "3.1.0"}).encode()).dump(tmp_path)
+    other = OpenAPIDocs(_create_app(), title="test")
+    other.setup()
+    _, response = other.app.test_client.get(SPEC_URL, headers={"accept-encoding": "identity"})
+    assert response.json == {"openapi": "3.1.0"}
+
+
+def test_spec_not_shared(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv(OPENAPI_DIR_ENV, str(tmp_path))
+    SpecBlob(json.dumps({"openapi": "3.1.0"}).encode()).dump(tmp_path)
+    docs = OpenAPIDocs(_create_app(), title="test", share=False)
+    docs.setup()
+    _, response = docs.app.test_client.get(SPEC_URL, headers={"accept-encoding": "identity"})
+    assert "/user" in response.json["paths"]
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import os
+from collections.abc import Iterator
+from pathlib import Path
+
+import orjson
+import pytest
+from pydantic import ValidationError
+
+from sanic_api.config import DefaultSettings, LogLevelEnum
+from sanic_api.config.reload import (
+    SETTINGS_DIR_ENV,
+    SettingsSubscriber,
+    SettingsWatcher,
+    get_reloadable,
+    set_reloadable,
+)
+
+
+@pytest.fixture
+def config_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """
+    在临时目录中运行，配置文件放在其中的configs目录
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv(SETTINGS_DIR_ENV, raising=False)
+    config_dir = tmp_path / "configs"
+    config_dir.mkdir()
+    return config_dir
+
+
+@pytest.fixture
+def watcher(config_dir: Path) -> Iterator[SettingsWatcher]:
+    watcher = SettingsWatcher(DefaultSettings(), interval=60)
+    watcher.start()
+    yield watcher
+    watcher.stop()
+
+
+_mtime = iter(range(1, 1000))
+
+
+def _write_config(config_dir: Path, data: dict):
+    """
+    写入配置文件，修改时间每次都不同，避免文件系统的时间精度不够
+    """
+    path = config_dir / "settings.json"
+    path.write_text(json.dumps(data))
+    mtime_ns = next(_mtime) * 1_000_000_000
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_set_reloadable(config_dir: Path):
+    settings = DefaultSettings()
+    changed = set_reloadable(settings, {"access_log": False, "logger.level": "INFO", "port": 1})
+    assert changed == {"access_log", "logger.level"}
+    assert settings.access_log is False
+    assert settings.logger.level is LogLevelEnum.INFO
+    # 不能热加载的配置不会修改
+    assert settings.port != 1
+    assert set_reloadable(settings, get_reloadable(settings)) == set()
+
+
+def test_set_reloadable_invalid(config_dir: Path):
+    settings = DefaultSettings()
+    # 有值校验失败时所有的值都不会修改
+    with pytest.raises(ValidationError):
+        set_reloadable(settings, {"access_log": False, "limiter.max_concurrency": 0})
+    assert settings.access_log is True
+    assert settings.limiter.max_concurrency is None
+
+
+def test_watcher(watcher: SettingsWatcher, config_dir: Path):
+    assert os.environ[SETTINGS_DIR_ENV] == str(watcher.snapshot_path.parent)
+    assert orjson.loads(watcher.snapshot_path.read_bytes()) == get_reloadable(watcher.settings)
+    assert watcher.check() == set()
+
+    _write_config(config_dir, {"access_log": False, "port": 1})
+    assert watcher.check() == {"access_log"}
+    assert watcher.settings.access_log is False
+    assert watcher.settings.port != 1
+    assert orjson.loads(watcher.snapshot_path.read_bytes())["access_log"] is False
+
+    # 配置文件没有变化时不再读取
+    assert watcher.check() == set()
+
+
+def test_watcher_invalid(watcher: SettingsWatcher, config_dir: Path):
+    snapshot = watcher.snapshot_path.read_bytes()
+    _write_config(config_dir, {"access_log": False, "limiter": {"max_concurrency": 0}})
+    assert watcher.check() == set()
+    assert watcher.settings.access_log is True
+    assert watcher.snapshot_path.read_bytes() == snapshot
+
+
+def test_watcher_stop(config_dir: Path):
+    watcher = SettingsWatcher(DefaultSettings(), interval=60)
+    watcher.start()
+    settings_dir = watcher.snapshot_path.parent
+    watcher.stop()
+    assert SETTINGS_DIR_ENV not in os.environ
+    assert not settings_dir.exists()
+
+
+def test_subscriber(watcher: SettingsWatcher, config_dir: Path):
+    settings = DefaultSettings()
+    changes = []
+
+    async def run():
+        subscriber = SettingsSubscriber(settings, changes.append, interval=60)
+        subscriber.start()
+        try:
+            # 启动时的快照和工作进程中的配置一致
+            assert subscriber.check() == set()
+
+            _write_config(config_dir, {"access_log": False, "logger": {"level": "ERROR"}})
+            watcher.check()
+            os.utime(watcher.snapshot_path, ns=(next(_mtime) * 1_000_000_000,) * 2)
+            assert subscriber.check() == {"access_log", "logger.level"}
+            assert subscriber.check() == set()
+        finally:
+            subscriber.stop()
+
+    asyncio.run(run())
+    assert changes == [{"access_log", "logger.level"}]
+    assert settings.access_log is False
+    assert settings.logger.level is LogLevelEnum.ERROR
+
+
+def test_subscriber_invalid(watcher: SettingsWatcher, config_dir: Path):
+    settings = DefaultSettings()
+    changes = []
+    subscriber = SettingsSubscriber(settings, changes.append)
+    subscriber.snapshot_path = watcher.snapshot_path
+
+    values = {**get_reloadable(settings), "access_log": False, "limiter.max_concurrency": 0}
+    watcher.snapshot_path.write_bytes(orjson.dumps(values))
+    with pytest.raises(ValidationError):
+        subscriber.check()
+    assert settings.access_log is True
+    assert changes == []
+
+
+def test_subscriber_without_dir(config_dir: Path):
+    # 没有共享目录时不启动
+    async def run():
+        subscriber = SettingsSubscriber(DefaultSettings(), print)
+        subscriber.start()
+        return subscriber._task
+
+    assert asyncio.run(run()) is None
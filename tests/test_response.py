@@ -0,0 +1,126 @@
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Any
+
+import pytest
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
+from sanic.response import JSONResponse
+
+from sanic_api.api import BaseRespTml
+from sanic_api.api.response import TempModel
+
+
+class Color(Enum):
+    RED = "red"
+    BLUE = "blue"
+
+
+class Address(BaseModel):
+    city: str
+    zip_code: str | None = None
+
+
+class UserResp(BaseRespTml):
+    user_id: int
+    name: str
+    score: float = 0.5
+    color: Color = Color.RED
+    tags: list[str] = Field(default_factory=list)
+    address: Address | None = None
+    created_at: datetime = datetime(2024, 1, 2, 3, 4, 5)
+
+
+class ResultTempModel(TempModel):
+    model_config = ConfigDict(extra="allow")
+
+    _data_field: str = PrivateAttr(default="result")
+    result: Any = Field(default=None, title="结果")
+    success: bool = True
+
+
+class ResultRespTml(BaseRespTml):
+    temp_data: ResultTempModel | None = Field(default_factory=ResultTempModel)
+
+
+class OrderResp(ResultRespTml):
+    order_id: str
+    amount: int
+
+
+def _baseline(resp: BaseRespTml) -> bytes:
+    """
+    改为直接序列化之前的实现：先转为dict放入模板，再由sanic序列化
+    """
+    temp_data = resp.temp_data.model_copy()
+    setattr(temp_data, temp_data.get_data_field_name(), resp.model_dump(mode="json", exclude={"temp_data"}))
+    return JSONResponse(temp_data.model_dump(mode="json")).body
+
+
+def _generic(resp: BaseRespTml) -> bytes:
+    """
+    不使用编译好的模板模型的通用实现
+    """
+    name = resp.temp_data.get_data_field_name()
+    tml = resp.temp_data.model_copy(update={name: resp})
+    return tml.__pydantic_serializer__.to_json(tml, exclude={name: {"temp_data"}})
+
+
+def _user_resp() -> UserResp:
+    resp = UserResp(user_id=1, name="tom", tags=["a", "b"], address=Address(city="x"), color=Color.BLUE)
+    resp.temp_data.code = "0000"
+    resp.temp_data.msg = "ok"
+    return resp
+
+
+def _order_resp() -> OrderResp:
+    resp = OrderResp(order_id="o-1", amount=100)
+    resp.temp_data.code = "0001"
+    resp.temp_data.success = False
+    resp.temp_data.trace = "abc"
+    return resp
+
+
+@pytest.mark.parametrize("factory", [_user_resp, _order_resp, lambda: UserResp(user_id=2, name="")])
+def test_tml_matches_baseline(factory):
+    resp = factory()
+    assert type(resp)._tml_model is not None
+    body = resp.resp().body
+    assert body == _baseline(resp)
+    assert body == _generic(resp)
+
+
+def test_tml_custom_field():
+    body = json.loads(_order_resp().resp().body)
+    assert body == {
+        "data": None,
+        "code": "0001",
+        "msg": "",
+        "result": {"order_id": "o-1", "amount": 100},
+        "success": False,
+        "trace": "abc",
+    }
+
+
+def test_tml_fallback():
+    # 实例上的模板类型和编译时不一致时走通用的实现，输出仍然一致
+    resp = UserResp(user_id=3, name="jerry", temp_data=ResultTempModel(code="0002"))
+    body = resp.resp().body
+    assert body == _baseline(resp)
+    assert json.loads(body)["result"]["user_id"] == 3
+
+
+def test_tml_non_ascii():
+    # 直接序列化输出utf-8，内容和之前的实现一致
+    resp = UserResp(user_id=4, name="张三")
+    resp.temp_data.msg = "查询成功"
+    body = resp.resp().body
+    assert json.loads(body) == json.loads(_baseline(resp))
+    assert body == _generic(resp)
+
+
+def test_tml_not_mutate():
+    resp = _user_resp()
+    resp.resp()
+    assert resp.temp_data.data is None
+    assert "data" not in resp.temp_data.__pydantic_fields_set__
@@ -0,0 +1,181 @@
+import asyncio
+import itertools
+from collections.abc import Iterator
+
+import pytest
+import sentry_sdk
+from sanic import Sanic, text
+from sentry_sdk.envelope import Envelope
+from sentry_sdk.transport import Transport
+
+from sanic_api.sentry.sampler import TracesSampler
+
+TRACE_ID = "771a43a4192642f0b136d5159a501700"
+PARENT_SPAN_ID = "1234567890abcdef"
+
+_app_ids = itertools.count()
+
+
+class FakeTransport(Transport):
+    """
+    不发送到sentry，只记录采样到的事务名称
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.transactions: list[str] = []
+
+    def capture_envelope(self, envelope: Envelope):
+        for item in envelope.items:
+            if item.type == "transaction":
+                self.transactions.append(item.payload.json["transaction"])
+
+    def routes(self) -> list[str]:
+        """
+        采样到的路由名称，去掉app名称的前缀
+        """
+        return [name.rsplit(".", 1)[-1] for name in self.transactions]
+
+
+def _create_app(name: str) -> Sanic:
+    app = Sanic(name)
+
+    @app.get("/health", name="health")
+    async def health(request):
+        return text("ok")
+
+    @app.get("/user/<user_id:int>", name="user_info")
+    async def user_info(request, user_id: int):
+        return text(str(user_id))
+
+    @app.get("/order", name="order")
+    async def order(request):
+        return text("order")
+
+    @app.get("/slow", name="slow")
+    async def slow(request):
+        await asyncio.sleep(0.1)
+        return text("slow")
+
+    @app.get("/error", name="error")
+    async def error(request):
+        return text("error", status=500)
+
+    return app
+
+
+@pytest.fixture
+def sentry(request: pytest.FixtureRequest) -> Iterator[tuple[Sanic, FakeTransport]]:
+    """
+    使用本地的假dsn和假传输初始化sentry，参数是TracesSampler的关键字参数
+    """
+    app = _create_app(f"sampler_{next(_app_ids)}")
+    sampler = TracesSampler(app, **request.param)
+    sampler.setup()
+    transport = FakeTransport()
+    sentry_sdk.init(dsn="http://public@localhost/1", transport=transport, traces_sampler=sampler)
+    yield app, transport
+    sentry_sdk.get_client().close()
+    sentry_sdk.init()
+
+
+def _get(app: Sanic, path: str, headers: dict[str, str] | None = None) -> int:
+    _, response = app.test_client.get(path, headers=headers)
+    return response.status
+
+
+@pytest.mark.parametrize("sentry", [{"sample_rate": 1.0, "ignore_routes": ["*.health", "/user/*"]}], indirect=True)
+def test_ignore_routes(sentry: tuple[Sanic, FakeTransport]):
+    app, transport = sentry
+    _get(app, "/health")
+    _get(app, "/user/1")
+    _get(app, "/order")
+    assert transport.routes() == ["order"]
+
+
+@pytest.mark.parametrize(
+    "sentry",
+    [{"sample_rate": 0.0, "route_sample_rates": {"/user/*": 1.0, "*.order": 0.0, "*.health": 1.0}}],
+    indirect=True,
+)
+def test_route_sample_rates(sentry: tuple[Sanic, FakeTransport]):
+    app, transport = sentry
+    _get(app, "/user/1")
+    _get(app, "/order")
+    _get(app, "/health")
+    _get(app, "/slow")
+    assert transport.routes() == ["user_info", "health"]
+
+
+@pytest.mark.parametrize(
+    "sentry",
+    [{"sample_rate": 0.0, "slow_threshold": 0.05, "boost_sample_rate": 1.0, "boost_seconds": 60}],
+    indirect=True,
+)
+def test_boost_after_slow_request(sentry: tuple[Sanic, FakeTransport]):
+    app, transport = sentry
+    _get(app, "/slow")
+    _get(app, "/order")
+    assert transport.transactions == []
+
+    # 慢请求之后只提升这个路由的采样率
+    _get(app, "/slow")
+    _get(app, "/order")
+    assert transport.routes() == ["slow"]
+
+
+@pytest.mark.parametrize("sentry", [{"sample_rate": 0.0, "boost_sample_rate": 1.0}], indirect=True)
+def test_boost_after_server_error(sentry: tuple[Sanic, FakeTransport]):
+    app, transport = sentry
+    assert _get(app, "/error") == 500
+    assert transport.transactions == []
+
+    _get(app, "/error")
+    _get(app, "/order")
+    assert transport.routes() == ["error"]
+
+
+@pytest.mark.parametrize("sentry", [{"sample_rate": 0.0, "boost_seconds": 0}], indirect=True)
+def test_boost_expired(sentry: tuple[Sanic, FakeTransport]):
+    app, transport = sentry
+    _get(app, "/error")
+    _get(app, "/error")
+    assert transport.transactions == []
+
+
+@pytest.mark.parametrize("sentry", [{"sample_rate": 0.0, "ignore_routes": ["*.health"]}], indirect=True)
+def test_parent_sampled(sentry: tuple[Sanic, FakeTransport]):
+    app, transport = sentry
+    sampled = {"sentry-trace": f"{TRACE_ID}-{PARENT_SPAN_ID}-1"}
+    _get(app, "/order", sampled)
+    # 忽略的路由不会因为上游采样而采样
+    _get(app, "/health", sampled)
+    assert transport.routes() == ["order"]
+
+
+@pytest.mark.parametrize("sentry", [{"sample_rate": 1.0}], indirect=True)
+def test_parent_not_sampled(sentry: tuple[Sanic, FakeTransport]):
+    app, transport = sentry
+    _get(app, "/order", {"sentry-trace": f"{TRACE_ID}-{PARENT_SPAN_ID}-0"})
+    _get(app, "/user/1")
+    assert transport.routes() == ["user_info"]
+
+
+@pytest.mark.parametrize("sentry", [{"sample_rate": 1.0, "ignore_routes": ["*.health"]}], indirect=True)
+def test_reload(sentry: tuple[Sanic, FakeTransport]):
+    app, transport = sentry
+    _get(app, "/health")
+    _get(app, "/order")
+
+    sampler: TracesSampler = sentry_sdk.get_client().options["traces_sampler"]
+    sampler.reload(
+        sample_rate=0.0,
+        ignore_routes=[],
+        route_sample_rates={"*.health": 1.0},
+        slow_threshold=None,
+        boost_sample_rate=1.0,
+        boost_seconds=60,
+    )
+    _get(app, "/health")
+    _get(app, "/order")
+    assert transport.routes() == ["order", "health"]
@@ -0,0 +1,100 @@
+import itertools
+import json
+
+import pytest
+from pydantic import BaseModel
+from sanic import BadRequest, Sanic
+from sanic import json as json_resp
+
+from sanic_api.api import Request, StreamData
+from sanic_api.api.stream import _JsonArraySplitter, _NDJsonSplitter
+
+_app_ids = itertools.count()
+
+
+class Item(BaseModel):
+    a: int
+
+
+def _split(splitter: _NDJsonSplitter | _JsonArraySplitter, data: bytes, size: int) -> list[bytes]:
+    """
+    按照指定的大小切块喂给分割器
+    """
+    items = []
+    for i in range(0, len(data), size):
+        items += splitter.feed(data[i : i + size])
+    return items + splitter.close()
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1024])
+def test_ndjson_splitter(size: int):
+    data = b'{"a": 1}\n\n  {"a": 2}  \r\n{"s": "x\\ny"}\n{"a": 3}'
+    items = _split(_NDJsonSplitter(), data, size)
+    assert items == [b'{"a": 1}', b'{"a": 2}', b'{"s": "x\\ny"}', b'{"a": 3}']
+
+
+def test_ndjson_splitter_buffer():
+    splitter = _NDJsonSplitter()
+    assert splitter.feed(b'{"a": 1}\n{"a"') == [b'{"a": 1}']
+    # 缓冲区只保留未完成的一行
+    assert bytes(splitter._buf) == b'{"a"'
+    assert splitter.feed(b": 2}\n") == [b'{"a": 2}']
+    assert bytes(splitter._buf) == b""
+    assert splitter.close() == []
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1024])
+def test_json_array_splitter(size: int):
+    data = b' [{"a": 1}, {"s": "],\\"[{"}, [1, [2]], "x,y" , 3] trailing'
+    items = _split(_JsonArraySplitter(), data, size)
+    assert items == [b'{"a": 1}', b'{"s": "],\\"[{"}', b"[1, [2]]", b'"x,y"', b"3"]
+    assert [json.loads(item) for item in items][1] == {"s": '],"[{'}
+
+
+@pytest.mark.parametrize("data", [b"[]", b" [ ] "])
+def test_json_array_splitter_empty(data: bytes):
+    assert _split(_JsonArraySplitter(), data, 1) == []
+
+
+def test_json_array_splitter_incomplete():
+    splitter = _JsonArraySplitter()
+    assert splitter.feed(b'[{"a": 1}, {"a": 2') == [b'{"a": 1}']
+    with pytest.raises(BadRequest):
+        splitter.close()
+
+
+@pytest.fixture
+def app() -> Sanic:
+    app = Sanic(f"stream_{next(_app_ids)}", request_class=Request)
+    app.signal("http.routing.after")(Request.bind_without_body)
+    app.ctx.validation_failed = []
+
+    @app.post("/json")
+    async def json_data_route(request: Request, json_data: Item):
+        return json_resp([json_data.a])
+
+    @app.post("/stream")
+    async def stream_route(request: Request, stream_data: StreamData[Item]):
+        try:
+            return json_resp([item.a async for item in stream_data])
+        finally:
+            app.ctx.validation_failed.append(request.validation_failed)
+
+    return app
+
+
+@pytest.mark.parametrize("body", [b'{"a": 1}\n{"a": 2}\n', b'[{"a": 1}, {"a": 2}]'])
+def test_stream_data(app: Sanic, body: bytes):
+    _, response = app.test_client.post("/stream", content=body)
+    assert response.status == 200
+    assert response.json == [1, 2]
+    assert app.ctx.validation_failed == [False]
+
+
+@pytest.mark.parametrize("body", [b'{"a": 1}\n{"a": "x"}\n', b'[{"a": 1}, {"a": "x"}]'])
+def test_stream_data_validation_error(app: Sanic, body: bytes):
+    _, expected = app.test_client.post("/json", content=b'{"a": "x"}')
+    _, response = app.test_client.post("/stream", content=body)
+    # 元素校验失败时和非流式的请求体的响应一致，并且同样记录校验失败
+    assert response.status == expected.status
+    assert app.ctx.validation_failed == [True]
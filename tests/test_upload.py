@@ -0,0 +1,87 @@
+import itertools
+import os
+
+import pytest
+from pydantic import BaseModel
+from sanic import Sanic, json
+
+from sanic_api.api import Request, UploadFile
+from sanic_api.api.upload import MultipartParser
+
+_app_ids = itertools.count()
+
+BOUNDARY = "sanic-api-boundary"
+
+
+class AvatarModel(BaseModel):
+    user_id: int
+    avatar: UploadFile
+
+
+def _multipart(user_id: str, content: bytes) -> bytes:
+    return (
+        (
+            f"--{BOUNDARY}\r\n"
+            'Content-Disposition: form-data; name="user_id"\r\n\r\n'
+            f"{user_id}\r\n"
+            f"--{BOUNDARY}\r\n"
+            'Content-Disposition: form-data; name="avatar"; filename="a.bin"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode()
+        + content
+        + f"\r\n--{BOUNDARY}--\r\n".encode()
+    )
+
+
+@pytest.fixture
+def app() -> Sanic:
+    app = Sanic(f"upload_{next(_app_ids)}", request_class=Request)
+    app.config.UPLOAD_SPOOL_SIZE = 1024
+    app.signal("http.routing.after")(Request.bind_without_body)
+    app.signal("http.lifecycle.response")(Request.close_files_on_response)
+    app.signal("http.lifecycle.complete")(Request.close_files_on_complete)
+    app.ctx.uploads = []
+
+    @app.post("/avatar")
+    async def avatar(request: Request, files_data: AvatarModel):
+        upload = files_data.avatar
+        app.ctx.uploads.append((upload, None if upload.in_memory else upload.file.name))
+        return json({"size": upload.size, "content": upload.read(16).decode()})
+
+    return app
+
+
+@pytest.mark.parametrize("size", [16, 64 * 1024])
+def test_close_after_response(app: Sanic, size: int):
+    content = b"x" * size
+    headers = {"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+    _, response = app.test_client.post("/avatar", content=_multipart("1", content), headers=headers)
+    assert response.status == 200
+    assert response.json == {"size": size, "content": "x" * 16}
+
+    (upload, path), *_ = app.ctx.uploads
+    assert upload.file.closed
+    if size > 1024:
+        assert path is not None and not os.path.exists(path)
+
+
+def test_close_on_validation_error(app: Sanic):
+    headers = {"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+    _, response = app.test_client.post("/avatar", content=_multipart("abc", b"x" * 4096), headers=headers)
+    assert response.status != 200
+    assert app.ctx.uploads == []
+
+
+def test_parser_chunks():
+    body = _multipart("7", b"0123456789" * 300)
+    parser = MultipartParser(BOUNDARY.encode(), spool_size=1024)
+    for i in range(0, len(body), 7):
+        parser.feed(body[i : i + 7])
+    params = parser.close()
+    assert params["user_id"] == ["7"]
+    (upload,) = params["avatar"]
+    assert upload.filename == "a.bin"
+    assert upload.size == 3000
+    assert not upload.in_memory
+    assert bytes(upload.getbuffer()) == b"0123456789" * 300
+    upload.close()